@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Benchmark compiling the euCy expressions once (`regex.compiled`) vs. `re`'s own pattern cache
+
+The reference search checks every candidate word against several expressions of `eucy.regex`
+(some of them concatenated at call time, e.g. `'^' + act_types + '$'`), while other stages searched
+expressions built from the text of the documents (one per token, e.g. `re.escape(token.text)` in
+`utils.align_span_with_text`). `re` only keeps a limited number of compiled expressions
+(`re._MAXCACHE`), so the per-token expressions push the euCy expressions out of the cache and they
+are compiled again and again.
+
+Usage:
+
+    python benchmarks/bench_regex_compile.py [--words 2000] [--repeat 3]
+"""
+
+import argparse
+import re
+import time
+
+from eucy import regex as eure
+
+references = eure.entities['references']
+
+# (expression, flags) pairs each word is checked against by the reference search
+word_checks = [
+    (references['elements'], re.IGNORECASE),
+    (references['elements_word'], re.IGNORECASE),
+    (references['subpar_elements'], re.IGNORECASE),
+    (references['act_types'], re.IGNORECASE),
+    (references['act_types_word'], re.IGNORECASE),
+    (references['qualifiers'], re.IGNORECASE),
+    (r'to|-|et *seq[\.]*', re.IGNORECASE),
+    (eure.elements['article_num'], re.MULTILINE),
+    (eure.elements['recital_num_start'], re.MULTILINE),
+]
+
+# call time concatenations as they were in `entities.references`
+word_concatenations = [
+    ('^' + references['elements'] + '$', re.IGNORECASE),
+    ('^' + references['act_types'] + '$', re.IGNORECASE),
+]
+
+words = [
+    "Article", "paragraph", "Regulation", "(EU)", "No", "1286/2014", "of",
+    "the", "European", "Parliament", "and", "Council", "point", "(a)",
+    "thereof", "Directive", "2009/65/EC", "shall", "apply"
+]
+
+
+def document_words(n):
+    """n words, with numbers to make the words (and the expressions built from them) distinct"""
+
+    return [f'{words[i % len(words)]}{i}' for i in range(n)]
+
+
+def re_searches(document):
+    """Search with `re`, building the concatenations and per-word expressions at call time"""
+
+    found = 0
+
+    for word in document:
+        for expression, flags in word_checks + word_concatenations:
+            found += re.search(expression, word, flags) is not None
+        found += re.search(re.escape(word),
+                           document[0] + ' ' + word) is not None
+
+    return found
+
+
+def registry_searches(document):
+    """Search with the compiled expressions of `eucy.regex` and `str.find` for the words"""
+
+    found = 0
+
+    for word in document:
+        for expression, flags in word_checks + word_concatenations:
+            found += eure.search(expression, word, flags) is not None
+        found += (document[0] + ' ' + word).find(word) >= 0
+
+    return found
+
+
+def timed(function, argument, repeat):
+
+    times = []
+
+    for _ in range(repeat):
+        re.purge()
+        eure.compiled.cache_clear()
+        start = time.perf_counter()
+        result = function(argument)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words',
+                        type=int,
+                        nargs='+',
+                        default=[500, 2000, 8000],
+                        help="numbers of words in the document")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'words':>6} {'re (s)':>8} {'registry (s)':>13} {'speedup':>8} {'compiled':>9}"
+    )
+
+    for n in args.words:
+
+        document = document_words(n)
+
+        re_time, re_result = timed(re_searches, document, args.repeat)
+        registry_time, registry_result = timed(registry_searches, document,
+                                               args.repeat)
+
+        assert re_result == registry_result
+
+        print(
+            f"{n:>6} {re_time:>8.4f} {registry_time:>13.4f} {re_time / registry_time:>7.1f}x {eure.compiled.cache_info().currsize:>9}"
+        )
+
+
+if __name__ == '__main__':
+    main()
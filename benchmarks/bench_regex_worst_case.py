@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Benchmark the expressions of `eucy.regex` on generated worst-case inputs
+
+Times finding all matches of every structure, element and reference expression (and indexing the
+structure landmarks) in the inputs of the regex performance tests (`tests/regex_worst_case.py`:
+long runs of spaces, digits, parentheses, dots, article headings without numbers, ... and random
+sequences of such pieces) and lists the slowest expression and input pairs with their time budget.
+
+Usage:
+
+    python -m benchmarks.bench_regex_worst_case [--sizes 1000 4000] [--backends re regex] [--top 20]
+"""
+
+import argparse
+
+from eucy import regex as eure
+from eucy import structure
+from tests.regex_worst_case import (expressions, find_all, index_landmarks,
+                                    time_budget, timed, worst_case_inputs)
+
+
+def timings(n, backend):
+    """Times of all expression (and landmark index) and input pairs of n chars"""
+
+    results = []
+
+    inputs = worst_case_inputs(n)
+
+    for name, (expression, flags) in expressions().items():
+        budget = time_budget(n)
+        for input_name, string in inputs.items():
+            seconds = timed(find_all, (backend, expression, flags, string),
+                            budget)
+            results.append((seconds, budget, name, input_name))
+
+    budget = len(structure.landmark_expressions) * time_budget(n)
+    for input_name, string in inputs.items():
+        seconds = timed(index_landmarks, (backend, string), budget)
+        results.append((seconds, budget, 'Landmarks', input_name))
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes',
+                        type=int,
+                        nargs='+',
+                        default=[1000, 4000],
+                        help="lengths of the inputs (chars)")
+    parser.add_argument('--backends',
+                        nargs='+',
+                        default=list(eure.backends),
+                        help="regex backends (see `regex.set_backend`)")
+    parser.add_argument('--top',
+                        type=int,
+                        default=20,
+                        help="number of slowest pairs to list")
+    args = parser.parse_args()
+
+    print(
+        f"{'backend':>7} {'chars':>6} {'time (s)':>9} {'budget (s)':>11} {'expression':<40} input"
+    )
+
+    for backend in args.backends:
+        for n in args.sizes:
+            for seconds, budget, name, input_name in sorted(
+                    timings(n, backend), reverse=True)[:args.top]:
+                print(
+                    f"{backend:>7} {n:>6} {seconds:>9.4f} {budget:>11.2f} {name:<40} {input_name}"
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Benchmark annotating the references of a reference-heavy document with many existing entities
+
+Compares dropping the existing entities (e.g. of a named entity recognizer) overlapping each new
+reference as it is accepted (rebuilding the list of entities, as `entities.EntitySearch.set_annotations`
+used to) to dropping them all at once (`utils.remove_overlapping_spans`).
+
+Usage:
+
+    python benchmarks/bench_set_annotations.py [--items 500 2000 8000] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import spacy
+from spacy import util
+from spacy.tokens import Span
+
+from eucy import utils
+from eucy.entities import EntitySearch, references
+
+# an item of a list of amended acts: references and words a recognizer might label
+item = "Article {i} of Regulation (EU) No {i}/2012 of the Commission in Brussels; "
+
+
+def reference_heavy_doc(nlp, n):
+    """A document of n items with an entity on every "Commission" and "Brussels" and the matches of
+    the reference search"""
+
+    doc = nlp(''.join(item.format(i=i) for i in range(n)))
+
+    doc.ents = [
+        Span(doc,
+             t.i,
+             t.i + 1,
+             label='ORG' if t.text == 'Commission' else 'GPE') for t in doc
+        if t.text in ['Commission', 'Brussels']
+    ]
+
+    return doc, references.reference_spans(doc[:])
+
+
+def rebuilt_entities(doc, matches):
+    """The entities, dropping the overlapping entities with each accepted match"""
+
+    entities = list(doc.ents)
+    new_entities = []
+    seen_tokens = set()
+
+    for label, start, end in matches:
+        span = Span(doc, start, end, label=label)
+        if start not in seen_tokens and end - 1 not in seen_tokens:
+            new_entities.append(span)
+            entities = [
+                e for e in entities if not (e.start < end and e.end > start)
+            ]
+            seen_tokens.update(range(start, end))
+
+    return util.filter_spans(entities + new_entities)
+
+
+def merged_entities(doc, matches):
+    """The entities, dropping the overlapping entities at once"""
+
+    entities = list(doc.ents)
+    new_entities = []
+    seen_tokens = set()
+
+    for label, start, end in matches:
+        span = Span(doc, start, end, label=label)
+        if start not in seen_tokens and end - 1 not in seen_tokens:
+            new_entities.append(span)
+            seen_tokens.update(range(start, end))
+
+    entities = utils.remove_overlapping_spans(entities, new_entities)
+
+    return util.filter_spans(entities + new_entities)
+
+
+def timed(function, doc, matches, repeat):
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(doc, matches)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items',
+                        type=int,
+                        nargs='+',
+                        default=[500, 2000, 8000],
+                        help="numbers of listed acts in the document")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    nlp = spacy.blank('en')
+
+    print(
+        f"{'items':>6} {'entities':>8} {'references':>10} {'rebuilt (s)':>12} {'merged (s)':>11} {'speedup':>8} {'set_annotations (s)':>20}"
+    )
+
+    for n in args.items:
+
+        doc, matches = reference_heavy_doc(nlp, n)
+
+        rebuilt_time, rebuilt_result = timed(rebuilt_entities, doc, matches,
+                                             args.repeat)
+        merged_time, merged_result = timed(merged_entities, doc, matches,
+                                           args.repeat)
+
+        assert [(e.start, e.end, e.label_) for e in rebuilt_result
+                ] == [(e.start, e.end, e.label_) for e in merged_result]
+
+        # the whole annotation, including resolving the references (from the cache after the first time)
+        search = EntitySearch(nlp=nlp,
+                              name='eucy_references',
+                              matcher=references.ReferenceMatcher,
+                              overwrite_ents=True)
+        annotate_time, _ = timed(
+            lambda doc, matches: search.set_annotations(doc.copy(), matches),
+            doc, matches, args.repeat)
+
+        print(
+            f"{n:>6} {len(doc.ents):>8} {len(matches):>10} {rebuilt_time:>12.4f} {merged_time:>11.4f} {rebuilt_time / merged_time:>7.1f}x {annotate_time:>20.4f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""Benchmark splitting long proposals (big explanatory memoranda) into their parts
+
+Compares searching the front matter "after position N" with dynamic offset lookbehind patterns
+(`(?<=.{N}).*?` + expression, as `structure.text_parts` used to) to picking the landmarks from the
+index of `structure.Landmarks`, which searches compiled expressions from start positions.
+If a landmark is missing (e.g. no "Proposal for a" heading after the explanatory memorandum), the
+lazy `.*?` of the lookbehind patterns is tried from every position after N, so the search time grows
+quadratically with the size of the memorandum.
+
+Usage:
+
+    python benchmarks/bench_structure.py [--sizes 10000 20000 40000] [--repeat 3]
+"""
+
+import argparse
+import re
+import time
+
+from eucy import regex as eure
+from eucy import structure, utils
+
+memo_paragraph = (
+    "The proposal aims to simplify the rules applicable to the placing on the market of products "
+    "and to reduce the administrative burden for small and medium-sized enterprises. In line with "
+    "the better regulation agenda, the Commission consulted stakeholders on the options set out in "
+    "the impact assessment.\n\n")
+
+law = """Proposal for a
+
+REGULATION OF THE EUROPEAN PARLIAMENT AND OF THE COUNCIL
+
+on the simplification of rules applicable to products
+
+THE EUROPEAN PARLIAMENT AND THE COUNCIL OF THE EUROPEAN UNION,
+
+Having regard to the Treaty on the Functioning of the European Union, and in particular Article 114 thereof,
+
+Having regard to the proposal from the European Commission,
+
+Acting in accordance with the ordinary legislative procedure,
+
+Whereas:
+
+(1) Rules applicable to the placing on the market of products should be simplified.
+
+(2) Since the objective of this Regulation cannot be sufficiently achieved by the Member States, the Union may adopt measures.
+
+HAVE ADOPTED THIS REGULATION:
+
+Article 1
+
+Subject matter
+
+This Regulation lays down rules applicable to the placing on the market of products.
+
+Article 2
+
+Entry into force
+
+This Regulation shall enter into force on the twentieth day following that of its publication in the Official Journal of the European Union.
+
+Done at Brussels,
+
+For the European Parliament For the Council
+The President The President
+"""
+
+
+def proposal(memo_size, headings=True):
+    """A proposal with an explanatory memorandum of about memo_size chars (with or without the "Proposal
+    for a" and "Whereas:" headings)"""
+
+    memo = "EXPLANATORY MEMORANDUM\n\n" + memo_paragraph * (
+        memo_size // len(memo_paragraph) + 1)
+
+    if headings:
+        return "COMMISSION PROPOSAL\n\n" + memo + law
+
+    return "COMMISSION PROPOSAL\n\n" + memo + law.replace(
+        "Proposal for a\n\n", "").replace("Whereas:\n\n", "")
+
+
+def front_matter_searches(search, expl_memo_end):
+    """Search the law, citations and recitals start in the front matter as `structure.text_parts` does
+
+    Parameters
+    ----------
+    search: function
+        takes a landmark name (see `structure.landmark_expressions`) and a char position and returns
+        the end char of the first landmark after the position (or None)
+    expl_memo_end: int
+        the end char of the explanatory memorandum heading
+
+    Returns
+    -------
+    tuple
+        the law start, the end of the citations start and the end of the recitals start
+
+    """
+
+    proposal_start = search('proposal_start', expl_memo_end)
+    law_start = search('proposal_law_start', expl_memo_end)
+
+    if proposal_start is not None:
+        law_start = proposal_start
+    elif law_start is None:
+        law_start = 0
+
+    citations_start = search('citations_start', law_start)
+
+    for name in [
+            'recitals_start_whereas', 'recitals_start_having_dotall',
+            'recital_num_start'
+    ]:
+        recitals_start = search(name, law_start)
+        if recitals_start is not None:
+            break
+
+    return law_start, citations_start, recitals_start
+
+
+def offset_lookbehind_searches(front):
+    """Search the front matter with offset lookbehind patterns"""
+
+    def _search(name, pos):
+        expression, flags = structure.landmark_expressions[name]
+        match = re.search(f'(?<=.{{{pos}}}).*?' + expression, front,
+                          flags | re.DOTALL)
+        return None if match is None else match.end()
+
+    expl_memo_end = [
+        m.end() for m in re.finditer(
+            eure.structure['expl_memo_start'], front, flags=re.IGNORECASE)
+    ][-1]
+
+    return front_matter_searches(_search, expl_memo_end)
+
+
+def landmark_searches(front):
+    """Search the front matter from the landmark index"""
+
+    landmarks = structure.Landmarks(front)
+
+    def _search(name, pos):
+        match = landmarks.search(name, pos=pos)
+        return None if match is None else match.end
+
+    expl_memo_end = landmarks.findall('expl_memo_start')[-1].end
+
+    return front_matter_searches(_search, expl_memo_end)
+
+
+def text_part_tokens(text):
+
+    return structure.text_part_tokens(utils.TokenOffsets.from_text(text))
+
+
+def timed(function, argument, repeat):
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes',
+                        type=int,
+                        nargs='+',
+                        default=[10000, 20000, 40000],
+                        help="sizes of the explanatory memorandum (chars)")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'memo chars':>10} {'headings':>8} {'lookbehind (s)':>15} {'landmarks (s)':>14} {'speedup':>8} {'text_parts (s)':>15}"
+    )
+
+    for size in args.sizes:
+        for headings in [True, False]:
+
+            text = proposal(size, headings=headings)
+            front = text[:text.index('HAVE ADOPTED')]
+
+            lookbehind_time, lookbehind_result = timed(
+                offset_lookbehind_searches, front, args.repeat)
+            landmarks_time, landmarks_result = timed(landmark_searches, front,
+                                                     args.repeat)
+            parts_time, _ = timed(text_part_tokens, text, args.repeat)
+
+            assert lookbehind_result == landmarks_result
+
+            print(
+                f"{size:>10} {str(headings):>8} {lookbehind_time:>15.4f} {landmarks_time:>14.4f} {lookbehind_time / landmarks_time:>7.1f}x {parts_time:>15.4f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
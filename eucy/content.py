@@ -1,52 +1,56 @@
 import re
 
+from eucy import regex as eure
+
+# lines that are not part of the title (expressions and flags)
+non_title_lines = [('Important legal notice', re.IGNORECASE),
+                   ('^European Commission$', re.MULTILINE),
+                   ('^\|\s*.*?\s*\|$', re.MULTILINE), ('^@', re.MULTILINE),
+                   ('EXPLANATORY MEMORANDUM', re.IGNORECASE),
+                   ('CONTEXT OF THE PROPOSAL', re.IGNORECASE),
+                   ('Official Journal of the European Union', re.IGNORECASE),
+                   ('Avis juridique important', re.IGNORECASE)]
+
 
 def find_title(doc):
 
     title = None
 
     text = doc.text
-    long_lines = re.findall(
+    long_lines = eure.findall(
         r'^.*?(?:[A-Za-z]+[ ]+[A-Za-z ,\.]{5,}|ANNEX|Annex).*', text,
         re.MULTILINE)
     for i, line in enumerate(long_lines):
         if not any([
-                re.search(term, line) is not None for term in [
-                    re.compile('Important legal notice', flags=re.IGNORECASE),
-                    re.compile('^European Commission$', flags=re.MULTILINE),
-                    re.compile('^\|\s*.*?\s*\|$', flags=re.MULTILINE),
-                    re.compile('^@', flags=re.MULTILINE),
-                    re.compile('EXPLANATORY MEMORANDUM', flags=re.IGNORECASE),
-                    re.compile('CONTEXT OF THE PROPOSAL', flags=re.IGNORECASE),
-                    re.compile('Official Journal of the European Union',
-                               flags=re.IGNORECASE),
-                    re.compile('Avis juridique important', flags=re.IGNORECASE)
-                ]
+                eure.search(expression, line, flags) is not None
+                for expression, flags in non_title_lines
         ]):
             title = line
             if i > 1 and 'Proposal for a' in long_lines[i - 1]:
                 title = long_lines[i - 1] + " " + title
             for y in range(i + 1, len(long_lines)):
-                if re.search('proposal for a', title,
-                             flags=re.IGNORECASE) is not None and re.search(
-                                 'proposal for a',
-                                 long_lines[y],
-                                 flags=re.IGNORECASE) is not None:
+                if eure.search(
+                        'proposal for a', title,
+                        flags=re.IGNORECASE) is not None and eure.search(
+                            'proposal for a',
+                            long_lines[y],
+                            flags=re.IGNORECASE) is not None:
                     # if Proposal for a already in title, break (prevent double title)
                     break
-                if len(long_lines) > i and re.search(
+                if len(long_lines) > i and eure.search(
                         r'^(?:on|[a-z]+ing|to the)|.*?(?:Proposal|Decision|Directive|Regulation|Report|Communication)',
                         long_lines[y],
                         flags=re.MULTILINE
-                        | re.IGNORECASE) is not None and re.search(
+                        | re.IGNORECASE) is not None and eure.search(
                             r'\*/$', title.strip(),
                             flags=re.MULTILINE) is None:
                     title = title + " " + long_lines[y]
                 else:
                     break
             if len(title) > 30 or any(
-                    re.search(term, title, flags=re.IGNORECASE
-                              | re.MULTILINE) is not None
+                    eure.search(
+                        term, title, flags=re.IGNORECASE
+                        | re.MULTILINE) is not None
                     for term in [
                         'Implementing', 'Decision', 'Regulation', 'Directive',
                         'Report', '^Annex', 'Communication', 'Recommendation'
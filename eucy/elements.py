@@ -1,22 +1,24 @@
 import re
+from typing import Optional
 
+from spacy.language import Language
 from spacy.tokens import Doc
 from spacy.tokens.span import Span
 
+from eucy import exceptions
 from eucy import regex as eure
 from eucy import structure, utils
 
 
 class Elements:
 
-    def __init__(self):
+    def __init__(self, time_budget=None):
 
         # Set Doc-level element extions
-        if not Doc.has_extension("article_elements"):
-            Doc.set_extension("article_elements", default=None)
+        utils.set_extensions()
 
-        if not Doc.has_extension("parts"):
-            self.EuStructure = structure.Structure()
+        # used if the doc has not been split into parts yet
+        self.EuStructure = structure.Structure()
 
         # Set Span-level element extensions
         if not Span.has_extension("element_type"):
@@ -30,16 +32,39 @@ class Elements:
                 "element_numstr", default=None
             )  # the number an element has been assigned in the text
 
+        self.time_budget = time_budget
+
     def __call__(self, doc, overwrite=False):
         """Apply the pipeline component to a `Doc` object.
         doc (Doc): The `Doc` returned by the previous pipeline component.
         RETURNS (Doc): The modified `Doc` object.
         """
 
+        if doc.has_extension("no_text") and doc._.no_text:
+            return doc
+
+        if not overwrite and (utils.has_stage(doc, 'elements')
+                              or doc._.article_elements is not None):
+            # already annotated (or pre-annotated, e.g. modified)
+            return doc
+
         if doc._.parts is None:
 
             doc = self.EuStructure(doc)
 
+            if doc._.parts is None:
+                # no text or structure timed out
+                return doc
+
+        with utils.stage_time_budget(doc, 'elements', self.time_budget):
+            doc = self._elements(doc, overwrite=overwrite)
+
+        utils.mark_stage(doc, 'elements')
+
+        return doc
+
+    def _elements(self, doc, overwrite=False):
+
         # Add SpanGroup for ...
 
         if doc.spans.get(
@@ -56,14 +81,31 @@ class Elements:
             ## Articles
             doc.spans['articles'] = articles(doc._.parts['enacting'])
 
-        doc._.article_elements = []
+        elements = []
+
+        try:
+            for article in doc.spans['articles']:
+                utils.check_time_budget()
+                elements.append(article_elements(article))
+        except exceptions.TimeoutError:
+            # keep the elements of the articles processed so far
+            utils.flag_timeout(doc, 'elements')
 
-        for article in doc.spans['articles']:
-            doc._.article_elements.append(article_elements(article))
+        doc._.article_elements = elements
 
         return doc
 
 
+@Language.factory(
+    "eucy_elements",
+    default_config={"time_budget": None},
+    assigns=["doc.spans", "doc._.article_elements", "span._.element_type"])
+def make_elements(nlp: Language, name: str, time_budget: Optional[float]):
+    """Pipeline component annotating citations, recitals, articles and article elements (see `Elements`)"""
+
+    return Elements(time_budget=time_budget)
+
+
 def citations(doc_citations):
 
     citations = utils._part_argument_check(doc_citations, 'citations')
@@ -71,18 +113,40 @@ def citations(doc_citations):
     if citations is None:
         return []
 
-    char_token = utils.chars_to_tokens_dict(citations,
-                                            input="as_ref",
-                                            output="as_ref")
+    citation_list = [
+        citations[start:end] for start, end in citation_tokens(
+            utils.TokenOffsets.from_doc(citations))
+    ]
+
+    if Span.has_extension("element_type"):
+        for i, c in enumerate(citation_list):
+            citation_list[i]._.element_type = "citation"
+
+    return citation_list
+
+
+def citation_tokens(tokens):
+    """Find the citations in the citations part of a text
+
+    Parameters
+    ----------
+    tokens: utils.TokenOffsets
+        the tokens of the citations part
+
+    Returns
+    -------
+    list
+        the citations as (start, end) token slices
+
+    """
 
     citation_matches = []
 
     while True:
 
         citation_matches = [
-            m for m in re.finditer(eure.elements['citation'],
-                                   doc_citations.text,
-                                   flags=re.MULTILINE)
+            m for m in eure.finditer(
+                eure.elements['citation'], tokens.text, flags=re.MULTILINE)
         ]
 
         if len(citation_matches) > 0:
@@ -90,35 +154,20 @@ def citations(doc_citations):
 
         # try again ignoring case
         citation_matches = [
-            m for m in re.finditer(eure.elements['citation'],
-                                   doc_citations.text,
-                                   flags=re.MULTILINE | re.IGNORECASE)
+            m for m in eure.finditer(eure.elements['citation'],
+                                     tokens.text,
+                                     flags=re.MULTILINE | re.IGNORECASE)
         ]
 
         break
 
     citation_matches = [ma for ma in citation_matches if len(ma.group(0)) > 4]
 
-    if isinstance(doc_citations, Doc):
-        citation_list = [
-            doc_citations.char_span.char_span(mat.start(),
-                                              mat.end(),
-                                              alignment_mode="expand")
-            for mat in citation_matches
-        ]
-    else:
-        citation_list = [
-            doc_citations[
-                utils.char_to_token(mat.start(), char_token):utils.
-                char_to_token(mat.end(), char_token, alignment_mode="expand")]
-            for mat in citation_matches
-        ]
-
-    if Span.has_extension("element_type"):
-        for i, c in enumerate(citation_list):
-            citation_list[i]._.element_type = "citation"
-
-    return citation_list
+    return [
+        tokens._slice(tokens.char_to_token(mat.start()),
+                      tokens.char_to_token(mat.end(), alignment_mode="expand"))
+        for mat in citation_matches
+    ]
 
 
 def recitals(doc_recitals):
@@ -128,33 +177,47 @@ def recitals(doc_recitals):
     if recitals is None:
         return []
 
-    char_token = utils.chars_to_tokens_dict(recitals,
-                                            input="as_ref",
-                                            output="as_ref")
+    recital_list = [
+        recitals[start:end]
+        for start, end in recital_tokens(utils.TokenOffsets.from_doc(recitals))
+    ]
+
+    if Span.has_extension("element_type"):
+        for i, c in enumerate(recital_list):
+            recital_list[i]._.element_type = "recital"
+
+    return recital_list
+
+
+def recital_tokens(tokens):
+    """Find the recitals in the recitals part of a text
+
+    Parameters
+    ----------
+    tokens: utils.TokenOffsets
+        the tokens of the recitals part
+
+    Returns
+    -------
+    list
+        the recitals as (start, end) token slices
+
+    """
 
     def get_recitals(recital_matches):
         recital_matches_pos = [
             (m.start(),
-             recital_matches[i +
-                             1].start()) if i < len(recital_matches) - 1 else
-            (m.start(), len(recitals.text))
+             recital_matches[i + 1].start()) if i < len(recital_matches) -
+            1 else (m.start(), len(tokens.text))
             for i, m in enumerate(recital_matches)
         ]
 
-        if isinstance(doc_recitals, Doc):
-            recital_list = [
-                doc_recitals.char_span.char_span(mat[0],
-                                                 mat[1],
-                                                 alignment_mode="expand")
-                for mat in recital_matches_pos
-            ]
-        else:
-            recital_list = [
-                doc_recitals[
-                    utils.char_to_token(mat[0], char_token):utils.
-                    char_to_token(mat[1], char_token, alignment_mode="expand")]
-                for mat in recital_matches_pos
-            ]
+        recital_list = [
+            tokens._slice(
+                tokens.char_to_token(mat[0]),
+                tokens.char_to_token(mat[1], alignment_mode="expand"))
+            for mat in recital_matches_pos
+        ]
 
         return recital_list
 
@@ -168,8 +231,8 @@ def recitals(doc_recitals):
         # @TODO catch recitals with multiple paragraphs completely (cf. example_1.txt)
 
         recital_matches_num = [
-            m for m in re.finditer(eure.elements['recital_num_start'],
-                                   recitals.text, re.MULTILINE)
+            m for m in eure.finditer(eure.elements['recital_num_start'],
+                                     tokens.text, re.MULTILINE)
         ]
 
         recitals_parentheses = []
@@ -178,62 +241,58 @@ def recitals(doc_recitals):
 
         # try to filter out bad matches by checking for the type (parentheses, dot, other)
         for match in recital_matches_num:
-            if re.search(r'^[\s\(]*[0-9]+\s*\)', match.group(0)) is not None:
+            if eure.search(r'^[\s\(]*[0-9]+\s*\)', match.group(0)) is not None:
                 recitals_parentheses.append(match)
-            elif re.search(r'^[\s]*[0-9]+\s*\.', match.group(0)) is not None:
+            elif eure.search(r'^[\s]*[0-9]+\s*\.', match.group(0)) is not None:
                 recitals_dot.append(match)
             else:
                 recitals_other.append(match)
 
         # if there are only parentheses recitals, use them
         if len(recitals_parentheses) > 0 and len(recitals_parentheses) > len(
-                recitals_dot) and len(recitals_parentheses) > len(
-                    recitals_other) == 0:
+                recitals_dot
+        ) and len(recitals_parentheses) > len(recitals_other) == 0:
             recital_matches_num = recitals_parentheses
         # @TODO maybe use a more refined approach including dot recitals / other recitals if they are not too far away from the parentheses recitals
 
         recital_list = get_recitals(recital_matches_num)
 
         # remove recitals with less than 10 words
-        recital_list = [rec for rec in recital_list if len(rec) > 6]
+        recital_list = [rec for rec in recital_list if rec[1] - rec[0] > 6]
 
         if len(recital_list) > 0:
             break
 
         # if none found yet, try for unnumbered recirals starting with whereas
         recital_matches_whereas = [
-            ma for ma in re.finditer(eure.elements['recital_whereas_start'],
-                                     recitals.text,
-                                     flags=re.MULTILINE | re.IGNORECASE)
+            ma for ma in eure.finditer(eure.elements['recital_whereas_start'],
+                                       tokens.text,
+                                       flags=re.MULTILINE | re.IGNORECASE)
         ]
 
         recital_list = get_recitals(recital_matches_whereas)
 
         # remove recitals with less than 6 words
-        recital_list = [rec for rec in recital_list if len(rec) > 6]
+        recital_list = [rec for rec in recital_list if rec[1] - rec[0] > 6]
 
         if len(recital_list) > 0:
             break
 
         # if none  found yet, search for normal paragraph recitals
         recital_matches_par = [
-            ma for ma in re.finditer(eure.elements['recital_par_start'],
-                                     recitals.text,
-                                     flags=re.MULTILINE | re.IGNORECASE)
+            ma for ma in eure.finditer(eure.elements['recital_par_start'],
+                                       tokens.text,
+                                       flags=re.MULTILINE | re.IGNORECASE)
         ]
 
         recital_list = get_recitals(recital_matches_par)
 
         # remove recitals with less than 6 words
-        recital_list = [rec for rec in recital_list if len(rec) > 6]
+        recital_list = [rec for rec in recital_list if rec[1] - rec[0] > 6]
 
         if len(recital_list) > 0:
             break
 
-    if Span.has_extension("element_type"):
-        for i, c in enumerate(recital_list):
-            recital_list[i]._.element_type = "recital"
-
     return recital_list
 
 
@@ -244,60 +303,12 @@ def articles(doc_articles):
     if articles is None:
         return []
 
-    char_token = utils.chars_to_tokens_dict(articles,
-                                            input="as_ref",
-                                            output="as_ref")
-
-    article_id_matches = []
-
-    while True:
-
-        article_id_matches = [
-            m for m in re.finditer(eure.elements['article_identifier'],
-                                   articles.text,
-                                   flags=re.MULTILINE | re.IGNORECASE)
-        ]
-
-        if len(article_id_matches) > 0:
-            break
-
-        # test for single article
-        article_id_matches = [
-            m for m in re.finditer(eure.elements['single_article_identifier'],
-                                   articles.text,
-                                   flags=re.MULTILINE | re.IGNORECASE)
-        ]
-
-        if len(article_id_matches) == 1:
-            break
-
-        # @TODO: handle cases where neither normal nor sinngle article identifier regexes match
-
-        break
-
-    article_id_matches = [
-        ma for ma in article_id_matches if len(ma.group(0)) > 4
-    ]
-
     article_list = []
 
-    for i, m in enumerate(article_id_matches, start=0):
-
-        # match text of entire article
-        article_start = m.start()
+    for i, (start, end) in enumerate(
+            article_tokens(utils.TokenOffsets.from_doc(articles))):
 
-        if i < len(article_id_matches) - 1:
-            article_end = article_id_matches[i + 1].start()
-        else:
-            article_end = len(doc_articles.text)
-
-        if isinstance(doc_articles, Doc):
-            article_span = doc_articles.char_span.char_span(
-                article_start, article_end, alignment_mode="expand")
-        else:
-            article_span = doc_articles[utils.char_to_token(
-                article_start, char_token):utils.char_to_token(
-                    article_end, char_token, alignment_mode="expand")]
+        article_span = articles[start:end]
 
         # set extensions
         if article_span.has_extension("element_pos"):
@@ -310,9 +321,9 @@ def articles(doc_articles):
 
                 article_nums = [
                     m.group(1)
-                    for m in re.finditer(eure.elements['article_num'],
-                                         article_span.text.strip(),
-                                         flags=re.IGNORECASE)
+                    for m in eure.finditer(eure.elements['article_num'],
+                                           article_span.text.strip(),
+                                           flags=re.IGNORECASE)
                 ]
 
                 if len(article_nums) > 0:
@@ -320,8 +331,8 @@ def articles(doc_articles):
 
                 article_nums = [
                     ma.group(0)
-                    for ma in re.finditer(eure.elements['article_any_num'],
-                                          article_span.text.strip())
+                    for ma in eure.finditer(eure.elements['article_any_num'],
+                                            article_span.text.strip())
                 ]
 
                 break
@@ -342,6 +353,73 @@ def articles(doc_articles):
     return article_list
 
 
+def article_tokens(tokens):
+    """Find the articles in the enacting terms of a text
+
+    Parameters
+    ----------
+    tokens: utils.TokenOffsets
+        the tokens of the enacting terms
+
+    Returns
+    -------
+    list
+        the articles as (start, end) token slices
+
+    """
+
+    article_id_matches = []
+
+    while True:
+
+        article_id_matches = [
+            m for m in eure.finditer(eure.elements['article_identifier'],
+                                     tokens.text,
+                                     flags=re.MULTILINE | re.IGNORECASE)
+        ]
+
+        if len(article_id_matches) > 0:
+            break
+
+        # test for single article
+        article_id_matches = [
+            m
+            for m in eure.finditer(eure.elements['single_article_identifier'],
+                                   tokens.text,
+                                   flags=re.MULTILINE | re.IGNORECASE)
+        ]
+
+        if len(article_id_matches) == 1:
+            break
+
+        # @TODO: handle cases where neither normal nor sinngle article identifier regexes match
+
+        break
+
+    article_id_matches = [
+        ma for ma in article_id_matches if len(ma.group(0)) > 4
+    ]
+
+    article_list = []
+
+    for i, m in enumerate(article_id_matches, start=0):
+
+        # match text of entire article
+        article_start = m.start()
+
+        if i < len(article_id_matches) - 1:
+            article_end = article_id_matches[i + 1].start()
+        else:
+            article_end = len(tokens.text)
+
+        article_list.append(
+            tokens._slice(
+                tokens.char_to_token(article_start),
+                tokens.char_to_token(article_end, alignment_mode="expand")))
+
+    return article_list
+
+
 def article_elements(doc_article):
     """Mark up an article, inlcuding Title, Paragraph, Point, etc...
     """
@@ -353,26 +431,24 @@ def article_elements(doc_article):
 
     def _paragraphs(article):
 
-        par_char_token = utils.chars_to_tokens_dict(article,
-                                                    input="as_ref",
-                                                    output="as_ref")
+        par_tokens = utils.TokenOffsets.from_doc(article)
 
         par_start_matches = []
 
         par_start_matches = [
-            m for m in re.finditer(eure.elements['article_num_paragraph'],
-                                   article.text,
-                                   flags=re.MULTILINE)
+            m for m in eure.finditer(eure.elements['article_num_paragraph'],
+                                     article.text,
+                                     flags=re.MULTILINE)
         ]
 
         unnum_pars = False
 
         if len(par_start_matches) == 0:
             par_start_matches = [
-                ma
-                for ma in re.finditer(eure.elements['article_unnum_paragraph'],
-                                      article.text,
-                                      flags=re.MULTILINE | re.DOTALL)
+                ma for ma in eure.finditer(
+                    eure.elements['article_unnum_paragraph'],
+                    article.text,
+                    flags=re.MULTILINE | re.DOTALL)
             ]
             unnum_pars = True
 
@@ -399,9 +475,9 @@ def article_elements(doc_article):
                                              par_end,
                                              alignment_mode="expand")
             else:
-                par_span = article[utils.char_to_token(
-                    par_start, par_char_token):utils.char_to_token(
-                        par_end, par_char_token, alignment_mode="expand")]
+                par_span = article[
+                    par_tokens.char_to_token(par_start):par_tokens.
+                    char_to_token(par_end, alignment_mode="expand")]
 
             # set extensions
             if par_span.has_extension("element_pos"):
@@ -427,17 +503,15 @@ def article_elements(doc_article):
     def _subparagraphs(par):
         """find and return all subpar spans (always unnumbered). Each par has at least one subpar."""
 
-        subpar_char_token = utils.chars_to_tokens_dict(par,
-                                                       input="as_ref",
-                                                       output="as_ref")
+        subpar_tokens = utils.TokenOffsets.from_doc(par)
 
         subpar_start_matches = []
 
         # mtch each par so that each par has at least one subpar
         subpar_start_matches = [
-            m for m in re.finditer(eure.elements['article_subpar_start'],
-                                   par.text,
-                                   flags=re.MULTILINE)
+            m for m in eure.finditer(eure.elements['article_subpar_start'],
+                                     par.text,
+                                     flags=re.MULTILINE)
         ]
 
         subpar_list = []
@@ -457,16 +531,15 @@ def article_elements(doc_article):
                                             subpar_end,
                                             alignment_mode="expand")
             else:
-                subpar_span = par[utils.char_to_token(
-                    subpar_start, subpar_char_token):utils.char_to_token(
-                        subpar_end, subpar_char_token, alignment_mode="expand"
-                    )]
+                subpar_span = par[
+                    subpar_tokens.char_to_token(subpar_start):subpar_tokens.
+                    char_to_token(subpar_end, alignment_mode="expand")]
 
             # sort out chpater/section titles
             if len(subpar_span.text.strip()) < 200 and bool(
-                    re.search(eure.elements['article_section_titles'],
-                              subpar_span.text,
-                              flags=re.IGNORECASE | re.MULTILINE)):
+                    eure.search(eure.elements['article_section_titles'],
+                                subpar_span.text,
+                                flags=re.IGNORECASE | re.MULTILINE)):
                 continue
 
             # set extensions
@@ -483,17 +556,15 @@ def article_elements(doc_article):
 
     def _points(subpar):
 
-        point_char_token = utils.chars_to_tokens_dict(subpar,
-                                                      input="as_ref",
-                                                      output="as_ref")
+        point_tokens = utils.TokenOffsets.from_doc(subpar)
 
         point_start_matches = []
 
         # mtch each subpar so that each subpar has at least one point
         point_start_matches = [
-            m for m in re.finditer(eure.elements['article_point_id'],
-                                   subpar.text,
-                                   flags=re.MULTILINE)
+            m for m in eure.finditer(eure.elements['article_point_id'],
+                                     subpar.text,
+                                     flags=re.MULTILINE)
         ]
 
         point_list = []
@@ -513,9 +584,9 @@ def article_elements(doc_article):
                                               point_end,
                                               alignment_mode="expand")
             else:
-                point_span = subpar[utils.char_to_token(
-                    point_start, point_char_token):utils.char_to_token(
-                        point_end, point_char_token, alignment_mode="expand")]
+                point_span = subpar[
+                    point_tokens.char_to_token(point_start):point_tokens.
+                    char_to_token(point_end, alignment_mode="expand")]
 
             # set extensions
             if point_span.has_extension("element_pos"):
@@ -533,17 +604,15 @@ def article_elements(doc_article):
 
     def _indents(subpar):
 
-        indent_char_token = utils.chars_to_tokens_dict(subpar,
-                                                       input="as_ref",
-                                                       output="as_ref")
+        indent_tokens = utils.TokenOffsets.from_doc(subpar)
 
         indent_start_matches = []
 
         # mtch each subpar so that each subpar has at least one indent
         indent_start_matches = [
-            m for m in re.finditer(eure.elements['article_indent_id'],
-                                   subpar.text,
-                                   flags=re.MULTILINE)
+            m for m in eure.finditer(eure.elements['article_indent_id'],
+                                     subpar.text,
+                                     flags=re.MULTILINE)
         ]
 
         indent_list = []
@@ -563,10 +632,9 @@ def article_elements(doc_article):
                                                indent_end,
                                                alignment_mode="expand")
             else:
-                indent_span = subpar[utils.char_to_token(
-                    indent_start, indent_char_token
-                ):utils.char_to_token(
-                    indent_end, indent_char_token, alignment_mode="expand")]
+                indent_span = subpar[
+                    indent_tokens.char_to_token(indent_start):indent_tokens.
+                    char_to_token(indent_end, alignment_mode="expand")]
 
             # set extensions
             if indent_span.has_extension("element_pos"):
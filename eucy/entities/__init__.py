@@ -1,8 +1,12 @@
+from typing import Optional
+
 from spacy import util
+from spacy.language import Language
 from spacy.pipeline import EntityRuler
 from spacy.tokens import Doc
 from spacy.tokens.span import Span
 
+from eucy import exceptions, utils
 from eucy.entities import references
 
 # @TODO: add EntitySearch class here
@@ -18,18 +22,48 @@ class EntitySearch(EntityRuler):
                  add_details_as_label=False,
                  extension_detail_prefix="",
                  debug=False,
+                 time_budget=None,
+                 reference_cache_size=None,
                  **kwargs):
 
         # super etc
         super().__init__(**kwargs)
 
         self.debug = debug
+        self.time_budget = time_budget
+
+        # resolved references are shared by the components of a process unless a size is given
+        if reference_cache_size is None:
+            self.reference_cache = references.reference_cache
+        else:
+            self.reference_cache = references.ReferenceCache(
+                maxsize=reference_cache_size)
 
-        if not Span.has_extension("references"):
-            Span.set_extension("references", default=None)
+        # the references are kept in a columnar store of the doc (see `references.ReferenceStore`)
+        references.set_references_extension()
 
         self.matcher = matcher()
 
+    def __call__(self, doc):
+
+        if doc.has_extension("no_text") and doc._.no_text or utils.has_stage(
+                doc, 'references'):
+            return doc
+
+        with utils.stage_time_budget(doc, 'references', self.time_budget):
+            doc = super().__call__(doc)
+
+        utils.mark_stage(doc, 'references')
+
+        return doc
+
+    def clear(self):
+        """Reset all patterns, keeping the custom matcher (called by `from_disk`/`from_bytes`)"""
+
+        matcher = self.matcher
+        super().clear()
+        self.matcher = matcher
+
     def match(
         self, doc: Doc
     ):  # overwrite match function for parent object (this is called in the __call__ function), return matches
@@ -43,17 +77,25 @@ class EntitySearch(EntityRuler):
         """Modify the document in place"""
         entities = list(doc.ents)
         new_entities = []
+        new_references = {}
         seen_tokens = set()
         for label, start, end in matches:
+            try:
+                utils.check_time_budget()
+            except exceptions.TimeoutError:
+                # keep the entities resolved so far
+                utils.flag_timeout(doc, 'references')
+                break
+
             span = Span(doc, start, end, label=label)
 
-            span._.references = references.resolve_reference_entities(span)
+            span_references = self.reference_cache.resolve(span)
 
             if self.debug:
                 print("TEXT")
                 print(span.text)
                 print("REFERENCES")
-                [print(str(ref) + '\r') for ref in span._.references]
+                [print(str(ref) + '\r') for ref in span_references]
                 print('\n')
 
             if any(t.ent_type for t in span) and not self.overwrite:
@@ -61,10 +103,39 @@ class EntitySearch(EntityRuler):
             # check for end - 1 here because boundaries are inclusive
             if start not in seen_tokens and end - 1 not in seen_tokens:
                 new_entities.append(span)
-                entities = [
-                    e for e in entities
-                    if not (e.start < end and e.end > start)
-                ]
+                new_references[(start, end)] = span_references
                 seen_tokens.update(range(start, end))
+        # drop the entities overlapping new ones (all at once)
+        entities = utils.remove_overlapping_spans(entities, new_entities)
         ents = util.filter_spans(entities + new_entities)
         doc.ents = ents
+        # store the references of the new entities at once
+        references.set_references(
+            doc, [(ent, new_references[(ent.start, ent.end)])
+                  for ent in ents if (ent.start, ent.end) in new_references])
+
+
+@Language.factory("eucy_references",
+                  default_config={
+                      "overwrite_ents": True,
+                      "debug": False,
+                      "time_budget": None,
+                      "reference_cache_size": None
+                  },
+                  assigns=["doc.ents", "span._.references"])
+def make_reference_search(nlp: Language, name: str, overwrite_ents: bool,
+                          debug: bool, time_budget: Optional[float],
+                          reference_cache_size: Optional[int]):
+    """Pipeline component annotating references as REFERENCE entities (see `EntitySearch`, `references.ReferenceMatcher`)
+
+    The resolved references are memoized in the cache shared by the components of the process
+    (`references.reference_cache`) or, if reference_cache_size is given, in a cache of this size of
+    the component (see `references.ReferenceCache`, 0 disables it)."""
+
+    return EntitySearch(nlp=nlp,
+                        name=name,
+                        matcher=references.ReferenceMatcher,
+                        overwrite_ents=overwrite_ents,
+                        debug=debug,
+                        time_budget=time_budget,
+                        reference_cache_size=reference_cache_size)
@@ -1,30 +1,48 @@
+import bisect
 import itertools
 import re
+import sys
+import threading
 import warnings
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+from collections.abc import Mapping
+from functools import lru_cache
 
-from spacy.tokens import Doc
 from spacy.tokens.span import Span
 from spacy.tokens.token import Token
 
-from eucy import elements
+from eucy import elements, exceptions
 from eucy import regex as eure
-from eucy import structure, utils
+from eucy import utils
 
 
 class ReferenceMatcher:
     """Custom matcher for references."""
 
-    def __init__(self, label="REFERENCE"):
+    def __init__(self, label="REFERENCE", match_on="articles"):
+        """
+        Parameters
+        ----------
+        label: str, optional
+            label of the reference entities
+        match_on: str, optional
+            'articles' to find the trigger words (see `Triggers`) once per article and only match the
+            reference candidates of its subparagraphs where they are, 'subpars' to search each
+            subparagraph on its own (same results)
 
-        if not Span.has_extension("references"):
-            Span.set_extension("references", default=None)
+        """
 
-        if not Doc.has_extension("parts"):
-            self.EuStructure = structure.Structure()
-        if not Doc.has_extension("article_elements"):
-            self.EuElements = elements.Elements()
+        if match_on not in ['articles', 'subpars']:
+            raise ValueError("match_on must be 'articles' or 'subpars'")
+
+        set_references_extension()
+
+        # used if the doc has not been split into parts/elements yet
+        self.EuElements = elements.Elements()
 
         self.label = label
+        self.match_on = match_on
 
     def __call__(self, doc):
 
@@ -32,38 +50,108 @@ class ReferenceMatcher:
         # or check in function?
         # maybe check here and restrict function to detection only?
 
-        # article for article in match_Ref
-        if not Span.has_extension("element_type") or doc.spans.get(
-                'articles', None) is None:
-            doc = self.EuStructure(doc)
-        if not Doc.has_extension(
-                "article_elements") or doc._.article_elements is None:
-            doc = self.EuElements(doc)
+        # article for article in match_Ref (structure and elements are only run if missing)
+        doc = self.EuElements(doc)
+
+        if doc._.article_elements is None:
+            # no text or elements timed out
+            return []
 
         matches = []
 
-        # @TODO: add option to matcher to either match on article or on subpar basis
+        # subparagraphs searched and skipped (without any trigger word)
+        stats = {'subpars': 0, 'skipped': 0}
+        doc._.reference_stats = stats
+
+        try:
+            for art in doc._.article_elements:
+                if len(art['pars']) == 0:
+                    continue
+                # trigger words of the whole article, found once
+                article = doc[art['pars'][0].start:art['pars'][-1].end]
+                triggers = Triggers(article.text, offset=article.start_char)
+                for i, par in enumerate(art['pars']):
+                    for subpar in art['subpars'][
+                            i]:  # pass subpars to reference matching
+                        utils.check_time_budget()
+                        stats['subpars'] += 1
+                        subpar_triggers = triggers.starts(
+                            subpar.start_char, subpar.end_char)
+                        if len(subpar_triggers) == 0:
+                            stats['skipped'] += 1
+                            continue
+                        if self.match_on == 'subpars':
+                            subpar_triggers = None
+                        matches.extend(
+                            reference_spans(subpar,
+                                            label=self.label,
+                                            triggers=subpar_triggers)
+                        )  # extend the list by the list of matches (entities) in the article)
+        except exceptions.TimeoutError:
+            # keep the matches found so far
+            utils.flag_timeout(doc, 'references')
 
-        for art in doc._.article_elements:
-            for i, par in enumerate(art['pars']):
-                for subpar in art['subpars'][
-                        i]:  # pass subpars to reference matching
-                    matches.extend(
-                        reference_spans(subpar, label=self.label)
-                    )  # extend the list by the list of matches (entities) in the article)
         return matches
 
         # @TODO return matches as Spans with label = "REFERENCE", and extension ._. for further details, such as the references contained in the Span as a list (to account for Article 1-5 bc spacy does not allow overlapping labels)
 
 
+class Triggers:
+    """Index of the reference trigger words (the literal parts of the elements and act types, see
+    `regex.entities['references']['ref_triggers']`) of a text
+
+    Every reference candidate (see `reference_candidates`) contains a trigger word, so parts of the
+    text without any of them can be skipped. The trigger words are found in a single pass over the
+    text and stored as sorted char positions (plus the offset of the text, e.g. within its doc).
+    `starts` picks those of a slice (e.g. a subparagraph of an article) by binary search.
+    """
+
+    def __init__(self, text, offset=0):
+
+        self._starts = []
+        self._ends = []
+
+        for match in eure.finditer(eure.entities['references']['ref_triggers'],
+                                   text,
+                                   flags=re.IGNORECASE):
+            self._starts.append(offset + match.start(1))
+            self._ends.append(offset + match.end(1))
+
+    def starts(self, start, end):
+        """Start chars of the trigger words in text[start:end]
+
+        Parameters
+        ----------
+        start, end: int
+            the slice of the text (chars, including the offset)
+
+        Returns
+        -------
+        list
+            the start chars (relative to the start of the slice)
+
+        """
+
+        starts = []
+
+        for i in range(bisect.bisect_left(self._starts, start),
+                       len(self._starts)):
+            if self._starts[i] >= end:
+                break
+            if self._ends[i] <= end:
+                starts.append(self._starts[i] - start)
+
+        return starts
+
+
 def _has_element_num(text):
     words = text.split()
     words = [
         w for w in words
-        if re.search(eure.entities['references']['elements'], w) is None
+        if eure.search(eure.entities['references']['elements'], w) is None
     ]
     text = " ".join(words)
-    if re.search(
+    if eure.search(
             r'[0-9]|[XVI]{1,3}(?![a-z])|(?:^|\s)\([a-z]{1,2}\)(?:\.| |$)|^[IVX]+$',
             text.strip()) is not None:
         return True
@@ -73,17 +161,15 @@ def _has_element_num(text):
 
 def _elements(text):
     elements_list = [
-        m
-        for m in re.findall('[a-z]*' +
-                            eure.entities['references']['elements'] + '[a-z]*',
-                            text,
-                            flags=re.MULTILINE | re.IGNORECASE)
+        m for m in eure.findall(eure.entities['references']['elements_words'],
+                                text,
+                                flags=re.MULTILINE | re.IGNORECASE)
     ]
     return ([
         e for e in elements_list
-        if re.search('^' + eure.entities['references']['elements'] + '$',
-                     e,
-                     flags=re.MULTILINE | re.IGNORECASE) is not None
+        if eure.search(eure.entities['references']['elements_word'],
+                       e,
+                       flags=re.MULTILINE | re.IGNORECASE) is not None
     ])
 
 
@@ -104,9 +190,9 @@ def _has_cap_element(text):
 
 
 def _has_subpar_element(text):
-    if re.search(eure.entities['references']['subpar_elements'],
-                 text,
-                 flags=re.IGNORECASE) is not None:
+    if eure.search(eure.entities['references']['subpar_elements'],
+                   text,
+                   flags=re.IGNORECASE) is not None:
         return True
     else:
         return False
@@ -118,8 +204,8 @@ def _has_subpar_element_num(token):
             return True
         text = token.text
 
-    if re.search(eure.entities['references']['element_nums'],
-                 text) is not None:
+    if eure.search(eure.entities['references']['element_nums'],
+                   text) is not None:
         return True
     else:
         return False
@@ -127,17 +213,15 @@ def _has_subpar_element_num(token):
 
 def _acts(text):
     acts_list = [
-        m for m in re.findall('[a-z]*' +
-                              eure.entities['references']['act_types'] +
-                              '[a-z]*',
-                              text,
-                              flags=re.MULTILINE | re.IGNORECASE)
+        m for m in eure.findall(eure.entities['references']['act_types_words'],
+                                text,
+                                flags=re.MULTILINE | re.IGNORECASE)
     ]
     return [
         a for a in acts_list
-        if re.search('^' + eure.entities['references']['act_types'] + '$',
-                     a,
-                     flags=re.MULTILINE | re.IGNORECASE) is not None
+        if eure.search(eure.entities['references']['act_types_word'],
+                       a,
+                       flags=re.MULTILINE | re.IGNORECASE) is not None
     ]
 
 
@@ -152,10 +236,10 @@ def _has_act_identifier(text):  # check whether text contains an act identifier
     words = text.split()
     words = [
         w for w in words
-        if re.search(eure.entities['references']['act_types'], w) is None
+        if eure.search(eure.entities['references']['act_types'], w) is None
     ]
     text = " ".join(words)
-    if re.search(
+    if eure.search(
             r'\([A-Z]{2,}\)|of\s*the|to\s*the|[0-9]|\/|between\sthe|International',
             text) is not None:
         return True
@@ -168,8 +252,8 @@ def _is_act_identifier(
     if _has_act_identifier(text):
         return True
     else:
-        if re.search(r'No|\([a-z]+\)|[\.]{2,}', text,
-                     flags=re.IGNORECASE) is not None:
+        if eure.search(r'No|\([a-z]+\)|[\.]{2,}', text,
+                       flags=re.IGNORECASE) is not None:
             return True
         else:
             False
@@ -177,7 +261,7 @@ def _is_act_identifier(
 
 def _has_cap_act(text):
     if any([
-            a.istitle() if re.search(r'thereof|hereto', a) is None else True
+            a.istitle() if eure.search(r'thereof|hereto', a) is None else True
             for a in _acts(text)
     ]):
         return True
@@ -186,33 +270,41 @@ def _has_cap_act(text):
 
 
 def _has_separator(text):
-    if re.search(r'[,;]|and|or', text) is not None:
+    if eure.search(r'[,;]|and|or', text) is not None:
         return True
     else:
         False
 
 
+def _left_context(token):
+    """The text of the 6 tokens left of a token, extended by the number of space tokens among them
+    and not cut at line breaks (see `_is_not_act`)"""
+
+    context = utils.doc_token_context(token.doc)
+
+    return context.text(*context.window(token.i, 6, ignore_ws=True))
+
+
 def _is_not_act(
     token
 ):  # function to inspect tokens that look like acts, but may not be actual references
 
-    context_l = "".join(
-        [t.text_with_ws for t in utils.get_n_left(6, token, ignore_ws=True)])
+    context_l = _left_context(token)
     # context_r = "".join([t.text_with_ws for t in utils.get_n_right(5, token, ignore_ws = True)])
 
-    if re.search(r'entry\s*into\s*force\s*of\s*this',
-                 context_l,
-                 flags=re.IGNORECASE) is not None:
+    if eure.search(r'entry\s*into\s*force\s*of\s*this',
+                   context_l,
+                   flags=re.IGNORECASE) is not None:
         return True
-    if re.search(
-            r'(?:an|a|any)\s+', context_l,
-            flags=re.IGNORECASE) is not None and re.search(
-                r'(?:the|this)\s+', context_l, flags=re.IGNORECASE) is None:
+    if eure.search(r'(?:an|a|any)\s+', context_l,
+                   flags=re.IGNORECASE) is not None and eure.search(
+                       r'(?:the|this)\s+', context_l,
+                       flags=re.IGNORECASE) is None:
         return True
     if not token.text.istitle():
         return True
-    if token.text.isupper() and re.search(r'SECTION|PART|TITLE',
-                                          falgs=re.IGNORECASE) is not None:
+    if token.text.isupper() and eure.search(r'SECTION|PART|TITLE',
+                                            falgs=re.IGNORECASE) is not None:
         return True
 
     return False
@@ -220,24 +312,215 @@ def _is_not_act(
 
 def _has_range_indicator(token_text):
 
-    if re.search(r'to|-|et *seq[\.]*', token_text,
-                 flags=re.IGNORECASE) is not None:
+    if eure.search(r'to|-|et *seq[\.]*', token_text,
+                   flags=re.IGNORECASE) is not None:
         return True
     else:
         return False
 
 
 def _has_qualifier(text):
-    if re.search(eure.entities['references']['qualifiers'], text) is not None:
+    if eure.search(eure.entities['references']['qualifiers'],
+                   text) is not None:
         return True
     else:
         return False
 
 
+class NumRange(namedtuple('NumRange', ['kind', 'lower', 'upper'])):
+    """Range of element numbers of a reference (e.g. "Articles 1 to 500" or "points (a) to (z)")
+
+    Kept as its kind ('num', 'roman' or 'letter') and bounds instead of a list of all its numbers.
+    The numbers are generated on iteration (see `nums`). As a tuple, the range survives
+    `Doc.to_bytes()` (as a list of its fields).
+    """
+
+    __slots__ = ()
+
+    @property
+    def size(self):
+        """Number of element numbers in the range"""
+
+        return max(self.upper - self.lower + 1, 0)
+
+    def nums(self):
+        """The element numbers of the range (str), one after the other"""
+
+        to_str = {
+            'num': str,
+            'roman': utils.int_to_roman,
+            'letter': utils.int_to_letter
+        }[self.kind]
+
+        for num in range(self.lower, self.upper + 1):
+            yield to_str(num)
+
+
+_reference_fields = ('type', 'relation', 'subpar_element',
+                     'subpar_element_num', 'element', 'element_num', 'act',
+                     'act_id')
+
+
+class Reference(Mapping):
+    """A resolved reference (see `resolve_reference_entities`)
+
+    A record with a slot per field instead of a dictionary, its strings are interned (the same
+    element, act and relation strings recur in every document). It reads like the dictionary it
+    replaces (`reference['act']`, `reference.get('relation')`, `dict(reference)`, ...) but cannot
+    be modified (see `replace`).
+    """
+
+    __slots__ = _reference_fields
+
+    def __init__(self,
+                 type=None,
+                 relation=None,
+                 subpar_element=None,
+                 subpar_element_num=None,
+                 element=None,
+                 element_num=None,
+                 act=None,
+                 act_id=None):
+
+        for field, value in zip(
+                _reference_fields,
+            (type, relation, subpar_element, subpar_element_num, element,
+             element_num, act, act_id)):
+            if isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Reference is read-only, use `replace`")
+
+    def __getitem__(self, key):
+
+        if key not in _reference_fields:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(_reference_fields)
+
+    def __len__(self):
+        return len(_reference_fields)
+
+    def __repr__(self):
+        return f"Reference({', '.join(f'{field}={getattr(self, field)!r}' for field in _reference_fields)})"
+
+    def __reduce__(self):
+        return (Reference, tuple(getattr(self, f) for f in _reference_fields))
+
+    def replace(self, **fields):
+        """A copy of the reference with the given fields replaced"""
+
+        return Reference(**dict(self, **fields))
+
+
+_range_fields = ['subpar_element_num', 'element_num']
+
+
+def _num_range(value):
+    """The range of a reference field (NumRange, or a list of its fields after `Doc.to_bytes()`),
+    None if the field is not a range"""
+
+    if isinstance(value, NumRange):
+        return value
+    elif isinstance(value, (list, tuple)):
+        return NumRange(*value)
+    else:
+        return None
+
+
+def reference_size(reference):
+    """Number of references a reference (dictionary) stands for, i.e. the numbers of its ranges
+    (see `NumRange`) counted without generating them
+
+    Parameters
+    ----------
+    reference: dict
+        the reference (see `resolve_reference_entities`)
+
+    Returns
+    -------
+    int
+        number of references
+
+    """
+
+    size = 1
+
+    for field in _range_fields:
+        num_range = _num_range(reference.get(field))
+        if num_range is not None:
+            size *= num_range.size
+
+    return size
+
+
+def expand_references(references):
+    """The references with one reference per element number of their ranges (see `NumRange`)
+
+    Parameters
+    ----------
+    references: list
+        the references (dictionaries, see `resolve_reference_entities`)
+
+    Yields
+    ------
+    Reference
+        the references, each range replaced by one of its numbers
+
+    """
+
+    for reference in references:
+
+        ranges = {
+            field: _num_range(reference.get(field))
+            for field in _range_fields
+        }
+        ranges = {
+            field: num_range
+            for field, num_range in ranges.items() if num_range is not None
+        }
+
+        if not ranges:
+            yield Reference(**reference)
+            continue
+
+        for nums in itertools.product(*[r.nums() for r in ranges.values()]):
+            yield Reference(**dict(reference, **dict(zip(ranges, nums))))
+
+
+def _first_num(num):
+    """The first element number of a range (or the element number itself)"""
+
+    if isinstance(num, NumRange):
+        return next(num.nums())
+    return num
+
+
+def _without_first_num(refs):
+    """The (element, element number) combinations without the first element number"""
+
+    if len(refs) == 0:
+        return refs
+
+    element, num = refs[0]
+
+    if isinstance(num, NumRange):
+        rest = num._replace(lower=num.lower + 1)
+        return [(element, rest if rest.size > 1 else _first_num(rest))
+                ] + refs[1:]
+
+    return refs[1:]
+
+
 # resolve ranges
 def _resolve_range(text):
     # identify range in text
-    range_match = re.search(
+    range_match = eure.search(
         r'(?:\(*([0-9]+(?:[a-z]{0,1})|[a-z]|[IXV])\)*)\s*(?:to|-)\s*(?:\(*([0-9]+(?:[a-z]{0,1})|[a-z]|[IXV])\)*)',
         text)
     if range_match is not None:
@@ -252,16 +535,18 @@ def _resolve_range(text):
         upper = int(upper)
     except:
         try:
-            if re.search(r'[IVX]', lower.upper()) is not None and re.search(
-                    r'[IVX]', upper.upper()) is not None:
+            if eure.search(r'[IVX]',
+                           lower.upper()) is not None and eure.search(
+                               r'[IVX]', upper.upper()) is not None:
                 try:
                     input = "roman"
                     lower = utils.roman_to_int(lower.upper())
                     upper = utils.roman_to_int(upper.upper())
                 except:
                     return [text]
-            elif re.search(r'[a-z]', lower.lower()) is not None and re.search(
-                    r'[a-z]', upper.lower()) is not None:
+            elif eure.search(r'[a-z]',
+                             lower.lower()) is not None and eure.search(
+                                 r'[a-z]', upper.lower()) is not None:
 
                 try:
                     input = "letter"
@@ -277,20 +562,111 @@ def _resolve_range(text):
             return [text]
 
     try:
-        range_nums = [i for i in range(lower, upper + 1)]
+        num_range = NumRange(input, lower, upper)
+        size = num_range.size
     except:
         return [text]
 
-    if input == "num":
-        return [str(num) for num in range_nums]
-    elif input == "roman":
-        return [utils.int_to_roman(num) for num in range_nums]
-    elif input == "letter":
-        return [utils.int_to_letter(num) for num in range_nums]
+    # the numbers are only generated when the references are iterated (see `expand_references`)
+    if size > 1:
+        return [num_range]
+    else:
+        return list(num_range.nums())
+
+
+def reference_candidates(text, triggers=None):
+    """Find the reference-like parts of a text (element .... of ... act/act_el, element .* and acts),
+    anchored at the element and act keywords of the text
+
+    The element and act keywords are found in one pass (or only matched at the trigger words). Then
+    each expression is still matched separately: `ref_element_acts` and `ref_elements` only where an
+    element keyword starts, and `ref_acts` is only searched for as long as act keywords follow. The
+    candidates are the same as those of searching the whole text for each of the expressions
+    (`re.finditer`).
+
+    Parameters
+    ----------
+    text: str
+        the text to search
+    triggers: list, optional
+        start chars of the trigger words in the text (see `Triggers`, e.g. found once for all
+        subparagraphs of an article). As all keywords start with a trigger word, the keywords are then
+        only matched there instead of searching the whole text.
+
+    Returns
+    -------
+    list
+        (type, match) tuples of the 'element_act', 'element' and 'act' candidates (grouped by type in
+        this order and ordered by position within each type)
+
+    """
+
+    flags = re.IGNORECASE | re.MULTILINE
+
+    element_starts = []
+    act_starts = []
 
+    if triggers is None:
+        keywords = eure.finditer(eure.entities['references']['ref_keywords'],
+                                 text,
+                                 flags=flags)
+    else:
+        keywords = [
+            keyword for keyword in (
+                eure.match(eure.entities['references']['ref_keywords'],
+                           text,
+                           flags=flags,
+                           pos=start) for start in triggers)
+            if keyword is not None
+        ]
 
-def match_reference_text(span, match_on="all"):
+    for keyword in keywords:
+        if keyword.start('element') >= 0:
+            element_starts.append(keyword.start())
+        if keyword.start('act') >= 0:
+            act_starts.append(keyword.start())
+
+    candidates = []
+
+    # element_act and element candidates start with an element keyword
+    for type, expression in [('element_act', 'ref_element_acts'),
+                             ('element', 'ref_elements')]:
+        end = 0
+        for start in element_starts:
+            # overlapping matches are skipped, as by re.finditer
+            if start < end:
+                continue
+            match = eure.match(eure.entities['references'][expression],
+                               text,
+                               flags=flags,
+                               pos=start)
+            if match is not None:
+                candidates.append((type, match))
+                end = match.end()
+
+    # act candidates start before (qualifiers, prefixes) and end after an act keyword
+    pos = 0
+    while act_starts and pos <= act_starts[-1]:
+        # `ref_acts_search` skips the starts within runs of whitespace and words, except at pos
+        match = eure.match(eure.entities['references']['ref_acts'],
+                           text,
+                           flags=flags,
+                           pos=pos) or eure.search(
+                               eure.entities['references']['ref_acts_search'],
+                               text,
+                               flags=flags,
+                               pos=pos + 1)
+        if match is None:
+            break
+        candidates.append(('act', match))
+        pos = match.end()
+
+    return candidates
+
+
+def match_reference_text(span, match_on="all", triggers=None):
     # return a list of reference-like text regex match elements for a given text (text, pos, sentence/line)
+    # triggers: start chars of the trigger words in the span text (see `Triggers`), only used if match_on="all"
 
     if match_on == "sentences":
         sentences = utils.get_sentences(span, min_sen_length=10)
@@ -311,131 +687,156 @@ def match_reference_text(span, match_on="all"):
         })
 
     for sentence in sentences:
-        # 1 Capture all element .... of ... act/act_el
-        matches_element_act = re.finditer(
-            eure.entities['references']['ref_element_acts'],
-            sentence.text,
-            flags=re.IGNORECASE | re.MULTILINE)
+        # 1 element .... of ... act/act_el, 2 element .* and 3 acts
         [
-            add_to_match_list(match, sentence, type="element_act")
-            for match in matches_element_act
+            add_to_match_list(match, sentence, type=type)
+            for type, match in reference_candidates(
+                sentence.text,
+                triggers=triggers if match_on == "all" else None)
         ]
 
-        # 2 Capture all element .*
-        matches_element = re.finditer(
-            eure.entities['references']['ref_elements'],
-            sentence.text,
-            flags=re.IGNORECASE | re.MULTILINE)
-        [
-            add_to_match_list(match, sentence, type="element")
-            for match in matches_element
-        ]
+    return ref_match_list
 
-        # 3 Capture all acts
-        matches_act = re.finditer(eure.entities['references']['ref_acts'],
-                                  sentence.text,
-                                  flags=re.IGNORECASE | re.MULTILINE)
-        [
-            add_to_match_list(match, sentence, type="act")
-            for match in matches_act
-        ]
 
-    return ref_match_list
+def _add_matches(ma1, ma2):
+    """Combine two overlapping reference candidates (match dicts, see `match_reference_text`)
 
+    An element contained in an element_act or act is absorbed by it, otherwise the combination spans
+    from the start of the first to the end of the second candidate (with the type of the first).
+    """
 
-def reference_spans(doclike, label="REFERENCE", match_on="all"):
-    """Wrapper for the whole process of identifying references, taking a doc or span object and returning a set of spans with the referneces contained in the span listed in the ._.references extension = [{ref1}, {ref2}]"""
+    ma_a = None
 
-    def range_intersect(r1, r2):
-        return range(max(r1.start, r2.start), min(r1.stop, r2.stop)) or None
-
-    def _combine_overlapping_matches(match_list):
-
-        combined_list_1 = []
-        combined_list_2 = []
-
-        def add_matches(ma1, ma2):
-
-            ma_a = None
-
-            # if 2 is contained in 1
-            if ma1['string_start'] <= ma2['string_start'] and ma1[
-                    'string_end'] >= ma2['string_end']:
-                if (
-                        ma1['type'] == "element_act" and
-                    (ma2['type'] == "element")
-                ) or (
-                        ma1['type'] == "act" and (ma2['type'] == "element")
-                ):  # if element is contained in element_act or element is contained in act (rely onn splitting later on to differentiate both)
-                    ma_a = ma1
-            # if 1 is contained in two
-            if ma2['string_start'] <= ma1['string_start'] and ma2[
-                    'string_end'] >= ma1['string_end']:
-                if (ma2['type'] == "element_act" and
-                    (ma1['type'] == "element")) or (
-                        ma2['type'] == "act" and (ma1['type'] == "element")):
-                    ma_a = ma2
-
-            if ma_a is None:
-                ma_a = {
-                    'type': ma1['type'],
-                    'start': ma1['start'],
-                    'end': ma2['end'],
-                    'string_start': ma1['string_start'],
-                    'string_end': ma2['string_end'],
-                    'sentence': ma1['sentence'],
-                    'match':
-                    ma1['sentence'][ma1['string_start']:ma2['string_end']]
-                }
-
-            return (ma_a)
-
-        matches_type_1 = [m for m in match_list if m['type'] == "element_act"]
-        matches_type_o = [
-            ma for ma in match_list if ma['type'] != "element_act"
-        ]
+    # if 2 is contained in 1
+    if ma1['string_start'] <= ma2['string_start'] and ma1['string_end'] >= ma2[
+            'string_end']:
+        if (ma1['type'] == "element_act" and (ma2['type'] == "element")) or (
+                ma1['type'] == "act" and (ma2['type'] == "element")
+        ):  # if element is contained in element_act or element is contained in act (rely onn splitting later on to differentiate both)
+            ma_a = ma1
+    # if 1 is contained in two
+    if ma2['string_start'] <= ma1['string_start'] and ma2['string_end'] >= ma1[
+            'string_end']:
+        if (ma2['type'] == "element_act" and
+            (ma1['type'] == "element")) or (ma2['type'] == "act" and
+                                            (ma1['type'] == "element")):
+            ma_a = ma2
 
-        for m1 in matches_type_1:  # 2 and 3 into 1
-            for mo in list(matches_type_o):
-                m1_range = range(m1['string_start'], m1['string_end'])
-                if m1['sentence'] == mo['sentence']:
-                    mo_range = range(mo['string_start'], mo['string_end'])
-                    if range_intersect(m1_range, mo_range) is not None or (
-                            m1_range.stop == mo_range.start):
-                        m1 = add_matches(m1, mo)
-                        matches_type_o.remove(mo)
-                    #else:
-                    #    combined_list_1.append(mo)
-
-            combined_list_1.append(m1)
-
-        # add remaining matches of types 2 and 3 again
-        combined_list_1 = combined_list_1 + matches_type_o
-
-        # 3 into 2
-        matches_type_1 = [
-            ma for ma in combined_list_1 if ma['type'] == "element_act"
-        ]
-        matches_type_2 = [
-            ma for ma in combined_list_1 if ma['type'] == "element"
-        ]
-        matches_type_3 = [ma for ma in combined_list_1 if ma['type'] == "act"]
+    if ma_a is None:
+        ma_a = {
+            'type': ma1['type'],
+            'start': ma1['start'],
+            'end': ma2['end'],
+            'string_start': ma1['string_start'],
+            'string_end': ma2['string_end'],
+            'sentence': ma1['sentence'],
+            'match': ma1['sentence'][ma1['string_start']:ma2['string_end']]
+        }
+
+    return (ma_a)
+
+
+class _Candidates:
+    """Reference candidates of one type, which do not overlap each other (ordered by position), and
+    from which candidates are removed as they are absorbed by others"""
+
+    def __init__(self, matches):
+
+        self.matches = matches
+        self._ends = [m['string_end'] for m in matches]
+        # the next remaining candidate from each index on (path compressed on lookup)
+        self._next = list(range(len(matches) + 1))
+
+    def _find(self, i):
+
+        root = i
+        while self._next[root] != root:
+            root = self._next[root]
 
-        for m2 in matches_type_2:
-            for m3 in list(matches_type_3):
-                m2_range = range(m2['string_start'], m2['string_end'])
-                if m2['sentence'] == m3['sentence']:
-                    m3_range = range(m3['string_start'], m3['string_end'])
-                    if range_intersect(m2_range, m3_range) is not None:
-                        m2 = add_matches(m2, m3)
-                        matches_type_3.remove(m3)
+        while self._next[i] != root:
+            self._next[i], i = root, self._next[i]
 
-            combined_list_2.append(m2)
+        return root
 
-        # add remaining type 3 matches again
-        combined_list_2 = matches_type_1 + combined_list_2 + matches_type_3
+    def following(self, pos):
+        """Indices of the remaining candidates ending after pos, in order (candidates removed while
+        iterating are skipped)"""
 
-        return (combined_list_2)
+        i = self._find(bisect.bisect_right(self._ends, pos))
+
+        while i < len(self.matches):
+            yield i
+            i = self._find(i + 1)
+
+    def remove(self, i):
+
+        self._next[i] = i + 1
+
+    def remaining(self):
+
+        return [self.matches[i] for i in self.following(-1)]
+
+
+def _combine_overlapping_matches(match_list):
+    """Combine the overlapping reference candidates of a text (see `match_reference_text`)
+
+    First, the element_act candidates absorb the element and then the act candidates they overlap or
+    touch, then the element candidates absorb the act candidates they overlap (see `_add_matches`),
+    each candidate in order of position and the absorbed ones are removed.
+
+    As the candidates of each type do not overlap each other, those absorbed by a candidate follow
+    each other: starting from the first remaining candidate ending after its start (binary search),
+    a candidate absorbs the following ones until one starts after its (updated) end.
+
+    Parameters
+    ----------
+    match_list: list
+        the match dicts of the candidates of a text
+
+    Returns
+    -------
+    list
+        the combined element_act, element and remaining act match dicts
+
+    """
+
+    element_acts = [m for m in match_list if m['type'] == "element_act"]
+    elements = _Candidates([m for m in match_list if m['type'] == "element"])
+    acts = _Candidates([m for m in match_list if m['type'] == "act"])
+
+    # 2 and 3 into 1 (overlapping or touching)
+    combined_element_acts = []
+
+    for m1 in element_acts:
+        for candidates in [elements, acts]:
+            for i in candidates.following(m1['string_start']):
+                mo = candidates.matches[i]
+                if mo['string_start'] > m1['string_end']:
+                    break
+                m1 = _add_matches(m1, mo)
+                candidates.remove(i)
+
+        combined_element_acts.append(m1)
+
+    # 3 into 2 (overlapping)
+    combined_elements = []
+
+    for m2 in elements.remaining():
+        for i in acts.following(m2['string_start']):
+            m3 = acts.matches[i]
+            if m3['string_start'] >= m2['string_end']:
+                break
+            m2 = _add_matches(m2, m3)
+            acts.remove(i)
+
+        combined_elements.append(m2)
+
+    # add remaining type 3 matches again
+    return combined_element_acts + combined_elements + acts.remaining()
+
+
+def reference_spans(doclike, label="REFERENCE", match_on="all", triggers=None):
+    """Wrapper for the whole process of identifying references, taking a doc or span object and returning a set of spans with the referneces contained in the span listed in the ._.references extension = [{ref1}, {ref2}]"""
 
     def _process_match(match):
 
@@ -501,7 +902,7 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
             new_ref_pos = [
                 (m.start(), m.end())
                 for reg in eure.entities['split_references']
-                for m in re.finditer(
+                for m in eure.finditer(
                     reg, match['match'], flags=re.IGNORECASE | re.MULTILINE)
             ]
 
@@ -526,11 +927,9 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
             if len(submatch['match'].strip()) == 0:  #  sort out empty matches
                 continue
 
-            submatch_span = doclike[utils.char_to_token(
-                submatch['string_start'], doclike_char_token):utils.
-                                    char_to_token(submatch['string_end'],
-                                                  doclike_char_token,
-                                                  alignment_mode="expand")]
+            submatch_span = doclike[doclike_tokens.char_to_token(
+                submatch['string_start']):doclike_tokens.char_to_token(
+                    submatch['string_end'], alignment_mode="expand")]
 
             if submatch_span.text.strip() != submatch['match'].strip():
                 submatch_span_aligned = utils.align_span_with_text(
@@ -555,21 +954,21 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
 
             # rule out any non-references via regex dict
             if any([
-                    re.search(p, match_token_text, flags=re.IGNORECASE)
+                    eure.search(p, match_token_text, flags=re.IGNORECASE)
                     is not None for p in eure.entities['non_references']
             ]):
                 continue
             # if no element and only act and act is Article
-            if re.search(eure.entities['references']['elements'],
-                         match_token_text,
-                         flags=re.IGNORECASE) is None and re.search(
-                             eure.entities['references']['act_types'],
-                             match_token_text,
-                             flags=re.IGNORECASE) is None:
+            if eure.search(eure.entities['references']['elements'],
+                           match_token_text,
+                           flags=re.IGNORECASE) is None and eure.search(
+                               eure.entities['references']['act_types'],
+                               match_token_text,
+                               flags=re.IGNORECASE) is None:
                 continue
 
             # if reference is merely self ref to whole act (list re.findall construction is necessary bc regex matches whitespace)
-            if not _has_element_num(match_token_text) and re.search(
+            if not _has_element_num(match_token_text) and eure.search(
                     r'(?:this|present)\s+[A-Z]+[a-z]*',
                     match_token_text,
                     flags=re.MULTILINE) is not None:
@@ -578,8 +977,8 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
             # Element only without num (e.g. of Articles, of an Article, this Article, this Title etc)
             if _has_element(match_token_text
                             ) and not _has_element_num(match_token_text):
-                if re.search(r'annex', match_token_text,
-                             flags=re.IGNORECASE) is None:
+                if eure.search(r'annex', match_token_text,
+                               flags=re.IGNORECASE) is None:
                     continue
 
             # Act without capitalization (e.g. "unanimous agreement")
@@ -591,13 +990,16 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
             if _has_act(
                     match_token_text) and not _has_element(match_token_text):
 
-                act_match = re.search(eure.entities['references']['act_types'],
-                                      match_token_text.strip(),
-                                      flags=re.MULTILINE | re.IGNORECASE)
+                act_match = eure.search(
+                    eure.entities['references']['act_types'],
+                    match_token_text.strip(),
+                    flags=re.MULTILINE | re.IGNORECASE)
 
                 if act_match is not None:
-                    act_match_token = submatch_span[utils.char_to_token(
-                        act_match.start() + 1, submatch_span)]
+                    submatch_tokens = utils.TokenOffsets.from_doc(
+                        submatch_span)
+                    act_match_token = submatch_span[
+                        submatch_tokens.char_to_token(act_match.start() + 1)]
 
                     act_match_token_text = act_match_token.text
 
@@ -606,13 +1008,15 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
 
                     if act_match.start() < 3:
                         # get n 2 lef tokens and check
+                        context = utils.doc_token_context(act_match_token.doc)
                         prefix = [
-                            t.text.lower()
-                            for t in utils.get_n_left(3, act_match_token)
+                            t.lower_ for t in act_match_token.doc[slice(
+                                *context.window(act_match_token.i, 3))]
                         ]
                         suffix = [
-                            t.text.lower()
-                            for t in utils.get_n_right(3, act_match_token)
+                            t.lower_
+                            for t in act_match_token.doc[slice(*context.window(
+                                act_match_token.i, 3, direction="right"))]
                         ]
                     else:
                         # get string until act match
@@ -639,10 +1043,10 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
                     # check if act is 'quoted'
                     if any([
                             True for fix in list(prefix)
-                            if re.search(r"[‘’\']", fix)
+                            if eure.search(r"[‘’\']", fix)
                     ]) and [
                             True for fix in list(suffix)
-                            if re.search(r"[‘’\']", fix)
+                            if eure.search(r"[‘’\']", fix)
                     ]:
                         continue
                     # check for 'the text of the Agreement is attache to this decision'
@@ -658,13 +1062,13 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
 
         return cleaned_matches
 
-    doclike_char_token = utils.chars_to_tokens_dict(doclike,
-                                                    input="as_ref",
-                                                    output="as_ref")
+    doclike_tokens = utils.TokenOffsets.from_doc(doclike)
 
     # first, match the possible references in the text
 
-    match_list = match_reference_text(doclike, match_on="all")
+    match_list = match_reference_text(doclike,
+                                      match_on="all",
+                                      triggers=triggers)
 
     # then, combine overlapping candidates
     match_list_c = _combine_overlapping_matches(match_list)
@@ -675,6 +1079,8 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
 
     for matc in match_list_c:
 
+        utils.check_time_budget()
+
         #mat_refs = _parse_refs(mat) # this shall return references from a match dict
         #if mat_refs is not None and len(mat_refs > 0):
         # safety checks
@@ -685,9 +1091,52 @@ def reference_spans(doclike, label="REFERENCE", match_on="all"):
     return (ents_list)
 
 
+TokenFeatures = namedtuple('TokenFeatures', [
+    'subpar_element', 'subpar_element_num', 'element', 'element_num', 'act',
+    'act_identifier', 'act_identifier_part', 'separator', 'qualifier',
+    'range_indicator', 'filler'
+])
+
+
+@lru_cache(maxsize=2**16)
+def _token_features(text):
+    """The token classes `resolve_reference_entities` checks the tokens of references for (subpar
+    elements, element nums, acts, separators, ...), computed once per distinct token text
+
+    `subpar_element_num` only checks the text, tokens that are like numbers also count as subpar
+    element nums (see `_has_subpar_element_num`).
+    """
+
+    return TokenFeatures(
+        subpar_element=_has_subpar_element(text),
+        subpar_element_num=eure.search(
+            eure.entities['references']['element_nums'], text) is not None,
+        element=_has_element(text),
+        element_num=_has_element_num(text),
+        act=_has_act(text),
+        act_identifier=_has_act_identifier(text),
+        act_identifier_part=bool(_is_act_identifier(text)),
+        separator=bool(_has_separator(text)),
+        qualifier=_has_qualifier(text),
+        range_indicator=_has_range_indicator(text),
+        # fillers between a separator and the next num/identifier
+        filler=eure.search('^in$', text, flags=re.MULTILINE) is not None)
+
+
+def _right_context(entity):
+    """The text of a reference entity and the (up to) 5 tokens from its last token on (see
+    `resolve_reference_entities`)"""
+
+    context = utils.doc_token_context(entity.doc)
+
+    return entity.text_with_ws + context.text(
+        *context.window(entity.end - 1, 5, direction="right"))
+
+
 def resolve_reference_entities(entity):  # or count?
     """Identify and label the references contianed in a ref entity
-    return list of references (as dictionaries) contained in a match/string
+    return list of references (`Reference` records) contained in a match/string
+    ranges of element numbers are kept as `NumRange`s (see `expand_references`)
     # @TODO: hier weiter
     """
 
@@ -712,26 +1161,24 @@ def resolve_reference_entities(entity):  # or count?
 
             # if this -> int
             if act is not None:
-                if re.search(
-                        f'^\s*this\s*{eure.entities["references"]["act_type_prefixes"]}*\s*{eure.entities["references"]["act_subtype_prefixes"]}*\s*(?:[a-z0-9-,]+\s+){{0,1}}{eure.entities["references"]["act_types"]}',
-                        act,
-                        flags=re.MULTILINE) is not None:
+                if eure.search(eure.entities['references']['this_act'],
+                               act,
+                               flags=re.MULTILINE) is not None:
                     relation = "internal"
 
             # if len (act) == 0 -> int
             else:
                 relation = "internal"
 
-        reference_list.append({
-            'type': type,
-            'relation': relation,
-            'subpar_element': subpar_element,
-            'subpar_element_num': subpar_element_num,
-            'element': element,
-            'element_num': element_num,
-            'act': act,
-            'act_id': act_id,
-        })
+        reference_list.append(
+            Reference(type=type,
+                      relation=relation,
+                      subpar_element=subpar_element,
+                      subpar_element_num=subpar_element_num,
+                      element=element,
+                      element_num=element_num,
+                      act=act,
+                      act_id=act_id))
 
     entity_parts = {
         'prefix': [],
@@ -753,14 +1200,15 @@ def resolve_reference_entities(entity):  # or count?
 
         if token.is_space:
             continue
+
+        features = _token_features(token.text)
+
         if append_next_token_to is not None:
-            if _has_element_num(token.text) or _has_act_identifier(token.text):
+            if features.element_num or features.act_identifier:
                 entity_parts[append_next_token_to][-1] += token.text_with_ws
                 append_next_token_to = None
                 continue
-            elif re.search(
-                    '^in$', token.text, flags=re.MULTILINE
-            ) is not None:  # if filler between separator, try next token
+            elif features.filler:  # if filler between separator, try next token
                 continue
             else:
                 append_next_token_to = None
@@ -772,7 +1220,7 @@ def resolve_reference_entities(entity):  # or count?
 
         # CHECK FOR (SUBPAR) ELEMENTS and ACTS
         # check for (sub)paragraoh level elements
-        if _has_subpar_element(token.text):
+        if features.subpar_element:
             if append_this and len(entity_parts['subpar_element']) == 0:
                 entity_parts['subpar_element'].append('this ' +
                                                       token.text_with_ws)
@@ -784,7 +1232,7 @@ def resolve_reference_entities(entity):  # or count?
             last_token = "subpar_element"
             continue
         # check if element
-        elif _has_element(token.text):
+        elif features.element:
             if append_this and len(entity_parts['element']) == 0:
                 entity_parts['element'].append('this ' + token.text_with_ws)
                 append_this = False
@@ -795,7 +1243,7 @@ def resolve_reference_entities(entity):  # or count?
             last_token = "element"
             continue
         # check if act
-        elif _has_act(token.text) and not _is_not_act(token):
+        elif features.act and not _is_not_act(token):
             if append_this and len(entity_parts['act']) == 0:
                 entity_parts['act'].append('this ' + token.text_with_ws)
                 append_this = False
@@ -810,9 +1258,9 @@ def resolve_reference_entities(entity):  # or count?
         # CHECK FOR IDENTIFIERS/NUMS
         if last_token == "subpar_element":
             # check if numlike or has element tim
-            if _has_qualifier(token.text):  # check for qualifier ('of')
+            if features.qualifier:  # check for qualifier ('of')
                 continue
-            if _has_subpar_element_num(token):
+            if token.like_num or features.subpar_element_num:
                 if not last_token_sep:
                     entity_parts['subpar_element_num'].append(
                         token.text_with_ws)
@@ -825,7 +1273,7 @@ def resolve_reference_entities(entity):  # or count?
                 continue
         elif last_token == "element":
             # check if numlike or has element tim
-            if _has_element_num(token.text):
+            if features.element_num:
                 if not last_token_sep:
                     entity_parts['element_num'].append(token.text_with_ws)
 
@@ -836,12 +1284,12 @@ def resolve_reference_entities(entity):  # or count?
                 last_token = "element_num"
                 continue
             elif 'annex' in entity_parts['element'][-1].lower(
-            ) and not _has_element_num(token.text):  # annex does not need num
+            ) and not features.element_num:  # annex does not need num
                 entity_parts['element_num'].append("")
                 last_token = "element_num"
                 continue
         elif last_token == "act":
-            if _is_act_identifier(token.text):
+            if features.act_identifier_part:
                 if not last_token_sep:
                     entity_parts['act_id'].append(token.text_with_ws)
                 else:
@@ -851,14 +1299,14 @@ def resolve_reference_entities(entity):  # or count?
                 continue
         # append to previous subpar_element_num, element_num or act_id depending on last_token
         elif last_token == "element_num" or last_token == "act_id" or last_token == "subpar_element_num":
-            if _has_separator(token.text):
+            if features.separator:
                 last_token_sep = True
                 continue
-            elif _has_qualifier(token.text):  # check for qualifier ('of')
+            elif features.qualifier:  # check for qualifier ('of')
                 continue
 
             if last_token == "act_id":
-                if _is_act_identifier(token.text):
+                if features.act_identifier_part:
                     if not last_token_sep:
                         entity_parts['act_id'][-1] += token.text_with_ws
                     else:
@@ -869,13 +1317,13 @@ def resolve_reference_entities(entity):  # or count?
             elif last_token == "subpar_element_num":
                 if 'annex' not in entity_parts.get(
                         'subpar_element',
-                    [" "])[-1].lower() and _has_range_indicator(token.text):
+                    [" "])[-1].lower() and features.range_indicator:
                     entity_parts['subpar_element_num'][
                         -1] += " " + token.text + " "
                     last_token = "subpar_element_num"
                     append_next_token_to = "subpar_element_num"  # overwrite any other logic and append
                     continue
-                if _has_subpar_element_num(token):
+                if token.like_num or features.subpar_element_num:
                     if not last_token_sep:
                         entity_parts['subpar_element_num'][-1] += (
                             token.text_with_ws)
@@ -887,13 +1335,13 @@ def resolve_reference_entities(entity):  # or count?
                     continue
             elif last_token == "element_num":
                 if 'annex' not in entity_parts.get(
-                        'element', [" "])[-1].lower() and _has_range_indicator(
-                            token.text):
+                        'element',
+                    [" "])[-1].lower() and features.range_indicator:
                     entity_parts['element_num'][-1] += " " + token.text + " "
                     last_token = "element_num"
                     append_next_token_to = "element_num"  # overwrite any other logic and append
                     continue
-                if _has_element_num(token.text):
+                if features.element_num:
                     if not last_token_sep:
                         entity_parts['element_num'][-1] += (token.text_with_ws)
                     else:
@@ -1001,10 +1449,9 @@ def resolve_reference_entities(entity):  # or count?
     #  pre-determine some special case relation types
     relation = None
     # if n right contain amendment specifications -> external
-    context = entity.text_with_ws + "".join(
-        [t.text_with_ws for t in utils.get_n_right(5, entity[-1])])
-    if re.search('(?:is|are).{1,4}(deleted|amended|replaced)',
-                 context) is not None:
+    context = _right_context(entity)
+    if eure.search('(?:is|are).{1,4}(deleted|amended|replaced)',
+                   context) is not None:
         relation = "external"
 
     def _num_element_combinations(elements, element_nums):
@@ -1044,7 +1491,7 @@ def resolve_reference_entities(entity):  # or count?
 
             if i_element < n_element:
                 element = element_refs[i_element][0]
-                element_num = element_refs[i_element][1]
+                element_num = _first_num(element_refs[i_element][1])
 
             if i_act < n_act:
                 act = act_refs[i_act][0]
@@ -1060,7 +1507,9 @@ def resolve_reference_entities(entity):  # or count?
 
             i_subpar += 1
 
-        i_element += 1
+        # the subparagraph elements took the first element number (of a range)
+        element_refs = _without_first_num(element_refs)
+        n_element = len(element_refs)
         i_act += 1
 
     if n_element > i_element:
@@ -1116,3 +1565,428 @@ def resolve_reference_entities(entity):  # or count?
         i_act += 1
 
     return reference_list
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class ReferenceCache:
+    """Bounded LRU memo of resolved references (see `resolve_reference_entities`)
+
+    The same references (e.g. "Article 290 TFEU") recur across the documents of a corpus. A
+    reference entity is keyed by all the resolver reads: the text, whitespace and number likeness of
+    its tokens, the left context of the tokens that look like acts (see `_is_not_act`)
+    and the right context of the entity (see `_right_context`). Entities with the same key are
+    resolved to the same references, so the references are resolved once per key and the same
+    (read-only) `Reference` records are returned for the other entities.
+
+    A cache can be shared by the reference search components of a process (see `reference_cache`),
+    also across threads: the memo is only read and changed under a lock (entities are resolved
+    outside of it, so an entity may be resolved twice by concurrent threads).
+    """
+
+    def __init__(self, maxsize=4096):
+        """
+        Parameters
+        ----------
+        maxsize: int, optional
+            number of entities whose references are kept (the least recently used ones are
+            dropped), 0 to disable the cache
+
+        """
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._references = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, entity):
+
+        tokens = tuple((t.text, t.whitespace_, t.like_num) for t in entity)
+        act_contexts = tuple(
+            _left_context(t) for t in entity
+            if not t.is_space and _token_features(t.text).act)
+
+        return tokens, act_contexts, _right_context(entity)
+
+    def resolve(self, entity):
+        """The references of a reference entity (see `resolve_reference_entities`), resolved once per
+        key
+
+        Parameters
+        ----------
+        entity: Span
+            the reference entity
+
+        Returns
+        -------
+        list
+            the references (`Reference` records)
+
+        """
+
+        if self.maxsize <= 0:
+            with self._lock:
+                self.misses += 1
+            return resolve_reference_entities(entity)
+
+        key = self._key(entity)
+
+        with self._lock:
+            references = self._references.get(key)
+            if references is not None:
+                self.hits += 1
+                self._references.move_to_end(key)
+            else:
+                self.misses += 1
+
+        if references is None:
+            references = resolve_reference_entities(entity)
+            with self._lock:
+                self._references[key] = references
+                if len(self._references) > self.maxsize:
+                    self._references.popitem(last=False)
+
+        return list(references)
+
+    def cache_info(self):
+        """Hits, misses, maximum and current size of the cache (as `functools.lru_cache`)"""
+
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._references))
+
+    def cache_clear(self):
+        """Drop all references and reset the hit and miss counters"""
+
+        with self._lock:
+            self._references.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# shared by the reference search components of a process (e.g. a worker of `nlp.pipe`)
+reference_cache = ReferenceCache()
+
+_range_kinds = ('num', 'roman', 'letter')
+
+
+class ReferenceStore:
+    """Columnar store of the references of the reference entities of a doc (`doc._.reference_store`)
+
+    The references are kept in arrays, one per field, of ids in a string table of the doc (-1 for
+    None). The ranges of element numbers (see `NumRange`) are kept in arrays of their kinds
+    (indices of `_range_kinds`, -1 if the field is not a range) and bounds. The references of the
+    i-th entity (char offsets `starts[i]`, `ends[i]`) are the rows `offsets[i]:offsets[i + 1]`.
+
+    `span._.references` reads the `Reference` records of a span from the store and `count` and
+    exporters scan the arrays without creating them. Replacing the references of a span appends
+    them and marks the rows of the span as deleted; the deleted rows are dropped when the store is
+    serialized (see `to_dict`).
+    """
+
+    def __init__(self):
+
+        self.strings = []
+        self._string_ids = {}
+        self.starts = array('q')
+        self.ends = array('q')
+        self.offsets = array('q', [0])
+        self.columns = {field: array('i') for field in _reference_fields}
+        self.ranges = {
+            field: (array('b'), array('q'), array('q'))
+            for field in _range_fields
+        }
+        # span (start char, end char) -> i of the spans with references (not deleted)
+        self._index = {}
+        self._n_deleted_rows = 0
+
+    def __len__(self):
+        """Number of references (rows, without the deleted ones)"""
+
+        return self.offsets[-1] - self._n_deleted_rows
+
+    def _string_id(self, value):
+
+        if value is None:
+            return -1
+        if not isinstance(value, str):
+            raise TypeError(
+                f"Reference fields must be strings, None or NumRanges, not {value!r}"
+            )
+
+        string_id = self._string_ids.get(value)
+
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+
+        return string_id
+
+    def _row_slices(self, spans=None):
+        """Rows (start, end) of the spans (not deleted) among the given spans (all if None)"""
+
+        if spans is None and self._n_deleted_rows == 0:
+            return [(0, self.offsets[-1])]
+
+        return [(self.offsets[i], self.offsets[i + 1])
+                for span, i in sorted(self._index.items(),
+                                      key=lambda item: item[1])
+                if spans is None or span in spans]
+
+    def set(self, start_char, end_char, references):
+        """Set the references of a span (char offsets)
+
+        Parameters
+        ----------
+        start_char: int
+            start char of the span
+        end_char: int
+            end char of the span
+        references: list
+            the references (`Reference` records or dictionaries), None to remove the references of
+            the span
+
+        """
+
+        i = self._index.pop((start_char, end_char), None)
+
+        if i is not None:
+            # the rows of the span are kept until the store is compacted (see `to_dict`)
+            self._n_deleted_rows += self.offsets[i + 1] - self.offsets[i]
+
+        if references is None:
+            return
+
+        for reference in references:
+            for field in _reference_fields:
+                value = reference.get(field)
+                num_range = _num_range(value) if field in self.ranges else None
+                if num_range is not None:
+                    kinds, lowers, uppers = self.ranges[field]
+                    kinds.append(_range_kinds.index(num_range.kind))
+                    lowers.append(num_range.lower)
+                    uppers.append(num_range.upper)
+                    value = None
+                elif field in self.ranges:
+                    kinds, lowers, uppers = self.ranges[field]
+                    kinds.append(-1)
+                    lowers.append(0)
+                    uppers.append(0)
+                self.columns[field].append(self._string_id(value))
+
+        self._index[(start_char, end_char)] = len(self.starts)
+        self.starts.append(start_char)
+        self.ends.append(end_char)
+        self.offsets.append(len(self.columns['type']))
+
+    def _value(self, field, row):
+
+        if field in self.ranges:
+            kinds, lowers, uppers = self.ranges[field]
+            if kinds[row] >= 0:
+                return NumRange(_range_kinds[kinds[row]], lowers[row],
+                                uppers[row])
+
+        string_id = self.columns[field][row]
+
+        return None if string_id < 0 else self.strings[string_id]
+
+    def get(self, start_char, end_char):
+        """The references (`Reference` records) of a span (char offsets), None if the store has
+        none for the span"""
+
+        i = self._index.get((start_char, end_char))
+
+        if i is None:
+            return None
+
+        return [
+            Reference(*(self._value(field, row)
+                        for field in _reference_fields))
+            for row in range(self.offsets[i], self.offsets[i + 1])
+        ]
+
+    def count(self, spans=None):
+        """Number of references per relation, the numbers of the ranges counted arithmetically (see
+        `reference_size`)
+
+        Parameters
+        ----------
+        spans: set, optional
+            (start char, end char) of the spans whose references are counted, all if None
+
+        Returns
+        -------
+        Counter
+            number of references per relation
+
+        """
+
+        relations = self.columns['relation']
+        row_slices = self._row_slices(spans)
+
+        # each reference once (counted in C) ...
+        relation_counts = Counter()
+        for start, end in row_slices:
+            relation_counts.update(relations[start:end])
+
+        # ... plus the other numbers of the references with ranges (the rows whose kind is not -1)
+        range_rows = sorted({
+            match.start()
+            for kinds, _, _ in self.ranges.values()
+            for match in re.finditer(b'[^\\xff]', kinds.tobytes())
+        })
+
+        for start, end in row_slices:
+            first = bisect.bisect_left(range_rows, start)
+            last = bisect.bisect_left(range_rows, end)
+            for row in range_rows[first:last]:
+                size = 1
+                for kinds, lowers, uppers in self.ranges.values():
+                    if kinds[row] >= 0:
+                        size *= max(uppers[row] - lowers[row] + 1, 0)
+                relation_counts[relations[row]] += size - 1
+
+        return Counter({
+            (self.strings[relation] if relation >= 0 else None):
+            count
+            for relation, count in relation_counts.items()
+        })
+
+    def compact(self):
+        """Drop the deleted rows (and the strings only they used)"""
+
+        if self._n_deleted_rows == 0 and len(self._index) == len(self.starts):
+            return
+
+        spans = [(start, end, self.get(start, end)) for (
+            start,
+            end), _ in sorted(self._index.items(), key=lambda item: item[1])]
+
+        self.__init__()
+
+        for start, end, span_references in spans:
+            self.set(start, end, span_references)
+
+    def to_dict(self):
+        """The store as strings and bytes (e.g. to survive `Doc.to_bytes()`), compacted first (see
+        `compact`)"""
+
+        self.compact()
+
+        return {
+            'strings': list(self.strings),
+            'starts': self.starts.tobytes(),
+            'ends': self.ends.tobytes(),
+            'offsets': self.offsets.tobytes(),
+            'columns': {
+                field: column.tobytes()
+                for field, column in self.columns.items()
+            },
+            'ranges': {
+                field: [values.tobytes() for values in ranges]
+                for field, ranges in self.ranges.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """The store of `to_dict`"""
+
+        store = cls()
+
+        store.strings = list(data['strings'])
+        store._string_ids = {
+            string: string_id
+            for string_id, string in enumerate(store.strings)
+        }
+        store.starts = array('q', data['starts'])
+        store.ends = array('q', data['ends'])
+        store.offsets = array('q', data['offsets'])
+        store.columns = {
+            field: array('i', column)
+            for field, column in data['columns'].items()
+        }
+        store.ranges = {
+            field:
+            tuple(
+                array(typecode, values)
+                for typecode, values in zip('bqq', ranges))
+            for field, ranges in data['ranges'].items()
+        }
+        store._index = {
+            span: i
+            for i, span in enumerate(zip(store.starts, store.ends))
+        }
+
+        return store
+
+
+def reference_store(doc):
+    """The reference store of a doc (`doc._.reference_store`, see `ReferenceStore`)
+
+    The store is kept in `doc.user_data` and only packed into strings and bytes (see
+    `ReferenceStore.to_dict`) when the doc is serialized (see `utils.PackedValue`). Packed data
+    (e.g. of `Doc.from_bytes()`) is unpacked once per doc.
+    """
+
+    data = doc.user_data.get(('eucy', 'references'))
+
+    if isinstance(data, utils.PackedValue):
+        return data.value
+
+    store = ReferenceStore() if data is None else ReferenceStore.from_dict(
+        data)
+    doc.user_data[('eucy',
+                   'references')] = utils.PackedValue(store,
+                                                      ReferenceStore.to_dict)
+
+    return store
+
+
+def set_references(doc, span_references):
+    """Store the references of spans of a doc (see `ReferenceStore`)
+
+    Parameters
+    ----------
+    doc: Doc
+        the doc
+    span_references: list
+        (span, references) tuples
+
+    """
+
+    store = reference_store(doc)
+
+    for span, references in span_references:
+        store.set(span.start_char, span.end_char, references)
+
+
+def _span_references_getter(span):
+    """Getter of `span._.references` (the references of the span in the store of its doc)"""
+
+    return reference_store(span.doc).get(span.start_char, span.end_char)
+
+
+def _span_references_setter(span, references):
+    """Setter of `span._.references`"""
+
+    set_references(span.doc, [(span, references)])
+
+
+def set_references_extension():
+    """Register `span._.references` (the references of the span in the store of its doc, see
+    `ReferenceStore`), replacing an extension of the same name without the store getter"""
+
+    utils.register_packed_value_encoder()
+
+    if Span.has_extension("references") and Span.get_extension(
+            "references")[2] is _span_references_getter:
+        return
+
+    Span.set_extension("references",
+                       getter=_span_references_getter,
+                       setter=_span_references_setter,
+                       force=True)
@@ -1,24 +1,43 @@
 """Main module."""
 
-import warnings
+import weakref
 from collections import Counter
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import List, Optional
 
 from spacy.language import Language
 from spacy.pipeline.dep_parser import DEFAULT_PARSER_MODEL
 from spacy.tokens import Doc
 
-from eucy import content, elements, entities, structure
+from eucy import elements, entities, structure
 from eucy.entities import references
 from eucy.tokenizer import retokenizer, tokenizer
-from eucy.utils import (get_element_by_match, get_element_by_num,
-                        set_extensions, timeout)
+from eucy.utils import (get_element_by_match, get_element_by_num, has_stage,
+                        set_extensions, stage_time_budget, user_data_value)
+
+# default time budget per stage and document (in seconds)
+DEFAULT_TIME_BUDGETS = {
+    'structure': 30,
+    'elements': 60,
+    'references': 60,
+    'complexity': 30
+}
+
+# names of the euCy pipeline components per stage (in pipeline order)
+PIPES = {
+    'structure': 'eucy_structure',
+    'elements': 'eucy_elements',
+    'references': 'eucy_references',
+    'complexity': 'eucy_complexity'
+}
 
 
 class EuWrapper:
-    """EuCy wrapper class for a spacy Language object
-        (not a real pipeline component)"""
+    """EuCy wrapper class for a spacy Language object, adding the euCy tokenizer and pipeline components
+        (see `PIPES`) to it"""
 
-    def __init__(self, nlp, debug=False):
+    def __init__(self, nlp, debug=False, time_budgets=None, disable=None):
         """
         Initialize EuWrapper object
 
@@ -26,9 +45,19 @@ class EuWrapper:
         Parameters
         ----------
         nlp : spacy Language object
-            Spacy Language object to be wrapped
+            Spacy Language object to be wrapped. The euCy components are added to its pipeline
+            (e.g. `nlp.select_pipes(disable=["eucy_complexity"])` disables a stage).
         debug : bool, optional
             Whether to print debug information, by default False
+        time_budgets : dict, optional
+            Time budget in seconds per document for each stage ('structure', 'elements', 'references', 'complexity'),
+            by default `DEFAULT_TIME_BUDGETS`. A stage exceeding its budget is stopped, its partial results are kept
+            and the stage is listed in `doc._.timeouts`. Use None as a value to disable the budget for a stage. The
+            budgets are checked between steps: a single long regex search is only bounded with the match timeout of
+            the `regex` backend (see `eucy.regex.set_backend`).
+        disable : list of str, optional
+            Stages (e.g. ['references']) not to run when processing a document. They are still run on demand
+            when a complexity measure depending on them is read from `doc._.complexity`.
 
 
         """
@@ -37,36 +66,47 @@ class EuWrapper:
             raise TypeError("nlp must be a spacy Language object")
 
         nlp.tokenizer = tokenizer(nlp)
-        nlp.add_pipe("retokenizer", last=True, name="retokenizer")
+        if "retokenizer" not in nlp.pipe_names:
+            nlp.add_pipe("retokenizer", last=True, name="retokenizer")
 
         self.debug = debug
 
-        # @TODO add retokenizer pipe after tokenizer
+        self.time_budgets = dict(DEFAULT_TIME_BUDGETS)
+        if time_budgets is not None:
+            self.time_budgets.update(time_budgets)
 
         self.nlp = nlp
 
-        self.EuStructure = structure.Structure()
-        self.EuElements = elements.Elements()
-
-        self.EuReferenceSearch = entities.EntitySearch(
-            name="references",
-            nlp=self.nlp,
-            matcher=references.ReferenceMatcher,
-            overwrite_ents=True,
-            debug=self.debug)
-
         # Register extensions
         set_extensions()
 
-        #
+        for stage, pipe_name in PIPES.items():
+            if pipe_name in nlp.pipe_names:
+                # e.g. a pipeline loaded from disk
+                continue
+
+            config = {'time_budget': self.time_budgets.get(stage)}
+            if stage == 'references':
+                config['debug'] = self.debug
+
+            nlp.add_pipe(pipe_name, last=True, config=config)
+
+        for stage in disable or []:
+            nlp.disable_pipe(PIPES.get(stage, stage))
+
+        self.EuStructure = nlp.get_pipe(PIPES['structure'])
+        self.EuElements = nlp.get_pipe(PIPES['elements'])
+        self.EuReferenceSearch = nlp.get_pipe(PIPES['references'])
+        self.EuComplexity = nlp.get_pipe(PIPES['complexity'])
 
         # Span.set_extension("parent_elements", default = None, getter = "") # @TODO assign function to check whether span is encased by other spans and return their attributes as dict in list
 
-    @timeout(180)
     def __call__(self, doc):
         """
         Call EuCy wrapper on a spacy Doc object and add EU law specific attributes to the doc object. Add `SpanGroup` objects (`spans` attribute) and fills various custom extensions (`_` attribute) to the doc object.
 
+        Strings are processed by the full pipeline, Doc objects by the enabled euCy components.
+
         Parameters
         ----------
         doc : spacy Doc object
@@ -78,65 +118,65 @@ class EuWrapper:
 
         # if possible, check if doc or string is passed and convert to doc if string
         if isinstance(doc, str):
-            doc = self.nlp(doc)
+            return self.nlp(doc)
         elif not isinstance(doc, Doc):
             raise TypeError("doc must be a spacy Doc object or a string")
 
-        doc._.title = content.find_title(doc)
+        if doc._.complexity is not None:
+            # already processed by the pipeline
+            return doc
 
-        if (len(doc.text.strip()) - len(doc._.title.strip())) < 500:
-            doc._.no_text = True
+        for name, proc in self.nlp.pipeline:
+            if name not in PIPES.values():
+                continue
 
-        if not doc._.no_text:
-            if doc._.parts is None and hasattr(self, 'EuStructure'):
-                doc = self.EuStructure(doc)
-            elif doc._.parts is not None:
-                pass
-            else:
-                warnings.warn("doc object does not have Structure Component.")
-
-            if doc._.article_elements is None:
-                doc = self.EuElements(doc)
-
-            doc = self.EuReferenceSearch(doc)
-            if doc._.complexity is None:
-                # get complexity measures
-                doc._.complexity = {
-                    'citations': citation_count(doc),
-                    'recitals': recital_count(doc),
-                    'articles': article_count(doc),
-                    'structural_size': structural_size(doc, "all"),
-                    'structural_size_enacting':
-                    structural_size(doc, "enacting"),
-                    'references': reference_count(doc),
-                    'avg_depth': avg_depth(doc, basis='element'),
-                    'avg_article_depth': avg_depth(doc, basis='article'),
-                    'words_noannex': word_count(doc, annex=False)
-                }
+            if name == PIPES['elements'] and doc._.article_elements is not None:
+                # pre-annotated (e.g. modified) doc
+                continue
+
+            doc = proc(doc)
 
         return doc
 
+    def pipe(self, texts, batch_size=16, n_process=1, as_tuples=False):
+        """
+        Process a stream of texts and yield the annotated Doc objects in input order (see `Language.pipe`).
 
-def citation_count(doc):
+        Parameters
+        ----------
+        texts : iterable of str or spacy Doc objects
+            The texts to process. If `as_tuples` is True, an iterable of (text, context) tuples.
+        batch_size : int, optional
+            Number of texts sent to a worker at a time, by default 16
+        n_process : int, optional
+            Number of processes to use, by default 1. -1 uses all available cores.
+        as_tuples : bool, optional
+            Whether `texts` are (text, context) tuples, by default False. The context (e.g. the CELEX id)
+            is passed through and yielded as (doc, context) tuples.
+
+        Yields
+        ------
+        spacy Doc object (or (Doc, context) tuple if `as_tuples` is True)
+        """
+
+        yield from self.nlp.pipe(texts,
+                                 batch_size=batch_size,
+                                 n_process=n_process,
+                                 as_tuples=as_tuples)
 
-    if not 'citations' in doc.spans:
-        # if function is called outside spacy pipeline
 
-        EuDoc = EuWrapper
+def citation_count(doc):
 
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     return (len(doc.spans['citations']))
 
 
 def recital_count(doc):
 
-    if not 'recitals' in doc.spans:
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     return (len(doc.spans['recitals']))
 
@@ -150,13 +190,8 @@ def count_articles():
 
 
 def matched_articles_count(doc):
-    if not doc.has_extension("parts") or not doc.has_extension(
-            "article_elements"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     return (len(doc.spans['articles']))
 
@@ -165,26 +200,16 @@ def last_matched_article_num(doc):
 
     raise NotImplementedError
 
-    if not doc.has_extension("parts") or not doc.has_extension(
-            "article_elements"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     # @TODO (see older analysis)
     pass
 
 
 def article_count(doc):
-    if not doc.has_extension("parts") or not doc.has_extension(
-            "article_elements"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     # @TODO methods in older analysis
     ## using distance measures
@@ -194,13 +219,8 @@ def article_count(doc):
 
 def structural_size(doc, parts="all"):
 
-    if not doc.has_extension("parts") or not doc.has_extension(
-            "article_elements"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     enacting_size = 0
 
@@ -225,13 +245,8 @@ def structural_size(doc, parts="all"):
 
 def avg_depth(doc, basis="element"):
 
-    if not doc.has_extension("parts") or not doc.has_extension(
-            "article_elements"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     depths = {1: 0, 2: 0, 3: 0}
 
@@ -291,33 +306,26 @@ def avg_depth(doc, basis="element"):
 
 def reference_count(doc):
 
-    if not doc.has_extension("parts") or not doc.has_extension(
-            "article_elements"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements', 'references')
 
     ref_count = Counter()
     ref_count['internal'] = 0
     ref_count['external'] = 0
 
-    for ent in doc.ents:
-        if ent.label_ == "REFERENCE":
-            for ref in ent._.references:
-                ref_count[ref.get('relation', 'NONE')] += 1
+    # scan the reference store of the doc (a reference with a range of element numbers counts once
+    # per number)
+    ref_count.update(
+        references.reference_store(doc).count(
+            spans={(ent.start_char, ent.end_char)
+                   for ent in doc.ents if ent.label_ == "REFERENCE"}))
 
     return ref_count
 
 
 def word_count(doc, annex=False):
-    if not doc.has_extension("parts"):
-        # if function is called outside spacy pipeline
-
-        EuDoc = EuWrapper
-
-        doc = EuDoc(doc)
+    # if function is called outside spacy pipeline, run the stages it depends on (if missing)
+    require_stages(doc, 'elements')
 
     word_count = sum([len(r) for r in doc.spans['recitals']]) + sum([
         len(c) for c in doc.spans['citations']
@@ -327,3 +335,220 @@ def word_count(doc, annex=False):
         word_count += len(doc.spans['annex'])
 
     return word_count
+
+
+# complexity measures stored in doc._.complexity
+complexity_measures = {
+    'citations': citation_count,
+    'recitals': recital_count,
+    'articles': article_count,
+    'structural_size': lambda doc: structural_size(doc, "all"),
+    'structural_size_enacting': lambda doc: structural_size(doc, "enacting"),
+    'references': reference_count,
+    'avg_depth': lambda doc: avg_depth(doc, basis='element'),
+    'avg_article_depth': lambda doc: avg_depth(doc, basis='article'),
+    'words_noannex': lambda doc: word_count(doc, annex=False)
+}
+
+# pipeline stages each complexity measure depends on (run on first access if missing)
+measure_stages = {
+    'citations': ['elements'],
+    'recitals': ['elements'],
+    'articles': ['elements'],
+    'structural_size': ['elements'],
+    'structural_size_enacting': ['elements'],
+    'references': ['elements', 'references'],
+    'avg_depth': ['elements'],
+    'avg_article_depth': ['elements'],
+    'words_noannex': ['elements']
+}
+
+# Complexity component that processed a doc, used to run missing stages with the doc's pipeline
+_doc_components = weakref.WeakKeyDictionary()
+
+
+class LazyComplexity(Mapping):
+    """Read-only mapping of the complexity measures of a doc (`doc._.complexity`)
+
+    Measures not computed by the complexity component (see `Complexity`) are computed the first time they
+    are read, running only the pipeline stages they depend on (see `measure_stages`). Computed values are
+    stored in `doc.user_data` and survive serialization.
+    """
+
+    def __init__(self, doc):
+
+        self.doc = doc
+        self._values = user_data_value(doc, 'complexity')
+
+    def __getitem__(self, name):
+
+        if name in self._values:
+            return self._values[name]
+
+        if name not in complexity_measures:
+            raise KeyError(name)
+
+        component = require_stages(self.doc, *measure_stages[name])
+
+        # measures not computed within the time budget are None
+        value = None
+        with stage_time_budget(self.doc, 'complexity', component.time_budget):
+            value = complexity_measures[name](self.doc)
+
+        self._values[name] = value
+
+        return value
+
+    def __iter__(self):
+
+        yield from complexity_measures
+        yield from (name for name in self._values
+                    if name not in complexity_measures)
+
+    def __len__(self):
+
+        return len(set(complexity_measures) | set(self._values))
+
+    def computed(self):
+        """Return the measures computed so far as a dict"""
+
+        return dict(self._values)
+
+    def __repr__(self):
+
+        pending = [name for name in self if name not in self._values]
+
+        return f"LazyComplexity({self._values!r}, pending={pending!r})"
+
+
+def require_stages(doc, *stages):
+    """Run the given stages on the doc unless they have already produced results (see `utils.has_stage`)
+
+    Stages are run with the components of the pipeline that processed the doc (if any).
+
+    Parameters
+    ----------
+    doc : spacy Doc object
+    stages : str
+        'structure', 'elements' and/or 'references'
+
+    Returns
+    -------
+    Complexity
+        the complexity component providing the stage components
+    """
+
+    component = _doc_components.get(doc)
+    if component is None:
+        component = _default_complexity(doc.vocab)
+
+    for stage in stages:
+        if not _stage_done(doc, stage):
+            component.stage_component(stage)(doc)
+
+    return component
+
+
+def _stage_done(doc, stage):
+
+    if has_stage(doc, stage):
+        return True
+
+    # pre-annotated (e.g. modified) docs
+    if stage == 'structure':
+        return doc._.parts is not None
+    elif stage == 'elements':
+        return doc._.article_elements is not None
+
+    return False
+
+
+class Complexity:
+    """Provides the complexity measures (see `complexity_measures`) of a document in doc._.complexity
+
+    Measures whose stages have run (e.g. not the references if reference search is disabled) and those
+    in `measures` are computed when the component is called, the others when they are first read
+    (see `LazyComplexity`)."""
+
+    def __init__(self, nlp, measures=None, time_budget=None):
+
+        set_extensions()
+
+        if measures is None:
+            measures = []
+
+        unknown = [m for m in measures if m not in complexity_measures]
+        if unknown:
+            raise ValueError(
+                f"Unknown complexity measure(s): {', '.join(unknown)}")
+
+        self.nlp = nlp
+        self.measures = measures
+        self.time_budget = time_budget
+
+        # stage components used if the pipeline does not contain them
+        self._stage_components = {}
+
+    def __call__(self, doc):
+
+        if doc._.no_text or doc._.parts is None or doc._.complexity is not None:
+            # no text, structure timed out or already processed
+            return doc
+
+        doc._.complexity = {}
+        _doc_components[doc] = self
+
+        complexity = doc._.complexity
+
+        for name, stages in measure_stages.items():
+            if name in self.measures or all(
+                    _stage_done(doc, stage) for stage in stages):
+                complexity[name]
+
+        return doc
+
+    def stage_component(self, stage):
+        """Return the component running a stage, preferring the (possibly disabled) pipeline component"""
+
+        if PIPES[stage] in self.nlp.component_names:
+            return self.nlp.get_pipe(PIPES[stage])
+
+        if stage not in self._stage_components:
+            time_budget = DEFAULT_TIME_BUDGETS[stage]
+
+            if stage == 'structure':
+                component = structure.Structure(time_budget=time_budget)
+            elif stage == 'elements':
+                component = elements.Elements(time_budget=time_budget)
+            else:
+                component = entities.EntitySearch(
+                    nlp=self.nlp,
+                    name=PIPES['references'],
+                    matcher=references.ReferenceMatcher,
+                    overwrite_ents=True,
+                    time_budget=time_budget)
+
+            self._stage_components[stage] = component
+
+        return self._stage_components[stage]
+
+
+@lru_cache(maxsize=8)
+def _default_complexity(vocab):
+    """Complexity component for docs not processed by a euCy pipeline in this process (e.g. deserialized docs)"""
+
+    return Complexity(Language(vocab),
+                      time_budget=DEFAULT_TIME_BUDGETS['complexity'])
+
+
+@Language.factory("eucy_complexity",
+                  default_config={
+                      "measures": None,
+                      "time_budget": None
+                  },
+                  assigns=["doc._.complexity"])
+def make_complexity(nlp: Language, name: str, measures: Optional[List[str]],
+                    time_budget: Optional[float]):
+    """Pipeline component providing the complexity measures of a document (see `Complexity`)"""
+
+    return Complexity(nlp=nlp, measures=measures, time_budget=time_budget)
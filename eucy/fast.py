@@ -0,0 +1,98 @@
+"""Tokenization-free annotation of the structure and elements of EU legal texts
+
+Works on plain strings and returns char offsets without building a spaCy Doc, e.g. for corpus-wide
+element counts. spaCy's tokenization is approximated (see `utils.TokenOffsets.from_text`), so element
+boundaries and counts can differ slightly from the Doc based pipeline (`eucy.eucy.EuWrapper`).
+"""
+
+from eucy import elements as euelements
+from eucy import structure as eustructure
+from eucy import utils
+
+
+def structure(text):
+    """Split a text into its parts (see `structure.text_parts`)
+
+    Parameters
+    ----------
+    text: str
+        the text to be split
+
+    Returns
+    -------
+    dict
+        the parts ('citations', 'recitals', 'enacting', 'enacting_with_toc', 'annex') as
+        (start_char, end_char) tuples (or None)
+
+    """
+
+    tokens = utils.TokenOffsets.from_text(text)
+
+    return {
+        name: None if part is None else tokens.span_chars(*part)
+        for name, part in eustructure.text_part_tokens(tokens).items()
+    }
+
+
+def elements(text):
+    """Find the citations, recitals and articles of a text
+
+    Parameters
+    ----------
+    text: str
+        the text to be annotated
+
+    Returns
+    -------
+    dict
+        lists of (start_char, end_char) tuples for 'citations', 'recitals' and 'articles'
+
+    """
+
+    tokens = utils.TokenOffsets.from_text(text)
+    parts = eustructure.text_part_tokens(tokens)
+
+    element_finders = {
+        'citations': ('citations', euelements.citation_tokens),
+        'recitals': ('recitals', euelements.recital_tokens),
+        'articles': ('enacting', euelements.article_tokens)
+    }
+
+    offsets = {}
+
+    for name, (part_name, find) in element_finders.items():
+
+        part = parts[part_name]
+
+        if part is None:
+            offsets[name] = []
+            continue
+
+        part_tokens = tokens.window(*part)
+        part_start_char = tokens.span_chars(*part)[0]
+
+        offsets[name] = [
+            (part_start_char + start_char, part_start_char + end_char)
+            for start_char, end_char in (part_tokens.span_chars(start, end)
+                                         for start, end in find(part_tokens))
+        ]
+
+    return offsets
+
+
+def count(text):
+    """Count the citations, recitals and articles of a text
+
+    Parameters
+    ----------
+    text: str
+        the text to be annotated
+
+    Returns
+    -------
+    dict
+        the number of 'citations', 'recitals' and 'articles'
+
+    """
+
+    return {name: len(spans) for name, spans in elements(text).items()}
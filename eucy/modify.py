@@ -4,7 +4,8 @@ import warnings
 import spacy
 from spacy.tokens import Doc, Span, SpanGroup
 
-from eucy.utils import set_extensions
+from eucy.eucy import PIPES
+from eucy.utils import mark_stage, set_extensions
 
 
 def add_element(doc, new_text, element_type=None, position='end', add_ws=True):
@@ -254,8 +255,11 @@ def modify_doc(doc,
     if not return_doc:
         return new_text
 
-    # create new doc
-    new_doc = nlp(new_text)
+    # create new doc (euCy annotations are recovered from the original doc below)
+    with nlp.select_pipes(disable=[
+            name for name in nlp.pipe_names if name in PIPES.values()
+    ]):
+        new_doc = nlp(new_text)
 
     if not add_spans:
         return new_doc
@@ -280,7 +284,7 @@ def modify_doc(doc,
     # recover _.parts
 
     if not doc.has_extension('parts'):
-        Doc.set_extension('parts', default=None, force=True)
+        set_extensions()
 
     part_names = ['citations', 'recitals', 'enacting', 'enacting_w_toc']
 
@@ -363,8 +367,9 @@ def modify_doc(doc,
                                       alignment_mode='expand')
         new_parts['annex'] = new_annex
 
-    # add new parts to new doc
+    # add new parts to new doc (recovered, so the structure stage does not need to run again)
     new_doc._.parts = new_parts
+    mark_stage(new_doc, 'structure')
 
     # @TODO possible to recover article_elements? -> otherwise elements might no be detected by e.g. elemount count as in current setup -> adjust eucywrapper to work with preconfiugred spans
     # re-run eu-wrapper to get complexity and other metadata
@@ -1,6 +1,39 @@
-"""Dictionaries of expressions used across the package"""
+"""Dictionaries of expressions used across the package and the compiled expressions
+
+The expressions are compiled with `re` or, e.g. to set match timeouts, with the third-party `regex`
+module (see `set_backend`).
+"""
 
 import re
+import sys
+import warnings
+from functools import lru_cache
+
+from eucy import exceptions
+
+try:
+    import regex as _regex
+except ImportError:
+    _regex = None
+
+# atomic groups are supported by `regex` and by `re` from Python 3.11 on (see `compiled`)
+_re_atomic_groups = sys.version_info >= (3, 11)
+
+_atomic_group = re.compile(r'(?<!\\)\(\?>')
+
+
+def atomic(expression):
+    """Wrap an expression in an atomic group, i.e. never backtrack into what it has matched
+
+    Only use it where backtracking cannot lead to other matches (e.g. a run of whitespace followed by
+    a word), so the matches are the same with and without it. If the selected backend does not support
+    atomic groups (`re` before Python 3.11), `compiled` replaces them by non-capturing groups (same
+    matches, without the bound on backtracking).
+
+    """
+
+    return f'(?>{expression})'
+
 
 structure = {
     'enacting_start':
@@ -21,16 +54,20 @@ structure = {
     r'(?=^\s*ARTICLE\s*(?:1|[Oo]ne)[A-Za-z0-9,\- ]{0,200}$|^\s*SOLE\s*ARTICLE\s*$)',
     'done_at_start':
     r'^(?=\s*Done[\s]+(?:a[a-z]*\s*|in\s+|\.{2,3}\s+))',
+    'back_start_lenient':
+    r'(^)(?=(?:[\(\[][0-9]+[\)\]])|(?:[A-Z]{3,}))',
     'toc_start':
     r'.(?=TABLE[\s]*OF[\s]*CONTENTS|\sTOC\s)',
     'toc_start_lenient':
     r'^(?=[\s*]Contents)',
     'toc_lines':
     r'(?:^[A-Za-z ]+\s+[0-9IXV]+\s+[^\n]{2,200}$)+?(?=\s+(?:^[A-Za-z ]+\s+[0-9IXV]+\s+[^\n]{2,200}$))',
+    'expl_memo_start':
+    r'(?=explanatory\s*memorandum)',
     'proposal_start':
     r'^\s*proposal\s*for\s*',
     'proposal_law_start':
-    r'^\s*(?:[AZ]*\s*Regulation|Regulation\s*of|Directive\s*of|Recommendation\s*for\s*a|Decision\s*on\s*|[AZ]{4,}\s*Decision)'
+    r'^\s*(?:(?:[AZ]+\s*)?Regulation|Regulation\s*of|Directive\s*of|Recommendation\s*for\s*a|Decision\s*on\s*|[AZ]{4,}\s*Decision)'
 }
 
 elements = {
@@ -40,7 +77,7 @@ elements = {
     'recital_par_start': r'(^)[ ]*(?=[A-Z0-9][^\n]{20,})(?!H[aA][SsVv])',
     'citation': structure['citations_start'] + r'(?:.*)',
     'article_identifier':
-    r'^[\s]*[\[\s*]*A[A-Za-z]{6}[\s]*[0-9]{1,8}[\s]*[0-9]*[a-z]{0,1}(?:\sbis){0,1}(?=[\n]*[0-9]\.|[\s]*[0-9]+\s*[\,\/]\s*[0-9]|[\n]*\(|[\n]*[A-Z]|[\s]*[A-Z]|[\s]*–|[\s]*-)(?!\s*of\s|f\s|\s*shall\s|hall\s|\s*is\s|s\s|[0-9]*,|[0-9]* and|[0-9]*[\n]{1,}Article(?!.*(?:shall|of| is ))|,|[0-9]*\([0-9]{1,3}\)|[ \t]*\([0-9]|[ ]*TFEU|[ ]*of|[ ]*shall)',
+    r'^[\s]*(?:[\[*][\[\s*]*)?A[A-Za-z]{6}[\s]*[0-9]{1,8}[\s]*[0-9]*[a-z]{0,1}(?:\sbis){0,1}(?=[\n]*[0-9]\.|[\s]*[0-9]+\s*[\,\/]\s*[0-9]|[\n]*\(|[\n]*[A-Z]|[\s]*[A-Z]|[\s]*–|[\s]*-)(?!\s*of\s|f\s|\s*shall\s|hall\s|\s*is\s|s\s|[0-9]*,|[0-9]* and|[0-9]*[\n]{1,}Article(?!.*(?:shall|of| is ))|,|[0-9]*\([0-9]{1,3}\)|[ \t]*\([0-9]|[ ]*TFEU|[ ]*of|[ ]*shall)',
     'single_article_identifier': r'(?:^Sole\s*Article|^Single\s*Article)\s*$',
     'article_num': r'Article\s*([0-9 ]+(?:[a-z]\s)*)',
     'article_any_num': r'[0-9 ]+(?:[a-z]\s)*',
@@ -68,7 +105,8 @@ entities = {
         'elements':
         r'(?:article[s]*|paragraph[s]*|point[s]*|sentence[s]*|indent[s]*|annex[es]*|(?<!other\s)part(?:[^a-z]}|s)|section[s]*|chapter[s]*|title[s]*)',
         'element_nums':
-        r'(?:[0-9IVX \(\)]+(?:[a-z ]\))*(?:(?:[ 0-9\(\)]|[a-z]{0,3}|[ABC])[\s\.]+)*\s*)',
+        r'(?:[0-9IVX \(\)]+(?:[a-z ]\))*(?:(?:[ 0-9\(\)]|[a-z]{0,3}|[ABC])' +
+        atomic(r'[\s\.]+') + r')*\s*)',
         'separators':
         r'(?:[,& \s]|(?:and)|(?:or)|(?:to|-)|(?:et\s*seq[\.]*)\s*)',
         'qualifiers':
@@ -79,8 +117,12 @@ entities = {
         r'(?:Council|Parliament|Cooperation|Commission|Unece|International)',
         'act_types':
         r'(?:thereof|hereto|TFEU|TEU|Regulation[s]*|Protocol[s]*|Decision[s]*|Directive[s]*|Resolution[s]*|Recommendation[s]*|Treat[yies]+|Protocol[s]*|Convention[s]*|Agreement[s]*|Arrangement[s]*|Report[s]*|Resolution[s]*|Opinion[s]*)',
+        # the text up to the first end of the identifiers (always found, at the latest at the end of the line),
+        # never extended afterwards
         'act_identifiers':
-        r'(?:.*?(?:[\n;%]|(?<!\.)\.(?!\.+)|\[[0-9]+\]|$|entry\s*into\s*force\s*of|shall\s|in\sorder\s|because\s|\sany\s|and\s(?=[A-Z]{5,})|and\sin|or\sin|will\s|by\s|with\s|are\s|\sis\s|notwithstanding\s|for\s|not\s|until\s|under\s))',
+        atomic(
+            r'.*?(?:[\n;%]|(?<!\.)\.(?!\.+)|\[[0-9]+\]|$|entry\s*into\s*force\s*of|shall\s|in\sorder\s|because\s|\sany\s|and\s(?=[A-Z]{5,})|and\sin|or\sin|will\s|by\s|with\s|are\s|\sis\s|notwithstanding\s|for\s|not\s|until\s|under\s)'
+        ),
     },
     'non_references': [
         r'This [A-Z]+[a-z]* shall', r'hereinafter\s*referred\s*to\s*as',
@@ -97,9 +139,212 @@ entities['references']['act_types_el'] = re.sub(
     entities['references']['act_types'])
 entities['references'][
     'ref_element_acts'] = f'{entities["references"]["elements"]}.{{0,35}}of{entities["references"]["act_identifiers"]}'
+# the elements, numbers and separators following an element, as many as possible (taken one way only, as
+# nothing follows them)
+entities['references'][
+    'ref_elements'] = f'{entities["references"]["elements"]}\s*' + atomic(
+        f'(?:\s|{entities["references"]["elements"]}|{entities["references"]["separators"]}|{entities["references"]["prefixes"]}|{entities["references"]["element_nums"]})+'
+    )
+# prefixes and qualifiers before acts, matched one way only: the "of" and "to" before qualifiers are
+# matched as prefixes, "this" before qualifiers as a qualifier and each run of whitespace at once
+_whitespace = atomic(r'\s*')
+_whitespace_1 = atomic(r'\s+')
+entities['references'][
+    'act_qualifiers'] = r'(?:of|with|in|to|this(?!\s*(?:the|this))|\s*(?:the|this)' + _whitespace + r'(?:present)*)'
+_act_word = atomic(r'[a-z0-9-,]+')
+_act_parts = {
+    'qualifiers':
+    entities["references"]["act_qualifiers"],
+    'prefixes':
+    entities["references"]["act_type_prefixes"],
+    'subtypes':
+    entities["references"]["act_subtype_prefixes"],
+    'word':
+    f'(?:{_act_word}{_whitespace_1}){{0,1}}',
+    'act':
+    f'{entities["references"]["act_types"]}\s*{entities["references"]["act_identifiers"]}'
+}
+entities['references']['ref_acts'] = (
+    '{qualifiers}*{prefixes}*{ws}{subtypes}*{ws}{word}{act}'.format(
+        ws=_whitespace, **_act_parts))
+# ref_acts, only starting at the start of a run of whitespace and, within a word, not starting with the word before
+# the act type. A match starting elsewhere would also match from the char before, so searching from a
+# position finds the same matches as `ref_acts` if it does not match at the position itself (see
+# `entities.references.reference_candidates`), in linear instead of quadratic time in the length of the run.
+# Within a word, the ways to match are those of ref_acts in the same order, by what is matched first.
+entities['references']['ref_acts_search'] = (
+    r'(?:(?<!\s)|(?!\s))(?:(?:(?<![a-z0-9,-])|(?![a-z0-9,-])){ref_acts}|'
+    r'(?:{qualifiers}+{prefixes}*{ws}{subtypes}*{ws}{word}{act}|{prefixes}+{ws}{subtypes}*{ws}{word}{act}|'
+    r'{subtypes}+{ws}{word}{act}|{act}))').format(
+        ref_acts=entities['references']['ref_acts'],
+        ws=_whitespace,
+        **_act_parts)
+# where element and act keywords start (the possible starts of ref_element_acts and ref_elements, and
+# the acts ref_acts ends with)
+entities['references'][
+    'ref_keywords'] = f'(?={entities["references"]["elements"]}|{entities["references"]["act_types"]})(?=(?P<element>{entities["references"]["elements"]}))?(?=(?P<act>{entities["references"]["act_types"]}))?'
+# literal parts of the elements and act types, at least one of which every ref_element_acts,
+# ref_elements and ref_acts match contains (all positions, including overlapping words)
+_trigger_words = [
+    'article', 'paragraph', 'point', 'sentence', 'indent', 'annex', 'part',
+    'section', 'chapter', 'title', 'thereof', 'hereto', 'tfeu', 'teu',
+    'regulation', 'protocol', 'decision', 'directive', 'resolution',
+    'recommendation', 'treat', 'convention', 'agreement', 'arrangement',
+    'report', 'opinion'
+]
+entities['references'][
+    'ref_triggers'] = f'(?=[{"".join(sorted(set(word[0] for word in _trigger_words)))}])(?=({"|".join(_trigger_words)}))'
+entities['references']['elements_words'] = '[a-z]*' + entities['references'][
+    'elements'] + '[a-z]*'
+entities['references'][
+    'elements_word'] = '^' + entities['references']['elements'] + '$'
+entities['references']['act_types_words'] = '[a-z]*' + entities['references'][
+    'act_types'] + '[a-z]*'
 entities['references'][
-    'ref_elements'] = f'{entities["references"]["elements"]}\s*(?:\s|{entities["references"]["elements"]}|{entities["references"]["separators"]}|{entities["references"]["prefixes"]}|{entities["references"]["element_nums"]})+'
+    'act_types_word'] = '^' + entities['references']['act_types'] + '$'
 entities['references'][
-    'ref_acts'] = f'(?:{entities["references"]["prefixes"]}|{entities["references"]["qualifiers"]})*{entities["references"]["act_type_prefixes"]}*\s*{entities["references"]["act_subtype_prefixes"]}*\s*(?:[a-z0-9-,]+\s+){{0,1}}{entities["references"]["act_types"]}\s*{entities["references"]["act_identifiers"]}'
+    'this_act'] = f'^\s*this\s*{entities["references"]["act_type_prefixes"]}*\s*{entities["references"]["act_subtype_prefixes"]}*\s*(?:[a-z0-9-,]+\s+){{0,1}}{entities["references"]["act_types"]}'
 
 celex_ids = '[\dEC](?:20|1\d)\d\d[A-Z][A-Z]?(?:\d{3,4}(?:\(\d\d\))?|/TXT)'
+
+# regex engines the expressions can be compiled with
+backends = {'re': re}
+if _regex is not None:
+    backends['regex'] = _regex
+
+backend = 're'
+
+# time limit of each search in seconds (None for no limit, `regex` backend only)
+match_timeout = None
+
+_flag_names = [
+    'IGNORECASE', 'MULTILINE', 'DOTALL', 'VERBOSE', 'ASCII', 'UNICODE'
+]
+
+
+def set_backend(name, timeout=None):
+    """Select the regex engine the expressions are compiled with
+
+    Parameters
+    ----------
+    name: str
+        're' or 'regex' (the third-party `regex` module, falls back to 're' if it is not installed)
+    timeout: float, optional
+        time limit of each search in seconds (`regex` only). A search running longer raises an
+        `exceptions.TimeoutError`, so the stage running it is stopped as if it ran out of its time
+        budget (see `utils.stage_time_budget`).
+
+    """
+
+    global backend, match_timeout
+
+    if name == 'regex' and _regex is None:
+        warnings.warn(
+            "The regex module is not installed, falling back to re (without match timeouts)"
+        )
+        name, timeout = 're', None
+
+    if name not in backends:
+        raise ValueError(f"Unknown regex backend: {name}")
+
+    if timeout is not None and name != 'regex':
+        raise ValueError(
+            "Match timeouts are only supported by the regex backend")
+
+    backend = name
+    match_timeout = timeout
+
+    compiled.cache_clear()
+
+
+@lru_cache(maxsize=512)
+def compiled(expression, flags=0):
+    """Compile an expression once per process (with the selected backend, see `set_backend`)
+
+    `re` caches a limited number of compiled expressions (and drops them once there are too many),
+    the last 512 compiled expressions used here are kept, more than the expressions of this module and
+    those built from them. Do not use it for expressions built from the text of documents.
+
+    Parameters
+    ----------
+    expression: str
+        the expression
+    flags: int, optional
+        the `re` flags
+
+    Returns
+    -------
+    re.Pattern or regex.Pattern
+        the compiled expression
+
+    """
+
+    engine = backends[backend]
+
+    if engine is re and not _re_atomic_groups:
+        expression = _atomic_group.sub('(?:', expression)
+
+    if engine is not re:
+        # the flags have different values in `regex` (e.g. ASCII)
+        flags = sum(
+            getattr(engine, name) for name in _flag_names
+            if flags & getattr(re, name))
+
+    return engine.compile(expression, flags)
+
+
+def _timed(method, *args, **kwargs):
+
+    if match_timeout is None:
+        return method(*args, **kwargs)
+
+    try:
+        return method(*args, timeout=match_timeout, **kwargs)
+    except TimeoutError as e:
+        raise exceptions.TimeoutError("Regex match timeout exceeded") from e
+
+
+def _timed_matches(matches):
+
+    try:
+        yield from matches
+    except TimeoutError as e:
+        raise exceptions.TimeoutError("Regex match timeout exceeded") from e
+
+
+def search(expression, string, flags=0, pos=0):
+    """Same as `re.search` (from pos, see `re.Pattern.search`), with the expression compiled once (see
+    `compiled`)"""
+
+    return _timed(compiled(expression, flags).search, string, pos)
+
+
+def match(expression, string, flags=0, pos=0):
+    """Same as `re.match` (at pos, see `re.Pattern.match`), with the expression compiled once (see
+    `compiled`)"""
+
+    return _timed(compiled(expression, flags).match, string, pos)
+
+
+def finditer(expression, string, flags=0):
+    """Same as `re.finditer`, with the expression compiled once (see `compiled`)"""
+
+    matches = _timed(compiled(expression, flags).finditer, string)
+
+    if match_timeout is None:
+        return matches
+
+    # the matches are searched while iterating
+    return _timed_matches(matches)
+
+
+def findall(expression, string, flags=0):
+    """Same as `re.findall`, with the expression compiled once (see `compiled`)"""
+
+    return _timed(compiled(expression, flags).findall, string)
+
+
+def sub(expression, repl, string, count=0, flags=0):
+    """Same as `re.sub`, with the expression compiled once (see `compiled`)"""
+
+    return _timed(compiled(expression, flags).sub, repl, string, count=count)
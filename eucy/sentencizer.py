@@ -0,0 +1,119 @@
+"""Rule-based sentence segmentation of EU legal texts"""
+
+from spacy.language import Language
+
+# words abbreviated with a full stop in legal texts (lower case, without the full stop), e.g.
+# "No. 1025/2012", "Art. 5", "Articles 5 et seq.", "p. 1"
+abbreviations = {
+    'no', 'nos', 'art', 'arts', 'para', 'paras', 'subpara', 'pt', 'pts', 'p',
+    'pp', 'vol', 'seq', 'seqq', 'cf', 'ibid', 'op', 'cit', 'approx', 'ca',
+    'e.g', 'i.e', 'viz', 'ed', 'eds', 'mr', 'mrs', 'ms', 'dr', 'prof', 'st',
+    'fig', 'ch', 'sec', 'co', 'corp', 'inc', 'ltd', 'dir', 'reg', 'dec', 'v',
+    'vs'
+}
+
+# tokens ending a sentence (a full stop only if it does not end an abbreviation or a numbering,
+# see `_ends_sentence`) and list items ("(a) the first;")
+terminators = {'.', '!', '?', ';'}
+
+# closing punctuation kept with the sentence it follows, e.g. "(‘the Agency’)."
+closing_punctuation = {')', ']', '’', '”', '"', "'", '»'}
+
+
+def _is_numbering(doc, i):
+    """Whether the token is the number of a paragraph or point at the start of a line, e.g. "1." or
+    "a." """
+
+    token = doc[i]
+
+    if not (token.like_num or len(token.text) == 1 and token.is_alpha):
+        return False
+
+    return i == 0 or '\n' in doc[i - 1].text_with_ws
+
+
+def _ends_sentence(doc, i):
+    """Whether the i-th token ends a sentence"""
+
+    token = doc[i]
+
+    if token.text in terminators:
+        if token.text == '.' and i > 0:
+            previous = doc[i - 1]
+            if previous.whitespace_ == '' and (previous.lower_ in abbreviations
+                                               or _is_numbering(doc, i - 1)):
+                return False
+        return True
+
+    # abbreviations tokenized with their full stop (e.g. "p.") and line breaks
+    if token.text.endswith('.'):
+        return token.lower_[:-1] not in abbreviations and not (len(
+            token.text) == 2 and _is_numbering(doc, i))
+
+    return '\n' in token.text_with_ws
+
+
+def sentence_starts(doc):
+    """Indices of the first tokens of the sentences of a Doc, in a single pass over the tokens
+
+    A sentence ends with a full stop, question or exclamation mark, a semicolon (e.g. of the points
+    of a list) or a line break. A full stop does not end a sentence if it ends an abbreviation
+    (see `abbreviations`) or the number of a paragraph or point at the start of a line (e.g. "1.")
+    or if the next word starts in lower case. Closing punctuation and whitespace following the end
+    of a sentence belong to it.
+
+    Parameters
+    ----------
+    doc: Doc
+        the doc
+
+    Returns
+    -------
+    list
+        token indices (0 for a non-empty doc)
+
+    """
+
+    starts = [0] if len(doc) > 0 else []
+    end = None  # the token ending the current sentence
+    words = False  # whether the current sentence has words (not only whitespace)
+
+    for i, token in enumerate(doc):
+
+        if end is not None:
+            if token.is_space:
+                # a line break ends the sentence, whatever follows
+                if '\n' in token.text:
+                    end = i
+                continue
+            if token.text in closing_punctuation:
+                continue
+            # a full stop followed by a word in lower case does not end the sentence
+            if doc[end].text.endswith('.') and token.text[0].islower():
+                end = None
+            else:
+                starts.append(i)
+                end = None
+                words = False
+
+        if not token.is_space:
+            words = True
+
+        if words and _ends_sentence(doc, i):
+            end = i
+
+    return starts
+
+
+@Language.component("eucy_sentencizer")
+def sentencizer(doc):
+    """Pipeline component setting the sentence boundaries of legal texts (see `sentence_starts`),
+    e.g. for `doc.sents` without a parser or senter. Boundaries already set are kept."""
+
+    starts = set(sentence_starts(doc))
+
+    for i, token in enumerate(doc):
+        if token.is_sent_start is None:
+            token.is_sent_start = i in starts
+
+    return doc
@@ -1,8 +1,12 @@
+import bisect
 import re
+from collections import namedtuple
+from functools import lru_cache
+from typing import Optional
 
-from spacy.tokens import Doc
+from spacy.language import Language
 
-from eucy import exceptions
+from eucy import content, exceptions
 from eucy import regex as eure
 from eucy import utils
 
@@ -10,10 +14,11 @@ from eucy import utils
 class Structure:
     """Takes and returns a spacy Doc object storing its text parts (citations, recitals, enacting terms) in _.parts"""
 
-    def __init__(self):
+    def __init__(self, time_budget=None):
 
-        if not Doc.has_extension("parts"):
-            Doc.set_extension("parts", default=None)
+        utils.set_extensions()
+
+        self.time_budget = time_budget
 
     def __call__(self, doc):
         """Split the document into its parts and store them in _.parts
@@ -30,25 +35,232 @@ class Structure:
 
         """
 
+        if doc._.title is None:
+            doc._.title = content.find_title(doc)
+
+            if (len(doc.text.strip()) - len(
+                (doc._.title or '').strip())) < 500:
+                doc._.no_text = True
+
+        if doc._.no_text or doc._.parts is not None or utils.has_stage(
+                doc, 'structure'):
+            # no text or already split (possibly timed out)
+            return doc
+
         # split it and store parts
-        doc._.parts = text_parts(doc)
+        with utils.stage_time_budget(doc, 'structure', self.time_budget):
+            doc._.parts = text_parts(doc)
+
+        utils.mark_stage(doc, 'structure')
 
         return doc
 
 
+@Language.factory("eucy_structure",
+                  default_config={"time_budget": None},
+                  assigns=["doc._.parts", "doc._.title", "doc._.no_text"])
+def make_structure(nlp: Language, name: str, time_budget: Optional[float]):
+    """Pipeline component splitting a document into its parts (see `Structure`)"""
+
+    return Structure(time_budget=time_budget)
+
+
 def text_parts(doc):
+    """Split a Doc into its parts (citations, recitals, enacting terms), returned as a dict of Spans"""
+
+    parts = text_part_tokens(utils.TokenOffsets.from_doc(doc))
+
+    return {
+        name: None if part is None else doc[part[0]:part[1]]
+        for name, part in parts.items()
+    }
+
+
+# structural landmarks of a text (see `Landmarks`) and the flags they are searched with
+landmark_expressions = {
+    'enacting_start': (eure.structure['enacting_start'], re.MULTILINE),
+    'enacting_start_lenient':
+    (eure.structure['enacting_start_lenient'], re.MULTILINE),
+    'article_start':
+    (eure.structure['article_start'], re.IGNORECASE | re.MULTILINE),
+    'article_1_start':
+    (eure.structure['article_1_start'], re.IGNORECASE | re.MULTILINE),
+    'done_at_start':
+    (eure.structure['done_at_start'], re.IGNORECASE | re.MULTILINE),
+    'annex_start': (eure.structure['annex_start'],
+                    re.IGNORECASE | re.MULTILINE),
+    'back_start_lenient': (eure.structure['back_start_lenient'],
+                           re.DOTALL | re.MULTILINE),
+    'toc_start': (eure.structure['toc_start'], re.IGNORECASE | re.MULTILINE),
+    'expl_memo_start': (eure.structure['expl_memo_start'], re.IGNORECASE),
+    'proposal_start': (eure.structure['proposal_start'],
+                       re.IGNORECASE | re.MULTILINE | re.DOTALL),
+    'proposal_law_start': (eure.structure['proposal_law_start'],
+                           re.IGNORECASE | re.MULTILINE | re.DOTALL),
+    'citations_start': (eure.structure['citations_start'], re.MULTILINE),
+    'citations_start_lenient': (eure.structure['citations_start'],
+                                re.IGNORECASE | re.MULTILINE),
+    'recitals_start_whereas': (eure.structure['recitals_start_whereas'],
+                               re.IGNORECASE | re.MULTILINE),
+    'recitals_start_having': (eure.structure['recitals_start_having'],
+                              re.IGNORECASE | re.MULTILINE),
+    'recitals_start_having_dotall': (eure.structure['recitals_start_having'],
+                                     re.IGNORECASE | re.MULTILINE | re.DOTALL),
+    'recital_num_start': (eure.elements['recital_num_start'],
+                          re.IGNORECASE | re.MULTILINE | re.DOTALL),
+    'recital_whereas_start': (eure.elements['recital_whereas_start'],
+                              re.IGNORECASE | re.MULTILINE | re.DOTALL)
+}
+
+Landmark = namedtuple('Landmark', ['start', 'end'])
+
+_flag_letters = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's'}
+
+
+def _landmark_expression(name):
+
+    expression, flags = landmark_expressions[name]
+
+    return eure.compiled(expression, flags)
+
+
+@lru_cache(maxsize=None)
+def _landmark_scanner_expression():
+
+    # all landmarks as lookaheads with scoped flags, one named group per landmark
+    def _scoped(expression, flags):
+        flag_letters = ''.join(letter
+                               for flag, letter in _flag_letters.items()
+                               if flags & flag)
+        return f'(?{flag_letters}:{expression})'
+
+    scoped = {
+        name: _scoped(expression, flags)
+        for name, (expression, flags) in landmark_expressions.items()
+    }
+
+    # only stop at positions where any of the landmarks matches, then try each of them
+    return '(?=' + '|'.join(scoped.values()) + ')' + ''.join(
+        f'(?=(?P<{name}>{expression}))?'
+        for name, expression in scoped.items())
+
+
+class Landmarks:
+    """Index of the structural landmarks (see `landmark_expressions`) of a text
+
+    All landmarks are found in a single pass over the text and stored as sorted char positions.
+    `search` and `findall` then pick landmarks from the index as `re.search` and `re.finditer` on a
+    slice of the text would find them, instead of searching the text (or parts of it) once per
+    landmark and part.
+    """
+
+    def __init__(self, text):
+
+        self.text = text
+        self._starts = {name: [] for name in landmark_expressions}
+
+        scanner = eure.compiled(_landmark_scanner_expression())
+
+        for match in scanner.finditer(text):
+            for name in landmark_expressions:
+                if match.start(name) >= 0:
+                    self._starts[name].append(match.start(name))
+
+    def _matches(self, name, start=0, end=None, pos=None):
+
+        text = self.text
+        expression = _landmark_expression(name)
+
+        start = min(start, len(text))
+        end = len(text) if end is None else min(max(end, start), len(text))
+        pos = start if pos is None else pos
+
+        if pos == start and start > 0 and text[start - 1] != '\n':
+            # the slice starts within a line, so `^` also matches at its start
+            match = expression.match(text[start:end])
+            if match is not None:
+                yield Landmark(start + match.start(), start + match.end())
+            pos = start + 1
+
+        starts = self._starts[name]
+
+        for i in range(bisect.bisect_left(starts, pos), len(starts)):
+            if starts[i] > end:
+                break
+            # check the landmark within the slice (matches may not reach beyond its end)
+            match = expression.match(text, starts[i], end)
+            if match is not None:
+                yield Landmark(match.start(), match.end())
+
+    def search(self, name, start=0, end=None, pos=None):
+        """First landmark in text[start:end] (as `re.search` on the slice)
+
+        Parameters
+        ----------
+        name: str
+            the landmark (see `landmark_expressions`)
+        start, end: int, optional
+            the slice of the text to search
+        pos: int, optional
+            only search landmarks starting at or after this char (by default the start of the slice)
+
+        Returns
+        -------
+        Landmark
+            start and end char (relative to the text) or None
+
+        """
+
+        return next(self._matches(name, start, end, pos), None)
+
+    def findall(self, name, start=0, end=None):
+        """All landmarks starting in text[start:end] (as `re.finditer` on the slice for lookahead-only
+        landmarks), see `search`"""
+
+        return list(self._matches(name, start, end))
 
-    char_token = utils.chars_to_tokens_dict(doc)
 
-    # function to map char ids to token ids
+def text_part_tokens(tokens):
+    """Split a text into its parts (see `text_parts`)
+
+    Parameters
+    ----------
+    tokens: utils.TokenOffsets
+        the tokens of the text
+
+    Returns
+    -------
+    dict
+        the parts as (start, end) token slices (or None)
+
+    """
+
+    # function to map char ids to token ids (the closest token before for whitespace)
     def _to_token(char):
-        token = char_token.get(char, None)
-        while token is None:
-            char = char - 1
-            token = char_token.get(char - 1, None)
-            if char < 1:
-                token = 0
-        return token
+        return tokens.char_to_token(char)
+
+    # token slice (normalized as for spacy Spans)
+    def _span(start, end):
+        return tokens._slice(start, end)
+
+    def _text(span):
+        return tokens.span_text(*span)
+
+    def _start_char(span):
+        return tokens.span_chars(*span)[0]
+
+    # first landmark in the text of a token slice (from char pos of its text on), chars relative to the slice
+    def _search(name, span, pos=0):
+        return _search_chars(name, *tokens.span_chars(*span), pos=pos)
+
+    def _search_chars(name, start_char, end_char, pos=0):
+        match = landmarks.search(name,
+                                 start_char,
+                                 end_char,
+                                 pos=start_char + pos)
+        if match is None:
+            return None
+        return Landmark(match.start - start_char, match.end - start_char)
 
     # return dict of spans of text elements
 
@@ -58,33 +270,30 @@ def text_parts(doc):
     enacting_with_toc = None
     annex = None
 
-    text = doc.text
+    text = tokens.text
     text_end_char = len(text)
 
+    landmarks = Landmarks(text)
+
     front_end_match = None
 
     # first, try to split the text in the the middle, right before the enacting terms
     while True:
 
         # normal
-        enacting_start_match = re.search(eure.structure['enacting_start'],
-                                         text,
-                                         flags=re.MULTILINE)
+        enacting_start_match = landmarks.search('enacting_start')
 
         if enacting_start_match is not None:
             break
 
         # try a more lenient version
-        enacting_start_match = re.search(
-            eure.structure['enacting_start_lenient'], text, flags=re.MULTILINE)
+        enacting_start_match = landmarks.search('enacting_start_lenient')
 
         if enacting_start_match is not None:
             break
 
         # if all else fails: try to match right before the first
-        enacting_start_match = re.search(eure.structure['article_start'],
-                                         text,
-                                         flags=re.IGNORECASE | re.MULTILINE)
+        enacting_start_match = landmarks.search('article_start')
 
         if enacting_start_match is not None:
             break
@@ -93,9 +302,11 @@ def text_parts(doc):
                 "Text does not appear to be in a format that can be handled by this function."
             )
 
-    front = doc[_to_token(0):_to_token(enacting_start_match.end())]
-    middle = doc[_to_token(enacting_start_match.end()):_to_token(text_end_char
-                                                                 )]
+    front = _span(_to_token(0), _to_token(enacting_start_match.end))
+    middle = _span(_to_token(enacting_start_match.end),
+                   _to_token(text_end_char))
+
+    utils.check_time_budget()
 
     # try to split the middle part to separate the back matter
 
@@ -105,52 +316,45 @@ def text_parts(doc):
 
         # Normal version with "Done at"
 
-        middle_end_match = re.search(eure.structure['done_at_start'],
-                                     middle.text,
-                                     flags=re.MULTILINE | re.IGNORECASE)
+        middle_end_match = _search('done_at_start', middle)
 
         if middle_end_match is not None:
             break
 
-        middle_end_match = re.search(eure.structure['annex_start'],
-                                     middle.text,
-                                     flags=re.MULTILINE | re.IGNORECASE)
+        middle_end_match = _search('annex_start', middle)
 
         if middle_end_match is not None:
             break
 
         # last resort: look for the last article position and match a shortened version of the middle text for some indicators that the enacting terms are done
 
-        try:
-            pos_last_article = \
-            [m.start () for m in re.finditer (eure.structure['article_start'], middle.text, flags=re.MULTILINE | re.IGNORECASE)][-1]
-        except:
-            len_enacting = float(len(middle.text))
-            pos_last_article = int(len_enacting - 0.1 * len_enacting)
+        article_start_matches = landmarks.findall('article_start',
+                                                  *tokens.span_chars(*middle))
 
-        pos_last_article = middle.start_char + pos_last_article
+        if len(article_start_matches) > 0:
+            pos_last_article = article_start_matches[-1].start - _start_char(
+                middle)
+        else:
+            len_enacting = float(len(_text(middle)))
+            pos_last_article = int(len_enacting - 0.1 * len_enacting)
 
-        # this regex makes sure there's at least pos_last_article before the group matches
-        middle_end_match = re.search(
-            f'(?<=.{{{pos_last_article}}}).*?(^)(?=(?:[\(\[][0-9]+[\)\]])|(?:[A-Z]{{3,}}))',
-            text,
-            flags=re.DOTALL | re.MULTILINE)
+        # the first match after the last article
+        middle_end_match = _search('back_start_lenient',
+                                   middle,
+                                   pos=pos_last_article)
 
-        if middle_end_match is None:
-            break
-        else:
-            middle_end_match = middle_end_match.group(1)
-            break
+        break
 
     if middle_end_match is not None:
-        middle = doc[_to_token(middle.start_char
-                               ):_to_token(middle.start_char +
-                                           middle_end_match.end())]
-        back = doc[_to_token(middle.start_char +
-                             middle_end_match.end()):_to_token(text_end_char)]
+        middle = _span(_to_token(_start_char(middle)),
+                       _to_token(_start_char(middle) + middle_end_match.end))
+        back = _span(_to_token(_start_char(middle) + middle_end_match.end),
+                     _to_token(text_end_char))
     else:
         back = None
 
+    utils.check_time_budget()
+
     # Split front into Explanatory Memorandum and Citations and Recitals
 
     front_matter_end_match = None
@@ -160,45 +364,45 @@ def text_parts(doc):
 
     while True:
 
-        expl_memo_start_matches = [
-            m for m in re.finditer(r'(?=explanatory\s*memorandum)',
-                                   front.text,
-                                   flags=re.IGNORECASE)
-        ]
+        expl_memo_start_matches = landmarks.findall('expl_memo_start',
+                                                    *tokens.span_chars(*front))
 
         law_start_pos = None
 
         if len(expl_memo_start_matches) > 0:
 
+            expl_memo_end = expl_memo_start_matches[-1].end - _start_char(
+                front)
+
             # match proposal start after explanatory meorandum match (to make sure, we're not capturing the "proposal for a " in the title)
-            proposal_start_match = re.search(
-                f'(?<=.{{{expl_memo_start_matches[-1].end()}}}).*?{eure.structure["proposal_start"]}',
-                front.text,
-                flags=re.MULTILINE | re.IGNORECASE | re.DOTALL)
-            law_start_match = re.search(
-                f'(?<=.{{{expl_memo_start_matches[-1].end()}}}).*?{eure.structure["proposal_law_start"]}',
-                front.text,
-                flags=re.MULTILINE | re.IGNORECASE | re.DOTALL)
+            proposal_start_match = _search('proposal_start',
+                                           front,
+                                           pos=expl_memo_end)
+            law_start_match = _search('proposal_law_start',
+                                      front,
+                                      pos=expl_memo_end)
 
             if proposal_start_match is not None:
-                law_start_pos = proposal_start_match.end()
+                law_start_pos = proposal_start_match.end
             elif law_start_match is not None:
-                law_start_pos = law_start_match.end()
+                law_start_pos = law_start_match.end
 
         if law_start_pos is None:
             law_start_pos = 0
 
-        front_matter_end_match = re.search(
-            f'(?<=.{{{law_start_pos}}}).*?' +
-            eure.structure['citations_start'], front.text,
-            re.MULTILINE | re.DOTALL)
+        front_matter_end_match = _search('citations_start',
+                                         front,
+                                         pos=law_start_pos)
 
         if front_matter_end_match is not None:
+            # the citations are searched from the law start on
+            front_matter_end_match = Landmark(law_start_pos,
+                                              front_matter_end_match.end)
             break
 
-        front_matter_end_match = re.search(
-            eure.structure['citations_start'], front.text,
-            re.MULTILINE | re.IGNORECASE)  # more relaxed version ignoring case
+        front_matter_end_match = _search(
+            'citations_start_lenient',
+            front)  # more relaxed version ignoring case
 
         if front_matter_end_match is not None:
             break
@@ -206,17 +410,15 @@ def text_parts(doc):
         # if no citations
         no_citations = True
 
-        front_matter_end_match = re.search(
-            eure.structure['recitals_start_whereas'], front.text,
-            re.MULTILINE | re.IGNORECASE)  # look for recitals
+        front_matter_end_match = _search('recitals_start_whereas',
+                                         front)  # look for recitals
 
         if front_matter_end_match is not None:
             break
 
         if front_matter_end_match is None:
-            front_matter_end_match = re.search(
-                eure.structure['recitals_start_having'], front.text,
-                re.MULTILINE | re.IGNORECASE
+            front_matter_end_match = _search(
+                'recitals_start_having', front
             )  # look for introdcued with "having regard to the following"
 
         if front_matter_end_match is not None:
@@ -226,10 +428,10 @@ def text_parts(doc):
             break
 
     if no_citations and not no_recitals:
-        recitals = doc[_to_token(front_matter_end_match.end()):front.end]
+        recitals = _span(_to_token(front_matter_end_match.end), front[1])
 
     if no_recitals and not no_citations:
-        citations = doc[_to_token(front_matter_end_match.end()):front.end]
+        citations = _span(_to_token(front_matter_end_match.end), front[1])
 
     # if both recitals and citations exist (otherwise they would have been set above)
     if (recitals is None and not no_recitals) and (citations is None
@@ -240,18 +442,18 @@ def text_parts(doc):
         # look for recitals
         while True:
 
-            recitals_start_match = re.search(
-                f'(?<=.{{{front_matter_end_match.start()}}}).*?' +
-                eure.structure['recitals_start_whereas'], front.text,
-                re.MULTILINE | re.IGNORECASE | re.DOTALL)  # look for recitals
+            recitals_start_match = _search(
+                'recitals_start_whereas',
+                front,
+                pos=front_matter_end_match.start)  # look for recitals
 
             if recitals_start_match is not None:
                 break
 
-            recitals_start_match = re.search(
-                f'(?<=.{{{front_matter_end_match.start()}}}).*?' +
-                eure.structure['recitals_start_having'], front.text,
-                re.MULTILINE | re.IGNORECASE | re.DOTALL
+            recitals_start_match = _search(
+                'recitals_start_having_dotall',
+                front,
+                pos=front_matter_end_match.start
             )  # look for introdcued with "having regard to the following"
 
             if recitals_start_match is not None:
@@ -261,13 +463,9 @@ def text_parts(doc):
             # in this case, we need to remove them from the citations
 
             # search for the start of a recital
-            for reg in [
-                    eure.elements['recital_num_start'],
-                    eure.elements['recital_whereas_start']
-            ]:
-                recitals_start_match = re.search(
-                    f'(?<=.{{{front_matter_end_match.start()}}}).*?' + reg,
-                    front.text, re.MULTILINE | re.IGNORECASE | re.DOTALL)
+            for name in ['recital_num_start', 'recital_whereas_start']:
+                recitals_start_match = _search(
+                    name, front, pos=front_matter_end_match.start)
                 if recitals_start_match is not None:
                     break
 
@@ -278,17 +476,17 @@ def text_parts(doc):
                 break
 
         if not no_recitals:
-            recitals = doc[_to_token(recitals_start_match.end()):front.end]
+            recitals = _span(_to_token(recitals_start_match.end), front[1])
 
         citations_start_match = None
 
         # look for citations
         while True:
 
-            citations_start_match = re.search(
-                f'(?<=.{{{front_matter_end_match.start()}}}).*?' +
-                eure.structure['citations_start'], front.text,
-                re.MULTILINE | re.IGNORECASE | re.DOTALL)  # look for citations
+            citations_start_match = _search(
+                'citations_start_lenient',
+                front,
+                pos=front_matter_end_match.start)  # look for citations
 
             if citations_start_match is not None:
                 break
@@ -298,11 +496,11 @@ def text_parts(doc):
 
         if not no_citations:
             if recitals_start_match is None:
-                citations = doc[_to_token(citations_start_match.end()):front.
-                                end]
+                citations = _span(_to_token(citations_start_match.end),
+                                  front[1])
             else:
-                citations = doc[_to_token(citations_start_match.end(
-                )):_to_token(recitals_start_match.end())]
+                citations = _span(_to_token(citations_start_match.end),
+                                  _to_token(recitals_start_match.end))
 
     # @TODO: Annex
     # annex_start_match = re.search(r'^(?=\s*(?:ANNEX|LEGISLATIVE FINANCIAL STATEMENT)[\s])', back, flags = re.MULTILINE|re.IGNORECASE)[1]
@@ -310,44 +508,47 @@ def text_parts(doc):
     enacting = middle
     enacting_with_toc = enacting
 
-    enacting_toc_start_match = re.search(eure.structure['toc_start'],
-                                         enacting.text[:len(enacting.text) //
-                                                       4],
-                                         flags=re.MULTILINE | re.IGNORECASE)
+    enacting_start_char, enacting_end_char = tokens.span_chars(*enacting)
+    enacting_quarter_char = enacting_start_char + (enacting_end_char -
+                                                   enacting_start_char) // 4
+
+    enacting_toc_start_match = _search_chars('toc_start', enacting_start_char,
+                                             enacting_quarter_char)
     if recitals is not None:
-        recitals_toc_start_match = re.search(eure.structure['toc_start'],
-                                             recitals.text,
-                                             flags=re.MULTILINE
-                                             | re.IGNORECASE)
+        recitals_toc_start_match = _search('toc_start', recitals)
 
     # remove TOC and store in enacting (vs enacting_with_toc), if no TOC enacting = enacting_with_toc
     ## if 'TALBE OF CONTENTS' in first quarter of enacting
     if bool(enacting_toc_start_match):
 
         # identify start of first article, but exclude the first few lines in case Article 1 is part of the TOC
-        article_1_start_match = re.search(
-            eure.structure['article_1_start'],
-            enacting.text[100:len(enacting.text) // 4],
-            flags=re.MULTILINE | re.IGNORECASE)
+        article_1_start_match = _search_chars('article_1_start',
+                                              enacting_start_char + 100,
+                                              enacting_quarter_char)
 
         if article_1_start_match is not None:
-            enacting = enacting[
-                utils.char_to_token(100 +
-                                    article_1_start_match.start(), enacting):]
+            enacting = _span(
+                enacting[0] + tokens.window(
+                    *enacting).char_to_token(100 +
+                                             article_1_start_match.start),
+                enacting[1])
 
             # enacting = enacting[_to_token (100 + article_1_start_match.start ()):] @TODO: why won't this work?
 
     elif recitals is not None and bool(
             recitals_toc_start_match
     ):  # in case the TOC is part of recitals bc of previous split
-        recitals = recitals.char_span(0, recitals_toc_start_match.end())
+        recitals_start_char = _start_char(recitals)
+        recitals = tokens.char_span(
+            recitals_start_char,
+            recitals_start_char + recitals_toc_start_match.end)
         if recitals is None:
-            toc_start = citations.end
+            toc_start = citations[1]
         elif recitals is not None:
-            toc_start = recitals.end
+            toc_start = recitals[1]
         else:
-            toc_start = enacting.start
-        enacting_with_toc = doc[toc_start:enacting.end]
+            toc_start = enacting[0]
+        enacting_with_toc = _span(toc_start, enacting[1])
 
     return ({
         'citations': citations,
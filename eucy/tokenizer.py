@@ -31,9 +31,12 @@ def tokenizer(nlp,
         custom_exceptions = default_eucy_exceptions + custom_exceptions
         custom_token_match_patterns = default_eucy_token_match_patterns + custom_token_match_patterns
 
-    custom_token_match = lambda x: [
-        re.compile(p).match(x) for p in custom_token_match_patterns
-    ]
+    # a compiled pattern's bound match method (not a lambda) keeps the tokenizer serializable (nlp.to_disk)
+    if len(custom_token_match_patterns) > 0:
+        custom_token_match = re.compile('|'.join(
+            '(?:' + p + ')' for p in custom_token_match_patterns)).match
+    else:
+        custom_token_match = None
 
     return Tokenizer(nlp.vocab,
                      rules=nlp.Defaults.tokenizer_exceptions,
@@ -1,17 +1,29 @@
+import bisect
+import contextvars
+import copy
 import errno
 import os
 import random
 import re
 import signal
+import time
 import warnings
-from collections import OrderedDict
+import weakref
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 from functools import wraps
 
+import srsly
 from bs4 import BeautifulSoup
+from spacy.attrs import IDX, LENGTH
 from spacy.tokens import Doc, SpanGroup
 from spacy.tokens.span import Span
 
 import eucy
+from eucy import exceptions
+from eucy import regex as eure
+from eucy import sentencizer
 
 
 def flatten_gen(l):
@@ -50,14 +62,14 @@ def _replace_text(doc, new_text, keep_ws=True, deletion_threshold=None):
         doc.set_extension('deleted', default=False)
 
     # get ws at beginning and end of original text
-    ws_start = re.search(r'^\s*', doc.text).group(0)
-    ws_end = re.search(r'\s*$', doc.text_with_ws).group(0)
+    ws_start = eure.search(r'^\s*', doc.text).group(0)
+    ws_end = eure.search(r'\s*$', doc.text_with_ws).group(0)
 
     # add ws to new text
     new_text = ws_start + new_text + ws_end
 
-    if deletion_threshold is not None and len(new_text.strip(
-    )) <= deletion_threshold:
+    if deletion_threshold is not None and len(
+            new_text.strip()) <= deletion_threshold:
         doc._.deleted = True
 
     # set replacement text
@@ -90,8 +102,8 @@ def _delete_text(doc, warn_empty_group=True, keep_ws=True):
 
     if keep_ws:
         # get ws at beginning and end of original text
-        ws_start = re.search(r'^\s*', doc.text).group(0)
-        ws_end = re.search(r'\s*$', doc.text_with_ws).group(0)
+        ws_start = eure.search(r'^\s*', doc.text).group(0)
+        ws_end = eure.search(r'\s*$', doc.text_with_ws).group(0)
 
         # set replacement text
         doc._.replacement_text = ws_start + ws_end
@@ -246,15 +258,82 @@ def _add_element(doc,
     #return doc
 
 
+def user_data_value(doc, name):
+    """Value of an euCy entry of `doc.user_data` (e.g. 'parts'), unpacked once per doc if it has been packed
+    (e.g. by `Doc.to_bytes()`, see `PackedValue`)"""
+
+    data = doc.user_data.get(('eucy', name))
+    if data is None or isinstance(data, PackedValue):
+        return data if data is None else data.value
+
+    value = _unpack_user_data(data, doc)
+    doc.user_data[('eucy', name)] = PackedValue(value, _pack_user_data)
+
+    return value
+
+
+def _user_data_getter(name):
+    """Getter for a Doc extension whose (Span-valued) data is stored in `doc.user_data` (see `PackedValue`)"""
+
+    def getter(doc):
+        return user_data_value(doc, name)
+
+    return getter
+
+
+def _user_data_setter(name):
+    """Setter counterpart of `_user_data_getter`"""
+
+    def setter(doc, value):
+        doc.user_data[('eucy', name)] = None if value is None else PackedValue(
+            value, _pack_user_data)
+
+    return setter
+
+
+def _complexity_getter(doc):
+    """Lazy mapping of the complexity measures (None if the doc has not been processed by euCy)"""
+
+    if ('eucy', 'complexity') not in doc.user_data:
+        return None
+
+    from eucy.eucy import LazyComplexity
+
+    return LazyComplexity(doc)
+
+
+def _reference_store_getter(doc):
+    """Columnar store of the references of the doc (see `entities.references.ReferenceStore`)"""
+
+    from eucy.entities.references import reference_store
+
+    return reference_store(doc)
+
+
+def _complexity_setter(doc, value):
+
+    if value is None:
+        doc.user_data.pop(('eucy', 'complexity'), None)
+    else:
+        # packed as the other values (e.g. Counters are restored as Counters, see `_pack_user_data`)
+        doc.user_data[('eucy',
+                       'complexity')] = PackedValue(dict(value),
+                                                    _pack_user_data)
+
+
 _extensions = {
     "Doc": [
         {
+            # Span-valued extensions are packed into token offsets when the doc is serialized, so that
+            # docs survive `Doc.to_bytes()` (and thereby `nlp.pipe(n_process=...)`, see `PackedValue`)
             'name': 'article_elements',
-            'default': None
+            'getter': _user_data_getter('article_elements'),
+            'setter': _user_data_setter('article_elements')
         },
         {
             'name': 'parts',
-            'default': None
+            'getter': _user_data_getter('parts'),
+            'setter': _user_data_setter('parts')
         },
         {
             'name': 'title',
@@ -265,13 +344,35 @@ _extensions = {
             'default': None
         },
         {
+            # measures are computed on first access (see `eucy.eucy.LazyComplexity`)
             'name': 'complexity',
-            'default': None
+            'getter': _complexity_getter,
+            'setter': _complexity_setter
         },
         {
             'name': 'no_text',
             'default': None
         },
+        {
+            'name':
+            'stages',  # stage registry: stage -> text version (see `mark_stage`)
+            'getter':
+            lambda doc: dict(doc.user_data.get(('eucy', 'stages'), {}))
+        },
+        {
+            'name': 'timeouts',  # stages that ran out of their time budget
+            'default': None
+        },
+        {
+            # subparagraphs searched for references and skipped (without any trigger word)
+            'name': 'reference_stats',
+            'default': None
+        },
+        {
+            # references of the reference entities (`span._.references`) in arrays
+            'name': 'reference_store',
+            'getter': _reference_store_getter
+        },
         {
             'name': 'deleted',
             'default': False
@@ -341,6 +442,8 @@ _extensions = {
 def set_extensions(doc=None, force=False):
     """Set all Doc and Span extensions required by euCy."""
 
+    register_packed_value_encoder()
+
     if isinstance(doc, Doc):
 
         for extension in _extensions['Doc']:
@@ -392,7 +495,7 @@ def text_from_html(html):
 
     text = soup.get_text(separator="\n\n", strip=True)
 
-    text = re.sub(r'(?<!\n)\n{1}(?!\n)', "", text, flags=re.MULTILINE)
+    text = eure.sub(r'(?<!\n)\n{1}(?!\n)', "", text, flags=re.MULTILINE)
 
     return text
 
@@ -400,27 +503,27 @@ def text_from_html(html):
 def clean_text(text, rm_fn=True):
 
     text = text.strip()
-    text = re.sub(r"""[
+    text = eure.sub(r"""[\x0c
 ÕÖêöð]""", '', text)  # remove certain unicode characters
-    text = re.sub(
+    text = eure.sub(
         r'(?<=^)\s+', '', text,
         flags=re.MULTILINE)  # remove whitespace at the beginning of a line
 
-    text = re.sub(
+    text = eure.sub(
         r'\n*^((,).*)', '\g<1>', text, flags=re.MULTILINE
     )  # put paragraphs starting with a comma back to the sentence above
 
-    text = re.sub(
+    text = eure.sub(
         r'(\sof|\sin|\swith)\s*(?:[\n\r])(Article)', '\g<1> \g<2>', text
     )  # fix cases where there is a newline right before an Article reference (not new Article start)
 
     # remove lines starting with @
-    text = re.sub(r'^@.*$', "", text, flags=re.MULTILINE)
+    text = eure.sub(r'^@.*$', "", text, flags=re.MULTILINE)
 
     # remove footnotes
     if rm_fn:
-        text = re.sub(r'^\[[0-9]+\].*', "", text, flags=re.MULTILINE)
-        text = re.sub(r'^\(\).*', "", text, flags=re.MULTILINE)
+        text = eure.sub(r'^\[[0-9]+\].*', "", text, flags=re.MULTILINE)
+        text = eure.sub(r'^\(\).*', "", text, flags=re.MULTILINE)
 
     # fix spelling
     text = _fix_spaced_spelling(text, term="Article", flags=re.IGNORECASE)
@@ -436,7 +539,7 @@ def _fix_spaced_spelling(text, term, regex_pre=r'', regex_post=r'', flags=0):
         [c + r"\s*" if i < len(term) - 1 else c for i, c in enumerate(term)])
     regex = regex_pre + regex_term_spaced + regex_post
 
-    return (re.sub(regex, term, text, flags=flags))
+    return (eure.sub(regex, term, text, flags=flags))
 
 
 def chars_to_tokens_dict(doc, input="as_ref", output="as_ref"):
@@ -470,40 +573,456 @@ def chars_to_tokens_dict(doc, input="as_ref", output="as_ref"):
     return chars_to_tokens
 
 
+class TokenOffsets:
+    """Char offsets of the tokens of a text, a light-weight stand-in for a tokenized Doc or Span
+
+    Used to align regex matches on a text to token boundaries, either for the tokens of a Doc/Span
+    (`from_doc`) or, without building a Doc, for an approximation of spaCy's tokenization (`from_text`).
+    Token indices are relative to the first token, char offsets relative to the start of `text`.
+
+    The offsets are stored once per text in arrays and shared by all windows (see `window`),
+    lookups are binary searches.
+    """
+
+    # characters split off the start and end of whitespace separated chunks by `from_text`
+    prefix_chars = '([{"\'“‘'
+    suffix_chars = ')]}"\'”’.,;:!?'
+
+    def __init__(self, text, starts, ends, start=0, end=None, char_offset=0):
+        """
+        Parameters
+        ----------
+        text: str
+            the text of the tokens
+        starts, ends: sequence of int
+            start and end chars of all tokens (may be shared with other windows)
+        start, end: int, optional
+            the token range of the window (by default all tokens)
+        char_offset: int, optional
+            the char in `starts`/`ends` that `text` starts at
+
+        """
+
+        self.text = text
+        self._starts = starts
+        self._ends = ends
+        self._lo = start
+        self._hi = len(starts) if end is None else end
+        self._char_offset = char_offset
+
+    @classmethod
+    def from_doc(cls, doclike):
+        """Token offsets of a Doc or Span (chars relative to the Span start), backed by the
+        cached offsets of the Doc (see `doc_token_offsets`)"""
+
+        if isinstance(doclike, Span):
+            return doc_token_offsets(doclike.doc).window(
+                doclike.start, doclike.end)
+
+        return doc_token_offsets(doclike)
+
+    @classmethod
+    def from_text(cls, text):
+        """Approximate spaCy's tokenization of a text (whitespace handling, split off leading and
+        trailing punctuation) without building a Doc"""
+
+        starts = array('q')
+        ends = array('q')
+
+        def _whitespace(start, end, first):
+            # a single space following a token is its trailing whitespace, otherwise whitespace is a token
+            if not first and text[start] == ' ':
+                start += 1
+            if start < end:
+                starts.append(start)
+                ends.append(end)
+
+        pos = 0
+
+        for m in eure.finditer(r'\S+', text):
+            start, end = m.span()
+
+            if start > pos:
+                _whitespace(pos, start, first=len(starts) == 0)
+
+            chunk = m.group()
+            n_prefix = len(chunk) - len(chunk.lstrip(cls.prefix_chars))
+            rest = chunk[n_prefix:]
+            n_suffix = len(rest) - len(rest.rstrip(cls.suffix_chars))
+
+            for i in range(start, start + n_prefix):
+                starts.append(i)
+                ends.append(i + 1)
+
+            if len(rest) > n_suffix:
+                starts.append(start + n_prefix)
+                ends.append(end - n_suffix)
+
+            for i in range(end - n_suffix, end):
+                starts.append(i)
+                ends.append(i + 1)
+
+            pos = end
+
+        if pos < len(text):
+            _whitespace(pos, len(text), first=len(starts) == 0)
+
+        return cls(text, starts, ends)
+
+    def __len__(self):
+
+        return self._hi - self._lo
+
+    def token_at(self, char):
+        """Index of the token containing the char (None if the char is whitespace or out of range)"""
+
+        char += self._char_offset
+        i = bisect.bisect_right(self._starts, char, self._lo, self._hi) - 1
+
+        if i >= self._lo and char < self._ends[i]:
+            return i - self._lo
+
+        return None
+
+    def char_to_token(self, char, alignment_mode="contract"):
+        """Index of the token at the char, aligned to the closest token if the char is whitespace
+        (see `char_to_token` for the alignment modes)"""
+
+        if self._hi <= self._lo:
+            raise ValueError("No tokens to align to")
+
+        token = self.token_at(char)
+
+        if token is not None:
+            return token
+        elif alignment_mode == "strict":
+            return None
+
+        i = bisect.bisect_right(self._starts, char + self._char_offset,
+                                self._lo, self._hi)
+
+        if alignment_mode == "expand":
+            return i - self._lo
+        else:
+            return max(i - 1, self._lo) - self._lo
+
+    def _slice(self, start, end):
+
+        n = len(self)
+        start = min(max(start, 0), n)
+        end = min(max(end, start), n)
+
+        return start, end
+
+    def span_chars(self, start, end):
+        """Start and end char of the token slice [start:end] (same as `doc[start:end]`)"""
+
+        start, end = self._slice(start, end)
+
+        if start < len(self):
+            start_char = self._starts[self._lo + start] - self._char_offset
+        else:
+            start_char = len(self.text)
+
+        if end > start:
+            end_char = self._ends[self._lo + end - 1] - self._char_offset
+        else:
+            end_char = start_char
+
+        return start_char, end_char
+
+    def span_text(self, start, end):
+        """Text of the token slice [start:end]"""
+
+        start_char, end_char = self.span_chars(start, end)
+
+        return self.text[start_char:end_char]
+
+    def window(self, start, end):
+        """Token offsets of the token slice [start:end] (relative to the slice, as for a Span)"""
+
+        start, end = self._slice(start, end)
+        start_char, end_char = self.span_chars(start, end)
+
+        return TokenOffsets(self.text[start_char:end_char], self._starts,
+                            self._ends, self._lo + start, self._lo + end,
+                            self._char_offset + start_char)
+
+    def char_span(self, start_char, end_char):
+        """Token slice exactly matching the chars (same as `doc.char_span` with strict alignment) or None"""
+
+        start_char += self._char_offset
+        end_char += self._char_offset
+
+        start = bisect.bisect_left(self._starts, start_char, self._lo,
+                                   self._hi)
+        end = bisect.bisect_left(self._ends, end_char, self._lo, self._hi)
+
+        if start < self._hi and self._starts[start] == start_char and \
+                end < self._hi and self._ends[end] == end_char and end >= start:
+            return start - self._lo, end + 1 - self._lo
+
+        return None
+
+
+# token offsets per Doc (see `doc_token_offsets`)
+_doc_token_offsets = weakref.WeakKeyDictionary()
+
+
+def doc_token_offsets(doc):
+    """Token offsets of a Doc (see `TokenOffsets`), built once per Doc (and tokenization) and cached"""
+
+    n_tokens, token_offsets = _doc_token_offsets.get(doc, (None, None))
+
+    # rebuild if the doc was retokenized
+    if n_tokens != len(doc):
+        idx_length = doc.to_array([IDX, LENGTH])
+        starts = array('q', idx_length[:, 0].tolist())
+        ends = array('q', (idx_length[:, 0] + idx_length[:, 1]).tolist())
+
+        token_offsets = TokenOffsets(doc.text, starts, ends)
+        _doc_token_offsets[doc] = (len(doc), token_offsets)
+
+    return token_offsets
+
+
+class TokenContext:
+    """Context windows of the tokens of a Doc: the n tokens left of a token or from the token on
+
+    A window is a token range found from arrays of the kinds of the tokens (word, space, line break)
+    and running counts of the space tokens, its text a slice of the doc text between the char
+    offsets of its tokens (see `TokenOffsets`), without building token lists or Spans (see
+    `window`).
+    """
+
+    # kinds of tokens
+    WORD = 0
+    SPACE = 1
+    NEWLINE = 2  # space tokens with a line break
+
+    def __init__(self, token_offsets, kinds):
+        """
+        Parameters
+        ----------
+        token_offsets: TokenOffsets
+            the char offsets of the tokens of the doc
+        kinds: bytes
+            the kind of each token (`WORD`, `SPACE` or `NEWLINE`)
+
+        """
+
+        self.token_offsets = token_offsets
+        self.kinds = kinds
+
+        # number of space tokens before each token
+        self.space_counts = array('i', [0])
+        n_spaces = 0
+        for kind in kinds:
+            n_spaces += kind != self.WORD
+            self.space_counts.append(n_spaces)
+
+    @classmethod
+    def from_doc(cls, doc):
+        """Context windows of the tokens of a Doc (use the cached `doc_token_context`)"""
+
+        kinds = bytes((cls.NEWLINE if '\n' in t.text else cls.SPACE
+                       ) if t.is_space else cls.WORD for t in doc)
+
+        return cls(doc_token_offsets(doc), kinds)
+
+    def _slice(self, start, end):
+        """Token range of doc[start:end] (negative indices count from the end, as for a Doc)"""
+
+        length = len(self.kinds)
+
+        if start < 0:
+            start += length
+        start = min(length, max(0, start))
+        if end < 0:
+            end += length
+        end = min(length, max(start, end))
+
+        return start, end
+
+    def window(self,
+               i,
+               n,
+               direction="left",
+               ignore_ws=False,
+               stop_at_newline=False):
+        """Token range (start, end) of the tokens of `get_n_tokens`
+
+        The n tokens left of token i (excluding it) or from token i on, extended by the number of
+        space tokens among them if `ignore_ws`. Left windows starting before the doc are empty, as
+        the slice of a Doc with a negative start. With `stop_at_newline`, the window is cut at the
+        line break closest to token i (excluding it).
+
+        Parameters
+        ----------
+        i: int
+            the token index
+        n: int
+            the number of tokens
+        direction: str
+            "left" or "right"
+        ignore_ws: bool
+            extend the window by the number of space tokens in it
+        stop_at_newline: bool
+            cut the window at a line break
+
+        Returns
+        -------
+        tuple
+            (start, end) token indices
+
+        """
+
+        if direction == "left":
+            lower, upper = i - n, i
+        else:
+            lower, upper = i, i + n
+
+        if ignore_ws:
+            start, end = self._slice(lower, upper)
+            n_spaces = self.space_counts[end] - self.space_counts[start]
+            if direction == "left":
+                lower -= n_spaces
+            else:
+                upper += n_spaces
+
+        start, end = self._slice(lower, upper)
+
+        if stop_at_newline:
+            if direction == "left":
+                newline = self.kinds.rfind(self.NEWLINE, start, end)
+                if newline >= 0:
+                    start = newline + 1
+            else:
+                newline = self.kinds.find(self.NEWLINE, start, end)
+                if newline >= 0:
+                    end = newline
+
+        return start, end
+
+    def text(self, start, end):
+        """Text of the tokens [start:end] with their trailing whitespace (as `Span.text_with_ws`)"""
+
+        offsets = self.token_offsets
+
+        if end <= start:
+            return ''
+
+        start_char = offsets._starts[start] - offsets._char_offset
+        end_char = offsets._starts[end] - offsets._char_offset if end < len(
+            offsets._starts) else len(offsets.text)
+
+        return offsets.text[start_char:end_char]
+
+
+# token contexts per Doc (see `doc_token_context`)
+_doc_token_contexts = weakref.WeakKeyDictionary()
+
+
+def doc_token_context(doc):
+    """Context windows of the tokens of a Doc (see `TokenContext`), built once per Doc (and
+    tokenization) and cached"""
+
+    n_tokens, token_context = _doc_token_contexts.get(doc, (None, None))
+
+    # rebuild if the doc was retokenized
+    if n_tokens != len(doc):
+        token_context = TokenContext.from_doc(doc)
+        _doc_token_contexts[doc] = (len(doc), token_context)
+
+    return token_context
+
+
 def char_to_token(char,
                   reference,
                   input="as_ref",
                   output="as_ref",
                   alignment_mode="contract"):
-    if isinstance(reference, Doc) or isinstance(reference, Span):
-        char_token = chars_to_tokens_dict(reference,
-                                          input=input,
-                                          output=output)
+    """Map a char position to the index of a token
+
+    Parameters
+    ----------
+    char: int
+        the char position
+    reference: Doc, Span, TokenOffsets or dict
+        the tokens to align to (a dict maps chars to token indices, see `chars_to_tokens_dict`)
+    input: str
+        'doc' if `char` is relative to the Doc of a Span, 'as_ref' (default) if relative to the reference
+    output: str
+        'doc' or 'span' for the token index relative to the Doc or the Span, 'as_ref' (default) same as `input`
+    alignment_mode: str
+        how to align chars that are not part of a token (whitespace):
+        'contract' (default) to the closest token before, 'expand' to the closest token after
+        (the number of tokens past the last token), 'strict' to None
+
+    Returns
+    -------
+    int or None
+        the token index
+
+    """
+
+    if isinstance(reference, TokenOffsets):
+        return reference.char_to_token(char, alignment_mode=alignment_mode)
+    elif isinstance(reference, Span):
+        if input == "doc":
+            tokens = TokenOffsets.from_doc(reference.doc)
+            token_offset = -reference.start if output == "span" else 0
+        else:
+            tokens = TokenOffsets.from_doc(reference)
+            token_offset = reference.start if output == "doc" else 0
+    elif isinstance(reference, Doc):
+        tokens = TokenOffsets.from_doc(reference)
+        token_offset = 0
     elif isinstance(reference, dict):
-        char_token = reference
+        return _dict_char_to_token(char, reference, alignment_mode)
     else:
         raise TypeError(
-            "Argument 'reference' needs to be either a Doc, Span or a Dict object."
+            "Argument 'reference' needs to be either a Doc, Span, TokenOffsets or a Dict object."
         )
-    token = char_token.get(char, None)
 
-    token_offset = 0
+    token = tokens.char_to_token(char, alignment_mode=alignment_mode)
 
-    while token is None:
-        if alignment_mode == "expand":
-            char = char + 1
-            if char > max(char_token.keys()):
-                char = max(char_token.keys())
-                token_offset = 1
-        elif alignment_mode == "strict":
-            return None
-        else:
-            char = char - 1
-            if char < min(char_token.keys()):
-                char = min(char_token.keys())
-        token = char_token.get(char, None)
+    return None if token is None else token + token_offset
+
+
+# chars not part of a token looked at next to a char before searching all chars of a dict (see `_dict_char_to_token`)
+_dict_gap_chars = 64
+
+
+def _dict_char_to_token(char, char_token, alignment_mode):
 
-    return token + token_offset
+    token = char_token.get(char, None)
+
+    if token is not None:
+        return token
+    elif alignment_mode == "strict":
+        return None
+    elif len(char_token) == 0:
+        raise ValueError("No tokens to align to")
+
+    # chars not part of a token are mostly short runs of whitespace between two tokens
+    step = 1 if alignment_mode == "expand" else -1
+    for next_char in range(char + step, char + step * _dict_gap_chars, step):
+        token = char_token.get(next_char, None)
+        if token is not None:
+            return token
+
+    # before the first token, after the last token or a long gap: search all chars
+    if alignment_mode == "expand":
+        following = [c for c in char_token if c > char]
+        if following:
+            return char_token[min(following)]
+        return char_token[max(char_token)] + 1
+    else:
+        preceding = [c for c in char_token if c < char]
+        if preceding:
+            return char_token[max(preceding)]
+        return char_token[min(char_token)]
 
 
 def _part_argument_check(argument, part):
@@ -511,6 +1030,8 @@ def _part_argument_check(argument, part):
     if isinstance(argument, eucy.structure.Structure):
         return argument.parts[part]
     elif isinstance(argument, Doc):
+        if argument.has_extension('parts') and argument._.parts is not None:
+            return argument._.parts[part]
         return eucy.structure.text_parts(argument)[part]
     elif isinstance(argument, Span):
         return argument
@@ -523,58 +1044,74 @@ def _part_argument_check(argument, part):
         )
 
 
-def get_sentences(doclike, min_sen_length):
+# sentence starts per Doc (see `doc_sentence_starts`)
+_doc_sentence_starts = weakref.WeakKeyDictionary()
 
-    if isinstance(doclike, Doc):
 
-        return [
-            sent for sent in doclike.sents
-            if len(sent.text.strip()) > min_sen_length
-        ]
+def doc_sentence_starts(doc):
+    """Indices of the first tokens of the sentences of a Doc, built once per Doc (and tokenization)
+    and cached
+
+    The sentence boundaries of the Doc are used if set (by a parser, senter or the
+    `eucy_sentencizer` component), otherwise those of the rules for legal texts (see
+    `sentencizer.sentence_starts`), so no statistical model is needed.
+    """
+
+    n_tokens, starts = _doc_sentence_starts.get(doc, (None, None))
 
+    # rebuild if the doc was retokenized
+    if n_tokens != len(doc):
+        if doc.has_annotation("SENT_START"):
+            starts = array('q', (sent.start for sent in doc.sents))
+        else:
+            starts = array('q', sentencizer.sentence_starts(doc))
+        _doc_sentence_starts[doc] = (len(doc), starts)
+
+    return starts
+
+
+def get_sentences(doclike, min_sen_length):
+    """Sentences of a Doc or starting within a Span (see `doc_sentence_starts`) that are longer than
+    min_sen_length chars (stripped), the sentences of a Span found by binary search"""
+
+    if isinstance(doclike, Doc):
+        doc = doclike
+        starts = doc_sentence_starts(doc)
+        first, last = 0, len(starts)
     elif isinstance(doclike, Span):
         # get all sentences within
-        return [
-            sent for sent in doclike.doc.sents
-            if sent.start >= doclike.start and (
-                sent.end <= doclike.end or sent.start <= doclike.end)
-            if len(sent.text.strip()) > min_sen_length
-        ]
+        doc = doclike.doc
+        starts = doc_sentence_starts(doc)
+        first = bisect.bisect_left(starts, doclike.start)
+        last = bisect.bisect_right(starts, doclike.end)
     else:
         raise ValueError("Pleanse supply a Doc or Span object.")
 
+    sentences = (doc[start:end] for start, end in zip(
+        starts[first:last], starts[first + 1:last + 1].tolist() + [len(doc)]))
+
+    return [
+        sent for sent in sentences if len(sent.text.strip()) > min_sen_length
+    ]
+
 
 def get_n_tokens(n,
                  token,
                  direction="left",
                  ignore_ws=False,
                  stop_at_newline=True):
+    """The n tokens left of a token or from the token on, extended by the number of space tokens
+    among them if `ignore_ws` and cut at the line break closest to the token if `stop_at_newline`
+    (see `TokenContext.window`)"""
 
-    if direction == "left":
-        lower = token.i - n
-        upper = token.i
-    else:
-        lower = token.i
-        upper = token.i + n
-    tok_list = [tok for tok in token.doc[lower:upper]]
-    if ignore_ws:
-        ws_count = len([t for t in tok_list if t.is_space])
-        if direction == "left":
-            lower = lower - ws_count
-        else:
-            upper = upper + ws_count
-        tok_list = [tok for tok in token.doc[lower:upper]]
+    start, end = doc_token_context(token.doc).window(
+        token.i,
+        n,
+        direction=direction,
+        ignore_ws=ignore_ws,
+        stop_at_newline=stop_at_newline)
 
-    if stop_at_newline:
-        newline_tok = [tok for tok in tok_list if '\n' in tok.text_with_ws]
-
-        if len(newline_tok) > 0:
-            if direction == "left":
-                lower = newline_tok[-1]
-            else:
-                upper = newline_tok[0]
-
-    return tok_list
+    return list(token.doc[start:end])
 
 
 def get_n_left(n, token, ignore_ws=False, stop_at_newline=True):
@@ -593,28 +1130,102 @@ def get_n_right(n, token, ignore_ws=False, stop_at_newline=True):
                         stop_at_newline=stop_at_newline)
 
 
+def remove_overlapping_spans(spans, other_spans):
+    """Keep the spans not overlapping any of the other spans (token offsets)
+
+    The other spans are merged into sorted, disjoint intervals and each span is only checked against
+    the last interval starting before its end (binary search), instead of against all other spans.
+
+    Parameters
+    ----------
+    spans: iterable of Span
+        the spans to filter
+    other_spans: iterable of Span
+        the spans not to overlap
+
+    Returns
+    -------
+    list
+        the spans not overlapping any of the other spans (in their order)
+
+    """
+
+    starts = []
+    ends = []
+
+    for other in sorted(other_spans, key=lambda span: span.start):
+        if len(ends) > 0 and other.start < ends[-1]:
+            ends[-1] = max(ends[-1], other.end)
+        else:
+            starts.append(other.start)
+            ends.append(other.end)
+
+    kept = []
+
+    for span in spans:
+        i = bisect.bisect_left(starts, span.end) - 1
+        if i < 0 or ends[i] <= span.start:
+            kept.append(span)
+
+    return kept
+
+
 def align_span_with_text(span, text, right=True, left=False):
+    """Align a span with a text it (roughly) contains
+
+    Looks up the tokens of the span in the text one after the other, in a single pass over the
+    tokens (without slicing the text or summing up the token lengths again for every token). Each
+    lookup still scans the text from the search position, so aligning very long spans with very
+    long texts takes time quadratic in their length.
+
+    Parameters
+    ----------
+    span: spacy.tokens.Span
+        The span to align.
+    text: str
+        The text to align the span with.
+    right: bool
+        Whether to drop the tokens from the first token not found in the text after a token found.
+    left: bool
+        Whether to drop the tokens not found in the text before the first token found.
+
+    Returns
+    -------
+    spacy.tokens.Span
+        The aligned span, or None if no tokens are left.
+    """
 
     if not right and not left:
         return span
 
+    tokens = list(span)
+    n_words = sum(not t.is_space for t in tokens)
+
+    # length of the token texts from each token to the end of the span
+    rest_lengths = [0] * (len(tokens) + 1)
+    for i in range(len(tokens) - 1, -1, -1):
+        rest_lengths[i] = rest_lengths[i + 1] + len(tokens[i])
+
     aligned_tokens = []
 
     search_pos_right = 0
-    for i, token in enumerate(span):
+    for i, token in enumerate(tokens):
         if token.is_space:
             continue
-        if sum([len(t) for t in span[i:]]) >= len(
-                text[search_pos_right:]) and i < len(
-                    [t for t in span if not t.is_space]) - 4:
-            tok_match = re.escape(token.text_with_ws) + "(?=" + re.escape(
-                span[i + 1].text_with_ws +
-                span[i + 2].text_with_ws) + ")"  # match tri-grams
+        if rest_lengths[i] >= len(text) - search_pos_right and i < n_words - 4:
+            # match tri-grams
+            tok_text = token.text_with_ws
+            tok_pos = text.find(
+                tok_text + tokens[i + 1].text_with_ws +
+                tokens[i + 2].text_with_ws, search_pos_right)
         else:
-            tok_match = re.escape(token.text)
-        token_in_text = re.search(tok_match, text[search_pos_right:])
-        if token_in_text is not None:
-            search_pos_right = token_in_text.end()
+            tok_text = token.text
+            tok_pos = text.find(tok_text, search_pos_right)
+        if tok_pos >= 0:
+            # as before, the next search position is counted from the previous search position
+            # rather than from the start of the text; the reference spans are tuned to the
+            # boundaries this gives, so it is kept as is
+            search_pos_right = tok_pos - search_pos_right + len(tok_text)
             aligned_tokens.append(token)
         else:
             if search_pos_right > 0:  # if there has been a previous match
@@ -626,13 +1237,12 @@ def align_span_with_text(span, text, right=True, left=False):
                 if not left:
                     aligned_tokens.append(token)
 
-    # + 1 for last token because spans match exclusive (until the start of the next token)
-    try:
-        aligned_span = span.doc[aligned_tokens[0].i:aligned_tokens[-1].i]
-        return aligned_span
-    except:
+    if not aligned_tokens:
         return None
 
+    # + 1 for last token because spans match exclusive (until the start of the next token)
+    return span.doc[aligned_tokens[0].i:aligned_tokens[-1].i]
+
 
 def letter_to_int(letter):
     letter = letter.lower().strip()
@@ -688,6 +1298,7 @@ def int_to_roman(num):
 
 
 def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
+    """SIGALRM based timeout decorator (main thread only). See `time_budget` for a thread-safe alternative."""
 
     def decorator(func):
 
@@ -709,6 +1320,102 @@ def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
     return decorator
 
 
+_time_budget_deadline = contextvars.ContextVar('time_budget_deadline',
+                                               default=None)
+
+
+@contextmanager
+def time_budget(seconds):
+    """Context manager setting a time budget for the code run inside it.
+
+    Unlike `timeout`, no signals are used: the budget is checked cooperatively via `check_time_budget()`, so it
+    works in worker threads, subprocesses and asyncio executors. Nested budgets never extend an outer one.
+
+    Parameters
+    ----------
+    seconds (float): The time budget in seconds. If None, no (additional) budget is set.
+
+    """
+
+    if seconds is None:
+        yield
+        return
+
+    deadline = time.monotonic() + seconds
+    outer_deadline = _time_budget_deadline.get()
+    if outer_deadline is not None:
+        deadline = min(deadline, outer_deadline)
+
+    token = _time_budget_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _time_budget_deadline.reset(token)
+
+
+def check_time_budget():
+    """Raise an `exceptions.TimeoutError` if the current time budget (see `time_budget`) is exhausted."""
+
+    deadline = _time_budget_deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise exceptions.TimeoutError("Time budget exceeded")
+
+
+def text_version(doc):
+    """Version of the text of a doc the stage results of a doc belong to: its number of tokens
+
+    The text of a Doc does not change, so the version only tells apart the tokenizations of a doc (e.g.
+    after retokenizing) without reading the text, as the other per-doc caches (e.g. `doc_token_offsets`).
+    """
+
+    return len(doc)
+
+
+def mark_stage(doc, stage):
+    """Record in the doc's stage registry (`doc._.stages`) that a pipeline stage ('structure', 'elements',
+    'references') has produced its results (possibly partial, see `doc._.timeouts`) for the doc's text"""
+
+    doc.user_data.setdefault(('eucy', 'stages'), {})[stage] = text_version(doc)
+
+
+def has_stage(doc, stage):
+    """Check whether a pipeline stage has produced its results for the doc's current text (see `mark_stage`)"""
+
+    version = doc.user_data.get(('eucy', 'stages'), {}).get(stage)
+
+    return version is not None and version == text_version(doc)
+
+
+def flag_timeout(doc, stage):
+    """Mark a stage as having run out of its time budget in `doc._.timeouts`"""
+
+    if not Doc.has_extension('timeouts'):
+        Doc.set_extension('timeouts', default=None)
+
+    if doc._.timeouts is None:
+        doc._.timeouts = []
+
+    if stage not in doc._.timeouts:
+        doc._.timeouts.append(stage)
+
+
+@contextmanager
+def stage_time_budget(doc, stage, seconds):
+    """Run a stage with its own time budget. If the budget is exhausted, the stage is stopped, flagged in
+    `doc._.timeouts` and whatever the stage has annotated so far is kept.
+
+    The budget is only checked cooperatively (see `check_time_budget`), no signals are used. A single step that
+    does not check it, e.g. one long regex search, can therefore run past the budget. To bound regex searches
+    as well, use the `regex` backend with a match timeout (see `eucy.regex.set_backend`).
+    """
+
+    try:
+        with time_budget(seconds):
+            yield
+    except exceptions.TimeoutError:
+        flag_timeout(doc, stage)
+
+
 def element_list_to_spans(element_list,
                           level=0,
                           element_type=None,
@@ -1088,3 +1795,89 @@ def is_eucy_doc(doc):
 
     return isinstance(doc, Doc) and doc.has_extension(
         'article_elements') and doc.has_extension('parts')
+
+
+def _pack_user_data(value):
+    """Recursively replace Span objects (and Counters) in a user_data value with serializable markers"""
+
+    if isinstance(value, Span):
+        return {'__span__': (value.start, value.end, value.label_)}
+    elif isinstance(value, Counter):
+        return {'__counter__': dict(value)}
+    elif isinstance(value, dict):
+        return {k: _pack_user_data(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_pack_user_data(v) for v in value)
+    else:
+        return value
+
+
+def _unpack_user_data(value, doc):
+    """Reverse of `_pack_user_data`, restoring Spans on the given doc"""
+
+    if isinstance(value, dict):
+        if '__span__' in value and len(value) == 1:
+            start, end, label = value['__span__']
+            return Span(doc, start, end, label=label)
+        elif '__counter__' in value and len(value) == 1:
+            return Counter(value['__counter__'])
+        return {k: _unpack_user_data(v, doc) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_unpack_user_data(v, doc) for v in value)
+    else:
+        return value
+
+
+def _packed(data):
+    return data
+
+
+class PackedValue:
+    """A value of `doc.user_data` kept as it is (e.g. with Spans) and only packed into serializable data
+    (`pack(value)`) when the doc is serialized (`Doc.to_bytes()`, `DocBin`, `nlp.pipe(n_process=...)`), copied
+    or pickled
+
+    The packed data is unpacked again by the getters of the extensions (e.g. `_user_data_getter`), so
+    extension values are the same objects on every access and changes to them are kept.
+    """
+
+    __slots__ = ('value', 'pack')
+
+    def __init__(self, value, pack):
+        """
+        Parameters
+        ----------
+        value: object
+            the value
+        pack: callable
+            function returning the serializable data of the value
+
+        """
+
+        self.value = value
+        self.pack = pack
+
+    def __deepcopy__(self, memo):
+        # `Doc.copy()`: the copy unpacks the data on its own doc
+        return copy.deepcopy(self.pack(self.value), memo)
+
+    def __reduce__(self):
+        return _packed, (self.pack(self.value), )
+
+
+def _encode_packed_value(obj, chain=None):
+    """msgpack encoder of `PackedValue`s (see `srsly.msgpack_encoders`)"""
+
+    if isinstance(obj, PackedValue):
+        return obj.pack(obj.value)
+
+    return obj if chain is None else chain(obj)
+
+
+def register_packed_value_encoder():
+    """Register the msgpack encoder of `PackedValue`s with srsly (once), so docs holding them can be
+    serialized (called by `set_extensions`, i.e. by the euCy components)"""
+
+    if 'eucy_packed_value' not in srsly.msgpack_encoders:
+        srsly.msgpack_encoders.register('eucy_packed_value',
+                                        func=_encode_packed_value)
@@ -29,14 +29,169 @@ def get_results():
     return results
 
 
-cases_celex_ids = get_results()['celex_id'].unique()
-html_dir = os.listdir('tests/data/proposals')
+# the hand-annotated proposals (downloaded with `data/download_from_eurlex.py`), if available
+if os.path.exists('tests/data/hhk_reliability.csv'):
+    cases_celex_ids = list(get_results()['celex_id'].unique())
+else:
+    cases_celex_ids = []
+
+# short inline texts, so the tests of the annotations not compared with the hand-annotated results
+# also run without the proposals
+sample_texts = {
+    'sample_regulation':
+    """Proposal for a
+
+REGULATION OF THE EUROPEAN PARLIAMENT AND OF THE COUNCIL
+
+on the protection of testing things and amending Regulation (EC) No 1907/2006
+
+THE EUROPEAN PARLIAMENT AND THE COUNCIL OF THE EUROPEAN UNION,
+
+Having regard to the Treaty on the Functioning of the European Union, and in particular Article 114 thereof,
+
+Having regard to the proposal from the European Commission,
+
+Having regard to the opinion of the European Economic and Social Committee,
+
+Whereas:
+
+(1) The internal market for testing things should function properly and a high level of protection of human health should be ensured across the Union.
+
+(2) Directive 2001/95/EC of the European Parliament and of the Council lays down general rules which should be complemented by this Regulation for specific products.
+
+(3) Since the objectives of this Regulation cannot be sufficiently achieved by the Member States, the Union may adopt measures in accordance with Article 5 of the Treaty on European Union.
+
+HAVE ADOPTED THIS REGULATION:
+
+Article 1
+
+Subject matter
+
+This Regulation lays down rules on testing things placed on the market in the Union.
+
+Article 2
+
+Definitions
+
+For the purposes of this Regulation, the following definitions shall apply:
+
+(a) 'testing thing' means any thing referred to in Article 1;
+
+(b) 'manufacturer' means a person as defined in Article 3 of Regulation (EC) No 765/2008;
+
+Article 3
+
+Obligations
+
+1. Manufacturers shall ensure that testing things comply with the requirements set out in Articles 4 to 6 and in Annex I.
+
+2. By way of derogation from paragraph 1, the obligations referred to in points (a) to (c) of Article 2 shall not apply.
+
+The Commission shall adopt implementing acts in accordance with Article 8(2) of Regulation (EU) No 182/2011.
+
+Article 4
+
+Amendments to Regulation (EC) No 1907/2006
+
+Regulation (EC) No 1907/2006 is amended as follows:
+
+- Article 5 is deleted;
+
+- Article 6 is replaced by the following text.
+
+Article 5
+
+Entry into force
+
+This Regulation shall enter into force on the twentieth day following that of its publication in the Official Journal of the European Union.
+
+Done at Brussels,
+
+For the European Parliament For the Council
+
+ANNEX I
+
+Requirements for testing things.
+""",
+    'sample_directive':
+    """EXPLANATORY MEMORANDUM
+
+1. CONTEXT OF THE PROPOSAL
+
+This proposal amends Directive 2001/83/EC in order to simplify the rules on the labelling of medicinal products, as announced in the Commission Work Programme.
+
+2. LEGAL BASIS
+
+The proposal is based on Article 114 of the Treaty on the Functioning of the European Union.
+
+Proposal for a
+
+DIRECTIVE OF THE EUROPEAN PARLIAMENT AND OF THE COUNCIL
+
+amending Directive 2001/83/EC as regards the labelling of medicinal products
+
+THE EUROPEAN PARLIAMENT AND THE COUNCIL OF THE EUROPEAN UNION,
+
+Having regard to the Treaty on the Functioning of the European Union, and in particular Articles 114 and 168(4)(c) thereof,
+
+Having regard to the proposal from the European Commission,
+
+After transmission of the draft legislative act to the national parliaments,
+
+Acting in accordance with the ordinary legislative procedure,
+
+Whereas:
+
+(1) Directive 2001/82/EC of the European Parliament and of the Council [1] and Directive 2001/83/EC of the European Parliament and of the Council [2] lay down the rules on medicinal products.
+
+(2) The rules on the labelling laid down in Articles 54 to 57 of Directive 2001/83/EC should be simplified.
+
+(3) Directive 2001/83/EC should therefore be amended accordingly,
+
+HAVE ADOPTED THIS DIRECTIVE:
+
+Article 1
+
+Directive 2001/83/EC is amended as follows:
+
+(1) in Article 54, points (a) and (b) are replaced by the following:
+
+"(a) the name of the medicinal product;
+
+(b) the active substances, as referred to in Article 1(3a);"
+
+(2) Article 55(2) is deleted.
+
+Article 2
+
+1. Member States shall bring into force the laws, regulations and administrative provisions necessary to comply with this Directive by 31 December 2030. They shall forthwith communicate to the Commission the text of those provisions.
+
+2. Without prejudice to Article 3 of Regulation (EU) 2016/679, paragraph 1 shall apply to the provisions referred to in the first subparagraph of Article 1.
+
+Article 3
+
+This Directive shall enter into force on the twentieth day following that of its publication in the Official Journal of the European Union.
+
+Article 4
+
+This Directive is addressed to the Member States.
+
+Done at Brussels,
+
+For the European Parliament For the Council
+
+The President The President
+""",
+}
 
 
 @pytest.fixture
 def results():
     """Hand-annotated results fixture"""
 
+    if not cases_celex_ids:
+        pytest.skip("no hand-annotated results")
+
     results = get_results()
 
     return results
@@ -56,8 +211,8 @@ def result_by_id(celex_id, results=None):
     res = result.to_dict()
 
     res = {
-        k.replace('doc_proposal_', ''):
-        [(ke, va) for ke, va in v.items()][0][1]
+        k.replace('doc_proposal_', ''): [(ke, va)
+                                         for ke, va in v.items()][0][1]
         for k, v in res.items()
     }
 
@@ -87,21 +242,17 @@ def eu_wrapper(nlp):
     return eu_wrapper
 
 
-@pytest.fixture(params=cases_celex_ids)
-def html(request):
-    """Sample text html fixture"""
+@pytest.fixture(params=cases_celex_ids + list(sample_texts))
+def text(request):
+    """Sample text fixture (the text of a proposal or an inline sample text)"""
+
+    if request.param in sample_texts:
+        return sample_texts[request.param]
 
     with open('tests/data/proposals/' + request.param + '.html', 'r') as p:
         sample_text_html = p.read()
 
-    return sample_text_html
-
-
-@pytest.fixture
-def text(html):
-    """Sample text fixture"""
-
-    text = utils.text_from_html(html)
+    text = utils.text_from_html(sample_text_html)
 
     return text
 
@@ -0,0 +1,176 @@
+"""Worst-case inputs and time budgets for the expressions of `eucy.regex`
+
+Generated inputs that make expressions backtrack (long runs of spaces, digits, parentheses, dots,
+article headings without numbers, ... and random sequences of such pieces) and the time budget of
+finding all matches in them, shared by the regex performance tests (`tests/test_regex_performance.py`)
+and benchmark (`benchmarks/bench_regex_worst_case.py`).
+"""
+
+import atexit
+import multiprocessing
+import random
+import re
+import time
+
+from eucy import regex as eure
+from eucy import structure
+
+
+def expressions():
+    """All expressions of `eucy.regex` (with the flags most call sites use) and the structure landmarks
+    (with their own flags)"""
+
+    expressions = {}
+
+    for group, group_expressions in [('structure', eure.structure),
+                                     ('elements', eure.elements),
+                                     ('references',
+                                      eure.entities['references'])]:
+        for name, expression in group_expressions.items():
+            expressions[f'{group}:{name}'] = (expression,
+                                              re.IGNORECASE | re.MULTILINE)
+
+    for name, (expression, flags) in structure.landmark_expressions.items():
+        expressions[f'landmark:{name}'] = (expression, flags)
+
+    return expressions
+
+
+def _repeat(string, n):
+
+    # the trailing char makes expressions fail after the run and backtrack
+    return (string * (n // len(string) + 1))[:n] + 'x'
+
+
+worst_case_strings = {
+    'spaces': ' ',
+    'newlines': '\n',
+    'blank_lines': ' \n',
+    'digits': '1',
+    'numbers': '1 ',
+    'roman_numbers': 'I V X ',
+    'parentheses': '(',
+    'numbered_points': '(1) ',
+    'dots': '.',
+    'dotted_spaces': '. ',
+    'brackets': '[ *',
+    'article_headings': 'Article\n',
+    'article_words': 'Article ',
+    'qualifiers': 'of the ',
+    'this': 'this ',
+    'capitals': 'HAVE ADOPTED ',
+}
+
+# pieces the fuzzer draws from
+fuzz_pieces = [
+    ' ', '  ', '\n', '.', ',', '-', '1', '12', '(', ')', '[', '*', 'a ', 'I ',
+    'the ', 'of ', 'this ', 'Article ', 'Article\n', 'Regulation ', 'Council '
+]
+
+
+def worst_case_inputs(n, fuzz=4, seed=0):
+    """Generated worst-case inputs of about n chars: runs of the `worst_case_strings` and random
+    sequences of the `fuzz_pieces`
+
+    Parameters
+    ----------
+    n: int
+        length of the inputs
+    fuzz: int, optional
+        number of random inputs
+    seed: int, optional
+        seed of the random inputs
+
+    Returns
+    -------
+    dict
+        the inputs by name
+
+    """
+
+    inputs = {
+        name: _repeat(string, n)
+        for name, string in worst_case_strings.items()
+    }
+
+    rnd = random.Random(seed)
+
+    for i in range(fuzz):
+        pieces = []
+        while sum(len(piece) for piece in pieces) < n:
+            pieces.append(rnd.choice(fuzz_pieces))
+        inputs[f'fuzz_{i}'] = ''.join(pieces)[:n] + 'x'
+
+    return inputs
+
+
+def time_budget(n):
+    """Time budget (seconds) of finding all matches of an expression in an input of n chars
+
+    Searching from every line start of a blank run is quadratic for expressions starting with
+    `^\\s*`, so the budget grows with the square of the length. Cubic or exponential backtracking
+    still exceeds it.
+    """
+
+    return 0.05 + 1e-4 * n + 0.5 * (n / 1000)**2
+
+
+def find_all(backend, expression, flags, string):
+    """Find all matches of an expression in a string, compiled with the given backend"""
+
+    eure.set_backend(backend)
+
+    list(eure.compiled(expression, flags).finditer(string))
+
+
+def index_landmarks(backend, string):
+    """Index the structure landmarks of a string, compiled with the given backend"""
+
+    eure.set_backend(backend)
+
+    structure.Landmarks(string)
+
+
+def _time(function, args):
+
+    start = time.perf_counter()
+    function(*args)
+
+    return time.perf_counter() - start
+
+
+# worker process the timed functions run in (see `timed`)
+_pool = None
+
+
+def _stop_pool():
+
+    global _pool
+
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+
+
+atexit.register(_stop_pool)
+
+
+def timed(function, args, budget):
+    """Time `function(*args)` (e.g. `find_all`) in a worker process
+
+    A search backtracking catastrophically cannot be interrupted within the process, so the worker is
+    stopped after ten times the budget (and that time is returned).
+    """
+
+    global _pool
+
+    if _pool is None:
+        _pool = multiprocessing.Pool(1)
+
+    result = _pool.apply_async(_time, (function, args))
+
+    try:
+        return result.get(timeout=10 * budget)
+    except multiprocessing.TimeoutError:
+        _stop_pool()
+        return 10 * budget
@@ -2,15 +2,35 @@
 """Tests for `euCy` package to ensure annotation of individial parts and elements works."""
 # pylint: disable=redefined-outer-name
 
+import pickle
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
 import krippendorff
 import numpy as np
 import pytest
+import spacy
+from spacy.tokens import Doc, Span
+
+from eucy import regex as eure
+from eucy.entities import references
+from eucy.eucy import EuWrapper, citation_count
 
-from .conftest import result_by_id
+from .conftest import cases_celex_ids, result_by_id
 
 # TESTS
 
-request_celex_id = lambda request: request.node.callspec.params['html']
+
+def request_celex_id(request):
+    """The celex id of the proposal of a test (skipping the tests of the inline sample texts)"""
+
+    celex_id = request.node.callspec.params['text']
+
+    if celex_id not in cases_celex_ids:
+        pytest.skip("no hand-annotated results for the inline sample texts")
+
+    return celex_id
 
 
 def _test_object_creation(eu_wrapper, eudoc, text):
@@ -21,6 +41,331 @@ def _test_object_creation(eu_wrapper, eudoc, text):
     assert eudoc._.complexity == eudoc_str._.complexity
 
 
+@pytest.mark.parametrize("n_process", [1, 2])
+def test_pipe(eu_wrapper, eudoc, text, n_process):
+    """Test batch processing via EuWrapper.pipe() keeps order, context and results"""
+
+    results = list(
+        eu_wrapper.pipe([(text, 'first'), (text, 'second')],
+                        as_tuples=True,
+                        n_process=n_process))
+
+    assert [context for _, context in results] == ['first', 'second']
+
+    for doc, _ in results:
+        assert doc._.complexity == eudoc._.complexity
+        assert [a.text for a in doc.spans['articles']
+                ] == [a.text for a in eudoc.spans['articles']]
+
+
+def test_pipeline_components(eu_wrapper, eudoc, text, tmp_path):
+    """Test the euCy stages as spaCy pipeline components (disabling, serialization)"""
+
+    nlp = eu_wrapper.nlp
+
+    with nlp.select_pipes(disable=['eucy_references', 'eucy_complexity']):
+        doc = nlp(text)
+
+    assert doc._.complexity is None
+    assert len(doc.ents) == 0
+    assert len(doc.spans['articles']) == len(eudoc.spans['articles'])
+
+    nlp.to_disk(tmp_path)
+    loaded_doc = spacy.load(tmp_path)(text)
+
+    assert loaded_doc._.complexity == eudoc._.complexity
+
+    restored_doc = Doc(nlp.vocab).from_bytes(eudoc.to_bytes())
+
+    assert [[par.text for par in a['pars']]
+            for a in restored_doc._.article_elements
+            ] == [[par.text for par in a['pars']]
+                  for a in eudoc._.article_elements]
+
+
+def test_extension_values(nlp, text):
+    """Test that the Span-valued extensions return the same objects, keep changes and are serialized"""
+
+    doc = EuWrapper(nlp)(text)
+
+    assert doc._.parts is doc._.parts
+    doc._.parts['preamble'] = doc[:1]
+    doc._.article_elements.append({'pars': [doc[1:2]]})
+
+    for copied_doc in [
+            Doc(nlp.vocab).from_bytes(doc.to_bytes()),
+            doc.copy(),
+            pickle.loads(pickle.dumps(doc))
+    ]:
+        assert copied_doc._.parts['preamble'].text == doc[:1].text
+        assert copied_doc._.parts['preamble'].doc is copied_doc
+        assert copied_doc._.article_elements[-1]['pars'][0].text == doc[
+            1:2].text
+
+
+def test_lazy_complexity(nlp, eudoc, text):
+    """Test that complexity measures only run the stages they depend on when read"""
+
+    eu_wrapper = EuWrapper(nlp, disable=['references'])
+
+    doc = eu_wrapper(text)
+
+    assert 'references' not in doc._.complexity.computed()
+    assert doc._.complexity['articles'] == eudoc._.complexity['articles']
+    assert len(doc.ents) == 0
+
+    assert doc._.complexity['references'] == eudoc._.complexity['references']
+    assert len(doc.ents) == len(eudoc.ents)
+
+    # stages are also resolved for deserialized docs
+    restored_doc = Doc(nlp.vocab).from_bytes(eu_wrapper(text).to_bytes())
+
+    assert restored_doc._.complexity == eudoc._.complexity
+
+    # computed measures keep their types (e.g. Counters)
+    restored_doc = Doc(nlp.vocab).from_bytes(eudoc.to_bytes())
+
+    assert 'references' in restored_doc._.complexity.computed()
+    assert isinstance(restored_doc._.complexity['references'], Counter)
+
+
+def test_stage_registry(eu_wrapper, eudoc, text):
+    """Test that stages record their results and are not run twice on a doc"""
+
+    assert set(eudoc._.stages) == {'structure', 'elements', 'references'}
+
+    article_elements = eudoc.user_data[('eucy', 'article_elements')]
+    eu_wrapper.EuElements(eudoc)
+    eu_wrapper.EuReferenceSearch.matcher(eudoc)
+
+    assert eudoc.user_data[('eucy', 'article_elements')] is article_elements
+
+    # measures called outside the pipeline run the stages they depend on
+    assert citation_count(
+        spacy.blank('en')(text)) == eudoc._.complexity['citations']
+
+
+def test_time_budget(nlp, text):
+    """Test that a stage running out of its time budget keeps partial results and is flagged"""
+
+    eu_wrapper = EuWrapper(nlp, time_budgets={'references': 0})
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        eudoc = executor.submit(eu_wrapper, text).result()
+
+    assert eudoc._.timeouts == ['references']
+    assert eudoc._.complexity['articles'] == len(eudoc.spans['articles'])
+
+
+def test_regex_backend(nlp, eudoc, text):
+    """Test that the regex module backend (with match timeouts) annotates as the re backend"""
+
+    pytest.importorskip('regex')
+
+    eure.set_backend('regex', timeout=60)
+
+    try:
+        regex_eudoc = EuWrapper(nlp)(text)
+        assert regex_eudoc._.complexity == eudoc._.complexity
+        assert [e.text
+                for e in regex_eudoc.ents] == [e.text for e in eudoc.ents]
+    finally:
+        eure.set_backend('re')
+
+
+def test_reference_candidates(eudoc):
+    """Test that the keyword anchored reference candidate search finds the matches of the separate expressions"""
+
+    expressions = [('element_act', 'ref_element_acts'),
+                   ('element', 'ref_elements'), ('act', 'ref_acts')]
+    flags = re.IGNORECASE | re.MULTILINE
+
+    for article in eudoc._.article_elements:
+        for subpars in article['subpars']:
+            for subpar in subpars:
+
+                candidates = [(type, match.span()) for type, match in
+                              references.reference_candidates(subpar.text)]
+                matches = [(type, match.span())
+                           for type, expression in expressions
+                           for match in re.finditer(
+                               eure.entities['references'][expression],
+                               subpar.text, flags)]
+
+                assert candidates == matches
+
+
+@pytest.mark.parametrize("text", [
+    "to A-the ofthetheRegulation Regulation \nthis(2)oftheis article",
+    "Article 1 of thisRegulationand \nRegulationthereof",
+    "Regulation (EU) No 1025/2012 shall   the Regulation 2 apply", "of the " +
+    "z" * 2000 + "!Regulation (EU) 2016/679", " " * 2000 + "xRegulation"
+])
+def test_reference_candidates_acts(text):
+    """Test that the act candidates searched within runs of whitespace and words are the matches of ref_acts"""
+
+    candidates = [
+        match.span() for type, match in references.reference_candidates(text)
+        if type == 'act'
+    ]
+    matches = [
+        match.span()
+        for match in re.finditer(eure.entities['references']['ref_acts'], text,
+                                 re.IGNORECASE | re.MULTILINE)
+    ]
+
+    assert candidates == matches
+
+
+def test_reference_stats(eudoc):
+    """Test that the subparagraphs skipped by the trigger word prefilter have no reference candidates"""
+
+    subpars = []
+    skipped = []
+
+    for article in eudoc._.article_elements:
+        if len(article['pars']) == 0:
+            continue
+        text = eudoc[article['pars'][0].start:article['pars'][-1].end]
+        triggers = references.Triggers(text.text, offset=text.start_char)
+        for subpar in (subpar for subpars in article['subpars']
+                       for subpar in subpars):
+            subpars.append(subpar)
+            if len(triggers.starts(subpar.start_char, subpar.end_char)) == 0:
+                skipped.append(subpar)
+
+    assert eudoc._.reference_stats['subpars'] == len(subpars)
+    assert eudoc._.reference_stats['skipped'] == len(skipped)
+    assert all(not references.reference_candidates(subpar.text)
+               for subpar in skipped)
+
+
+def test_reference_match_on(eudoc):
+    """Test that matching the reference candidates per article finds the references of matching per subparagraph"""
+
+    assert references.ReferenceMatcher(
+        match_on='articles')(eudoc) == references.ReferenceMatcher(
+            match_on='subpars')(eudoc)
+
+
+def test_token_features(eudoc):
+    """Test that the cached token features of the references are the token checks of the resolver"""
+
+    for ent in eudoc.ents:
+        for token in ent:
+            features = references._token_features(token.text)
+            assert features.element == references._has_element(token.text)
+            assert features.act == references._has_act(token.text)
+            assert features.element_num == references._has_element_num(
+                token.text)
+            assert (token.like_num or features.subpar_element_num
+                    ) == references._has_subpar_element_num(token)
+            assert features.act_identifier_part == bool(
+                references._is_act_identifier(token.text))
+
+
+def test_reference_cache(eudoc):
+    """Test that the reference cache returns the resolved references of the entities"""
+
+    cache = references.ReferenceCache(maxsize=2)
+
+    for ent in eudoc.ents:
+        resolved = references.resolve_reference_entities(ent)
+        assert cache.resolve(ent) == resolved
+        # the second time from the cache
+        assert cache.resolve(ent) == resolved
+
+    info = cache.cache_info()
+
+    assert info.hits >= len(eudoc.ents)
+    assert info.hits + info.misses == 2 * len(eudoc.ents)
+    assert info.currsize <= 2
+
+    # shared by threads, evicting the references other threads look up
+    cache.cache_clear()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        resolved = list(executor.map(cache.resolve, list(eudoc.ents) * 4))
+
+    assert resolved == [
+        references.resolve_reference_entities(ent) for ent in eudoc.ents
+    ] * 4
+
+
+def test_reference_ranges(nlp):
+    """Test that ranges of element numbers are kept as ranges and counted without expanding them"""
+
+    doc = nlp(
+        "as referred to in Articles 1 to 500 of Regulation (EU) No 1025/2012")
+
+    resolved = references.resolve_reference_entities(doc[4:])
+
+    assert len(resolved) == 1
+    assert resolved[0]['element_num'] == references.NumRange('num', 1, 500)
+    assert references.reference_size(resolved[0]) == 500
+
+    expanded = list(references.expand_references(resolved))
+
+    assert [ref['element_num']
+            for ref in expanded] == [str(num) for num in range(1, 501)]
+    assert all(ref['act_id'] == resolved[0]['act_id'] for ref in expanded)
+
+    # ranges are lists after `Doc.to_bytes()`
+    assert references.reference_size(
+        dict(resolved[0], element_num=['letter', 1, 26])) == 26
+
+
+def test_reference_store(nlp, eudoc):
+    """Test that the reference records of the entities are read from the reference store of the doc"""
+
+    reference_ents = [ent for ent in eudoc.ents if ent.label_ == "REFERENCE"]
+
+    counts = Counter()
+    for ent in reference_ents:
+        for ref in ent._.references:
+            assert isinstance(ref, references.Reference)
+            assert dict(ref) == {
+                field: ref[field]
+                for field in references._reference_fields
+            }
+            counts[ref['relation']] += references.reference_size(ref)
+
+    assert eudoc._.reference_store.count() == counts
+
+    # the references survive serialization
+    restored_doc = Doc(nlp.vocab).from_bytes(eudoc.to_bytes())
+
+    assert [ent._.references for ent in restored_doc.ents
+            ] == [ent._.references for ent in eudoc.ents]
+
+    # replaced references are kept until the store is serialized
+    doc = Doc(nlp.vocab).from_bytes(eudoc.to_bytes())
+    for ent in doc.ents:
+        ent._.references = ent._.references
+    doc.ents[0]._.references = None
+
+    restored_doc = Doc(nlp.vocab).from_bytes(doc.to_bytes())
+
+    assert restored_doc.ents[0]._.references is None
+    assert [ent._.references for ent in restored_doc.ents[1:]
+            ] == [ent._.references for ent in eudoc.ents[1:]]
+    assert len(restored_doc._.reference_store) == len(
+        doc._.reference_store) == len(eudoc._.reference_store) - len(
+            eudoc.ents[0]._.references)
+
+
+def test_reference_extension(nlp, text):
+    """Test that the references are read from the store whichever component registers the extension
+    first"""
+
+    Span.remove_extension("references")
+    references.ReferenceMatcher()
+
+    eudoc = EuWrapper(nlp)(text)
+
+    assert all(ent._.references is not None for ent in eudoc.ents)
+
+
 # TESTS: Individual documents
 
 
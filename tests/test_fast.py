@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""Tests for `euCy` package to ensure tokenization-free annotation (`eucy.fast`) works."""
+# pylint: disable=redefined-outer-name
+
+import pytest
+
+from eucy import fast
+
+
+def test_count(eudoc, text):
+    """Test fast.count() against the Doc based element counts"""
+
+    counts = fast.count(text)
+
+    for name in ['citations', 'recitals', 'articles']:
+        assert counts[name] == pytest.approx(eudoc._.complexity[name], abs=1)
+
+
+def test_elements(eudoc, text):
+    """Test that fast.elements() returns char offsets of the elements found by the Doc based pipeline"""
+
+    offsets = fast.elements(text)
+
+    doc_articles = [a.text.strip() for a in eudoc.spans['articles']]
+    fast_articles = [
+        text[start:end].strip() for start, end in offsets['articles']
+    ]
+
+    assert fast_articles == doc_articles
+
+
+def test_structure(eudoc, text):
+    """Test fast.structure() part boundaries"""
+
+    parts = fast.structure(text)
+
+    for name, part in eudoc._.parts.items():
+        if part is None:
+            assert parts[name] is None
+        else:
+            assert text[slice(*parts[name])].strip() == part.text.strip()
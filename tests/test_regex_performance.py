@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Tests for `euCy` package to ensure the expressions (`eucy.regex`) do not backtrack catastrophically."""
+# pylint: disable=redefined-outer-name
+
+import sys
+
+import pytest
+
+from eucy import regex as eure
+from eucy import structure
+from .regex_worst_case import (expressions, find_all, index_landmarks,
+                               time_budget, timed, worst_case_inputs)
+
+sizes = [250, 1000]
+
+backends = ['re'] + (['regex'] if 'regex' in eure.backends else [])
+
+
+@pytest.fixture(params=backends)
+def backend(request):
+    """Compile the expressions with each of the available backends"""
+
+    backend = eure.backend
+    eure.set_backend(request.param)
+
+    yield request.param
+
+    eure.set_backend(backend)
+
+
+# TESTS
+
+
+@pytest.mark.parametrize("name", list(expressions()))
+def test_worst_case(backend, name, record_property):
+    """Test that finding all matches of an expression in worst-case inputs stays within the time budget"""
+
+    expression, flags = expressions()[name]
+
+    exceeded = []
+
+    for n in sizes:
+        for input_name, string in worst_case_inputs(n).items():
+
+            budget = time_budget(n)
+            seconds = timed(find_all, (backend, expression, flags, string),
+                            budget)
+            record_property(f'{input_name}_{n}', round(seconds, 4))
+
+            if seconds > budget:
+                exceeded.append(f'{input_name} ({n} chars): {seconds:.2f}s')
+
+    assert not exceeded, f"{name} exceeds the time budget on " + ', '.join(
+        exceeded)
+
+
+def test_atomic_groups(backend):
+    """Test that atomic groups are compiled as such where the backend supports them, else as plain groups"""
+
+    match = eure.match(eure.atomic(r'a+') + 'a', 'aaa')
+
+    if backend == 'regex' or sys.version_info >= (3, 11):
+        assert match is None
+    else:
+        assert match.group() == 'aaa'
+
+
+def test_worst_case_landmarks(backend, record_property):
+    """Test that indexing the structure landmarks of worst-case inputs stays within the time budget"""
+
+    exceeded = []
+
+    for n in sizes:
+        for input_name, string in worst_case_inputs(n).items():
+
+            # all landmark expressions are tried at each position
+            budget = len(structure.landmark_expressions) * time_budget(n)
+            seconds = timed(index_landmarks, (backend, string), budget)
+            record_property(f'{input_name}_{n}', round(seconds, 4))
+
+            if seconds > budget:
+                exceeded.append(f'{input_name} ({n} chars): {seconds:.2f}s')
+
+    assert not exceeded, "Landmarks exceed the time budget on " + ', '.join(
+        exceeded)
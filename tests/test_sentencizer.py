@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Tests for `euCy` package to ensure the rule-based sentence segmentation (`eucy.sentencizer`) works."""
+# pylint: disable=redefined-outer-name
+
+from spacy.tokens import Doc
+
+from eucy import sentencizer, utils
+from eucy.entities import references
+from eucy.tokenizer import tokenizer
+
+
+def test_sentence_starts(nlp):
+    """Test the sentence boundaries of legal texts (abbreviations, numbering, list items)"""
+
+    nlp.tokenizer = tokenizer(nlp)
+
+    doc = nlp(
+        "1. Products referred to in Art. 5 of Regulation (EU) No. 1025/2012 et seq. shall be listed; "
+        "(a) the first;\n(b) the second. OJ L 123, 1.1.2012, p. 1.\nArticle 2\nDone!"
+    )
+
+    starts = sentencizer.sentence_starts(doc)
+
+    assert [
+        doc[start:end].text.strip()
+        for start, end in zip(starts, starts[1:] + [len(doc)])
+    ] == [
+        "1. Products referred to in Art. 5 of Regulation (EU) No. 1025/2012 et seq. shall be listed;",
+        "(a) the first;", "(b) the second.", "OJ L 123, 1.1.2012, p. 1.",
+        "Article 2", "Done!"
+    ]
+
+
+def test_get_sentences(nlp, eudoc):
+    """Test that the sentences of spans are those of the sentencizer component without a model"""
+
+    doc = Doc(eudoc.vocab).from_bytes(eudoc.to_bytes())
+    sentencizer.sentencizer(doc)
+
+    # the sentence boundaries set by the component (doc.sents) and of the rules (blank model)
+    for span in [eudoc[:], *eudoc.spans['articles']]:
+        assert [(sent.start, sent.end)
+                for sent in utils.get_sentences(span, min_sen_length=10)
+                ] == [(sent.start, sent.end) for sent in doc.sents
+                      if span.start <= sent.start <= span.end
+                      and len(sent.text.strip()) > 10]
+
+    # sentence-level matching runs on a blank model
+    matches = references.match_reference_text(eudoc[:], match_on="sentences")
+
+    assert len(matches) > 0
+    assert all(eudoc.text[match['start']:match['end']] == match['match']
+               for match in matches)
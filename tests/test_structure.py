@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""Tests for `euCy` package to ensure splitting texts into their parts (`eucy.structure`) works."""
+# pylint: disable=redefined-outer-name
+
+import re
+
+import pytest
+
+from eucy import structure
+
+
+@pytest.mark.parametrize("name", list(structure.landmark_expressions))
+def test_landmarks(eudoc, text, name):
+    """Test that landmarks picked from the index match searching the parts of the text"""
+
+    landmarks = structure.Landmarks(text)
+    expression, flags = structure.landmark_expressions[name]
+
+    for part in eudoc._.parts.values():
+
+        if part is None:
+            continue
+
+        start_char, end_char = part.start_char, part.end_char
+        match = re.search(expression, text[start_char:end_char], flags)
+
+        if match is None:
+            assert landmarks.search(name, start_char, end_char) is None
+        else:
+            assert landmarks.search(name, start_char,
+                                    end_char) == (start_char + match.start(),
+                                                  start_char + match.end())
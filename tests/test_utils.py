@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Tests for `euCy` package to ensure the helper functions (`eucy.utils`) work."""
+# pylint: disable=redefined-outer-name
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from eucy import regex as eure
+from eucy import utils
+
+
+@pytest.mark.parametrize("alignment_mode", ['contract', 'expand', 'strict'])
+def test_char_to_token(eudoc, alignment_mode):
+    """Test char to token alignment against the char to token lookup dict"""
+
+    span = eudoc.spans['articles'][0]
+
+    for reference in [eudoc, span]:
+
+        char_token = utils.chars_to_tokens_dict(reference)
+
+        for char in range(len(reference.text) + 2):
+            assert utils.char_to_token(
+                char, reference,
+                alignment_mode=alignment_mode) == utils.char_to_token(
+                    char, char_token, alignment_mode=alignment_mode)
+
+    assert utils.char_to_token(span.start_char,
+                               span,
+                               input="doc",
+                               output="span") == 0
+    assert utils.char_to_token(0, span, output="doc") == span.start
+
+
+def test_stage_time_budget_regex(nlp):
+    """Test that a single regex search running past its match timeout stops the stage running it"""
+
+    pytest.importorskip('regex')
+
+    doc = nlp("Regulation (EU) No 1025/2012")
+
+    eure.set_backend('regex', timeout=0.5)
+    try:
+        start = time.monotonic()
+        with utils.stage_time_budget(doc, 'structure', 60):
+            # catastrophic backtracking, not checking the budget
+            eure.search(r'(a|aa)+$', 'a' * 40 + 'b')
+    finally:
+        eure.set_backend('re')
+
+    assert time.monotonic() - start < 10
+    assert doc._.timeouts == ['structure']
+
+
+def test_remove_overlapping_spans(eudoc):
+    """Test removing the spans overlapping other spans against checking all pairs of spans"""
+
+    spans = list(eudoc.spans['recitals']) + list(eudoc.spans['articles'])
+    other_spans = [eudoc[i:i + 5] for i in range(0, len(eudoc), 97)]
+
+    assert utils.remove_overlapping_spans(spans, other_spans) == [
+        span for span in spans
+        if not any(span.start < other.end and span.end > other.start
+                   for other in other_spans)
+    ]
+
+
+def test_align_span_with_text(nlp):
+    """Test aligning the span of a match running into the following words with the match text"""
+
+    doc = nlp(
+        "Directive 2001/82/EC of the European Parliament and of the Council and Directive 2001/83/EC"
+    )
+    text = "Directive 2001/82/EC of the European Parliament and of the Council"
+
+    assert utils.align_span_with_text(doc[:], text).text == text
+    assert utils.align_span_with_text(doc[:], text, right=False,
+                                      left=False) == doc[:]
+    assert utils.align_span_with_text(doc[5:], "Annex I", left=True) is None
+
+
+def test_token_context(nlp):
+    """Test the context windows of tokens against the tokens of the doc"""
+
+    doc = nlp(
+        "as amended by \n Regulation  (EU) No 1025/2012,\nof the Council")
+    context = utils.doc_token_context(doc)
+
+    assert context.window(7, 3, ignore_ws=True) == (3, 7)
+    assert context.window(10, 3) == (7, 10)  # "EU ) No"
+    assert context.text(4, 12) == doc[4:12].text_with_ws
+
+    # stopping at line breaks
+    assert context.window(7, 3, ignore_ws=True,
+                          stop_at_newline=True) == (4, 7)  # not "\n "
+    assert context.window(9, 5, direction="right",
+                          stop_at_newline=True) == (9, 12)  # up to ","
+
+    assert utils.get_n_left(3, doc[2]) == []  # starting before the doc
+    assert [t.i for t in utils.get_n_right(3, doc[4], ignore_ws=True)
+            ] == [4, 5, 6, 7]
+    assert [t.i
+            for t in utils.get_n_left(3, doc[7], ignore_ws=True)] == [4, 5, 6]
+    assert [
+        t.i for t in utils.get_n_left(
+            3, doc[7], ignore_ws=True, stop_at_newline=False)
+    ] == [3, 4, 5, 6]
+
+
+def test_register_packed_value_encoder():
+    """Test that the msgpack encoder of packed user_data values is registered by `set_extensions`, not on import"""
+
+    code = ("import srsly; from eucy import utils; "
+            "assert 'eucy_packed_value' not in srsly.msgpack_encoders; "
+            "utils.set_extensions(); utils.set_extensions(); "
+            "assert 'eucy_packed_value' in srsly.msgpack_encoders")
+
+    subprocess.run([sys.executable, '-c', code], check=True)